@@ -8,3 +8,5 @@ db_cfg = {
 
 db_table = '<insert db table>'
 gateway_address = '<insert gateway address>'
+# optional: append throughput reports of the database writer as JSON lines to this file
+metrics_file = None
@@ -1,69 +1,347 @@
 #!/usr/bin/env python3
+"""Migrate logged KNX telegrams from the old knxlog table to the new schema.
+
+Examples (run from the repository root):
+
+    python3 -m migrate_db.migrate migrate --start-id 1 --end-id 1000000 --workers 4
+    python3 -m migrate_db.migrate migrate --start-time '2019-01-01 00:00:00' --dry-run
+    python3 -m migrate_db.migrate verify --chunk-size 50000
+"""
+import os
+import sys
+import argparse
+import logging
+import threading
 
 import mysql.connector
 from mysql.connector import errorcode
 from timeit import default_timer as timer
 from migrate_db import srcRow
 from migrate_db import sinkRow
+from migrate_db.throttle import Throttle
 from config import databaseconfig as db_cfg
 
-import baos_knx_parser as knx
-
-
-def migrate_records(offset, row_cnt, workload_size, read_cursor, write_cursor, write_connection):
+# knxcommon lives next to knxmap in src but does not import it
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src'))
+from knxcommon.cache import TelegramCache
+from knxcommon.metrics import ProgressMeter
+
+LOGGER = logging.getLogger(__name__)
+
+# Parsed telegrams, keyed by their raw cEMI frame
+TELEGRAM_CACHE = TelegramCache(maxsize=65536)
+
+SELECT_COLUMNS = 'id, Time, Date, SourceAddress, DestinationAddress, Data, cemi'
+INSERT_COLUMNS = 'timestamp, source_addr, destination_addr, apci, tpci, priority, repeated, hop_count, apdu, ' \
+                 'payload_length, cemi, payload_data, is_manipulated'
+
+ARGS = argparse.ArgumentParser(
+    description='Migrate logged KNX telegrams to the new database schema',
+    formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+SUBARGS = ARGS.add_subparsers(dest='cmd')
+
+# Options shared by all commands
+RANGE_ARGS = argparse.ArgumentParser(add_help=False)
+RANGE_ARGS.add_argument(
+    '--src-table', action='store', dest='src_table',
+    default='knxlog', help='source table (in the source database)')
+RANGE_ARGS.add_argument(
+    '--sink-table', action='store', dest='sink_table',
+    default='knx_dump_new', help='sink table (in the sink database)')
+RANGE_ARGS.add_argument(
+    '--start-id', action='store', dest='start_id', type=int,
+    default=None, help='first source id to process')
+RANGE_ARGS.add_argument(
+    '--end-id', action='store', dest='end_id', type=int,
+    default=None, help='last source id to process')
+RANGE_ARGS.add_argument(
+    '--start-time', action='store', dest='start_time',
+    default=None, help='process only telegrams logged at or after this time (YYYY-MM-DD HH:MM:SS)')
+RANGE_ARGS.add_argument(
+    '--end-time', action='store', dest='end_time',
+    default=None, help='process only telegrams logged before this time (YYYY-MM-DD HH:MM:SS)')
+
+pmigrate = SUBARGS.add_parser('migrate', help='migrate telegrams from the source to the sink table',
+                              parents=[RANGE_ARGS],
+                              formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+pmigrate.add_argument(
+    '--batch-size', action='store', dest='batch_size', type=int,
+    default=10000, help='count of rows read and written per batch')
+pmigrate.add_argument(
+    '--workers', action='store', dest='workers', type=int,
+    default=1, help='count of concurrent workers, each migrating a part of the id range')
+pmigrate.add_argument(
+    '--rate', action='store', dest='rate', type=float,
+    default=0, help='maximum rows per second for all workers together (0 means unlimited)')
+pmigrate.add_argument(
+    '--target-latency', action='store', dest='target_latency', type=float,
+    default=None, help='back off when the commit latency (in seconds) exceeds this value, '
+                       'e.g. to protect live inserts of the logger on the same server')
+pmigrate.add_argument(
+    '--min-rate', action='store', dest='min_rate', type=float,
+    default=100, help='minimum rows per second when backing off')
+pmigrate.add_argument(
+    '--report-interval', action='store', dest='report_interval', type=float,
+    default=10, help='seconds between two progress reports')
+pmigrate.add_argument(
+    '--metrics-file', action='store', dest='metrics_file',
+    default=None, help='append progress reports as JSON lines to this file')
+pmigrate.add_argument(
+    '--dry-run', action='store_true', dest='dry_run',
+    default=False, help='only migrate a sampled batch (rolled back) and estimate the duration')
+
+pverify = SUBARGS.add_parser('verify', help='compare source and sink table and report mismatching ranges',
+                             parents=[RANGE_ARGS],
+                             formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+pverify.add_argument(
+    '--chunk-size', action='store', dest='chunk_size', type=int,
+    default=10000, help='count of source ids compared per chunk')
+
+
+def format_duration(seconds):
+    if seconds < 600:
+        return f'{seconds:.4} seconds'
+    elif seconds > 36000:
+        return f'{seconds / 3600:.4} hours'
+    else:
+        return f'{seconds / 60:.4} minutes'
+
+
+def range_condition(start_id=None, end_id=None, start_time=None, end_time=None):
+    """Return a SQL condition and its parameters that select the given range of the source table."""
+    conditions = []
+    params = []
+    if start_id is not None:
+        conditions.append('id >= %s')
+        params.append(start_id)
+    if end_id is not None:
+        conditions.append('id <= %s')
+        params.append(end_id)
+    if start_time is not None:
+        conditions.append('TIMESTAMP(Date, Time) >= %s')
+        params.append(start_time)
+    if end_time is not None:
+        conditions.append('TIMESTAMP(Date, Time) < %s')
+        params.append(end_time)
+    return ' AND '.join(conditions) or '1 = 1', tuple(params)
+
+
+def count_records(cursor, src_table, condition='1 = 1', params=()):
+    """Return the row count, the first and the last id of the selected source rows."""
+    cursor.execute(f'SELECT COUNT(*), MIN(id), MAX(id) FROM {src_table} WHERE {condition}', params)
+    row_cnt, first_id, last_id = cursor.fetchone()
+    return row_cnt, first_id, last_id
+
+
+def read_batch(read_cursor, src_table, after_id, last_id, batch_size, condition='1 = 1', params=()):
+    """Read the next batch of source rows with an id greater than after_id. Paging by
+    id instead of LIMIT/OFFSET keeps every read as fast as the first one."""
+    read_cursor.execute(f'SELECT {SELECT_COLUMNS} FROM {src_table} '
+                        f'WHERE id > %s AND id <= %s AND {condition} ORDER BY id LIMIT {batch_size}',
+                        (after_id, last_id) + params)
+    return read_cursor.fetchall()
+
+
+def prepare_batch(rows):
+    prepare_migration_batch = []
+    for row in rows:
+        snk_row = translate_one_record(row)
+        prepare_migration_batch.append((str(snk_row.timestamp), str(snk_row.source_addr),
+                                       str(snk_row.destination_addr), str(snk_row.apci), str(snk_row.tpci),
+                                       str(snk_row.priority), snk_row.repeated, snk_row.hop_count,
+                                       str(snk_row.apdu), snk_row.payload_length, str(snk_row.cemi),
+                                       str(snk_row.payload_data), snk_row.is_manipulated))
+    return prepare_migration_batch
+
+
+def row_size(row):
+    """Approximate size of a database row in bytes."""
+    return sum(len(str(v)) for v in row)
+
+
+def write_batch(write_cursor, sink_table, batch):
+    stmt = f'INSERT INTO {sink_table} ({INSERT_COLUMNS}) ' \
+           f'VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s);'
+    write_cursor.executemany(stmt, batch)
+
+
+def migrate_records(first_id, last_id, row_cnt, batch_size, read_cursor, write_cursor, write_connection,
+                    src_table, sink_table, condition='1 = 1', params=(), throttle=None, meter=None):
+    """Migrate the selected source rows with ids from first_id to last_id. Writes
+    are paced by throttle and progress is reported to meter, both can be shared
+    by several workers."""
+    if meter is None:
+        meter = ProgressMeter('migrate', total=row_cnt)
     counter_migrated_tuples = 0
-    start = timer()
+    after_id = first_id - 1
 
     while counter_migrated_tuples < row_cnt:
-        left_tuples = row_cnt - counter_migrated_tuples
-        if left_tuples > workload_size:
-            limit = workload_size
-        else:
-            limit = left_tuples
-
-        src_db = db_cfg.src_db['db']
-        sink_db = db_cfg.sink_db['db']
-        sql_select = f'SELECT id, Time, Date, SourceAddress, DestinationAddress, Data, cemi ' \
-                     f'from {src_db}.knxlog ' \
-                     f'LIMIT {limit} OFFSET {offset + counter_migrated_tuples}'
-
-        read_cursor.execute(sql_select)
-
-        prepare_migration_batch = []
-        for row in read_cursor:
-            snk_row = translate_one_record(row)
-            prepare_migration_batch.append((str(snk_row.timestamp), str(snk_row.source_addr),
-                                           str(snk_row.destination_addr), str(snk_row.apci), str(snk_row.tpci),
-                                           str(snk_row.priority), snk_row.repeated, snk_row.hop_count,
-                                           str(snk_row.apdu), snk_row.payload_length, str(snk_row.cemi),
-                                           str(snk_row.payload_data), snk_row.is_manipulated))
-
-        stmt = f'INSERT INTO {sink_db}.knx_dump_new (timestamp, source_addr, destination_addr, apci, tpci, priority,' \
-               f'repeated, hop_count, apdu, payload_length, cemi, payload_data, is_manipulated) ' \
-               f'VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s);'
-        write_cursor.executemany(stmt, prepare_migration_batch)
+        with meter.stage('read'):
+            rows = read_batch(read_cursor, src_table, after_id, last_id, batch_size, condition, params)
+        if not rows:
+            break
+        with meter.stage('translate'):
+            batch = prepare_batch(rows)
+        if throttle:
+            with meter.stage('throttle'):
+                throttle.acquire(len(rows))
+        with meter.stage('write'):
+            write_batch(write_cursor, sink_table, batch)
+        commit_start = timer()
         write_connection.commit()
-        counter_migrated_tuples += limit
-
-        end = timer()
-        if ((row_cnt / counter_migrated_tuples) * (end - start) - (end - start)) < 600:
-            remaining_time = f'{((row_cnt / counter_migrated_tuples) * (end - start)) - (end - start):.4} seconds'
-        elif ((row_cnt / counter_migrated_tuples) * (end - start) - (end - start)) > 36000:
-            remaining_time = \
-                f'{((row_cnt / counter_migrated_tuples) * (end - start) / 3600) - (end - start) / 3600:.4} hours'
+        commit_latency = timer() - commit_start
+        meter.add_latency('commit', commit_latency)
+        counter_migrated_tuples += len(rows)
+        after_id = rows[-1][0]
+
+        meter.update(len(rows),
+                     bytes_read=sum(row_size(r) for r in rows),
+                     bytes_written=sum(row_size(r) for r in batch))
+        meter.set_gauge('cache_hit_rate', round(TELEGRAM_CACHE.hit_rate, 4))
+        if throttle:
+            throttle.observe(commit_latency, meter.rate)
+            meter.set_gauge('throttle_rate', round(throttle.rate, 1) if throttle.rate else 0)
+        meter.maybe_emit()
+
+    return counter_migrated_tuples
+
+
+def migrate_worker(first_id, last_id, batch_size, src_table, sink_table, condition, params, throttle, meter):
+    """Migrate a part of the id range with separate database connections."""
+    src_conn, sink_conn, src_csr, snk_csr = init_db_connections()
+    if src_conn is None or sink_conn is None:
+        return
+    try:
+        row_cnt, _, _ = count_records(src_csr, src_table,
+                                      f'id >= %s AND id <= %s AND {condition}',
+                                      (first_id, last_id) + params)
+        if row_cnt:
+            migrate_records(first_id, last_id, row_cnt, batch_size, src_csr, snk_csr, sink_conn,
+                            src_table, sink_table, condition, params, throttle, meter)
+    finally:
+        close_db_connection(src_conn, sink_conn, src_csr, snk_csr)
+
+
+def migrate_parallel(first_id, last_id, workers, batch_size, src_table, sink_table,
+                     condition='1 = 1', params=(), throttle=None, meter=None):
+    """Split the id range in equal parts and migrate each of them in a separate thread."""
+    step = (last_id - first_id) // workers + 1
+    threads = []
+    for worker_first_id in range(first_id, last_id + 1, step):
+        t = threading.Thread(target=migrate_worker,
+                             args=(worker_first_id, min(worker_first_id + step - 1, last_id), batch_size,
+                                   src_table, sink_table, condition, params, throttle, meter))
+        t.start()
+        threads.append(t)
+    for t in threads:
+        t.join()
+
+
+def estimate_throughput(first_id, last_id, batch_size, read_cursor, write_cursor, write_connection,
+                        src_table, sink_table, condition='1 = 1', params=()):
+    """Migrate a single batch without committing it and return the sampled row
+    count and the time spent for reading, translating and writing it."""
+    start = timer()
+    rows = read_batch(read_cursor, src_table, first_id - 1, last_id, batch_size, condition, params)
+    read_time = timer() - start
+
+    start = timer()
+    batch = prepare_batch(rows)
+    translate_time = timer() - start
+
+    start = timer()
+    write_batch(write_cursor, sink_table, batch)
+    write_time = timer() - start
+    write_connection.rollback()
+
+    return len(rows), read_time, translate_time, write_time
+
+
+def verify_records(first_id, last_id, chunk_size, source_cursor, sink_cursor, src_table, sink_table):
+    """Compare source and sink table chunk by chunk and return the mismatching ranges.
+
+    Both tables are walked in matching chunks: the source by id, the sink by the
+    timestamp window that belongs to the same id range. Each chunk is compared by its
+    row count and an order independent checksum over the cEMI column, which is
+    calculated by the database server, so no rows have to be transferred.
+
+    Chunk boundaries are only placed where the timestamp changes, this assumes ids of
+    the source table have been assigned in timestamp order (as done by the logger)."""
+    src_ts = 'TIMESTAMP(Date, Time)'
+    checksum = 'COUNT(*), COALESCE(BIT_XOR(CAST(CONV(LEFT(MD5(cemi), 16), 16, 10) AS UNSIGNED)), 0)'
+
+    # (id, timestamp) of the first row of each chunk
+    boundaries = []
+    for chunk_start in range(first_id, last_id + 1, chunk_size):
+        source_cursor.execute(f'SELECT id, {src_ts} FROM {src_table} '
+                              f'WHERE id >= %s AND id <= %s ORDER BY id LIMIT 1', (chunk_start, last_id))
+        row = source_cursor.fetchone()
+        if row is None:
+            break
+        if boundaries:
+            # Move the boundary behind all rows sharing the timestamp
+            # of the chunk start, they belong to the previous chunk.
+            source_cursor.execute(f'SELECT id, {src_ts} FROM {src_table} '
+                                  f'WHERE id >= %s AND id <= %s AND {src_ts} > %s ORDER BY id LIMIT 1',
+                                  (row[0], last_id, row[1]))
+            row = source_cursor.fetchone()
+            if row is None:
+                break
+            if row[0] <= boundaries[-1][0]:
+                continue
+        boundaries.append(row)
+
+    mismatches = []
+    for i, (chunk_first_id, chunk_first_ts) in enumerate(boundaries):
+        if i + 1 < len(boundaries):
+            chunk_last_id, chunk_end_ts = boundaries[i + 1][0] - 1, boundaries[i + 1][1]
+            source_cursor.execute(f'SELECT {checksum} FROM {src_table} WHERE id >= %s AND id <= %s',
+                                  (chunk_first_id, chunk_last_id))
+            sink_cursor.execute(f'SELECT {checksum} FROM {sink_table} '
+                                f'WHERE timestamp >= %s AND timestamp < %s',
+                                (chunk_first_ts, chunk_end_ts))
         else:
-            remaining_time = \
-                f'{((row_cnt / counter_migrated_tuples) * (end - start) / 60) - (end - start) / 60:.4} minutes'
-        if (end - start) < 600:
-            runtime = f'{(end - start):.4} seconds'
-        elif (end - start) > 36000:
-            runtime = f'{((end - start) / 3600):.4} hours'
+            # The last chunk ends where the rows behind the selected range start
+            source_cursor.execute(f'SELECT {src_ts} FROM {src_table} WHERE id > %s ORDER BY id LIMIT 1',
+                                  (last_id,))
+            row = source_cursor.fetchone()
+            chunk_last_id, chunk_end_ts = last_id, row[0] if row else None
+            source_cursor.execute(f'SELECT {checksum} FROM {src_table} WHERE id >= %s AND id <= %s',
+                                  (chunk_first_id, last_id))
+            if chunk_end_ts is None:
+                sink_cursor.execute(f'SELECT {checksum} FROM {sink_table} WHERE timestamp >= %s',
+                                    (chunk_first_ts,))
+            else:
+                sink_cursor.execute(f'SELECT {checksum} FROM {sink_table} '
+                                    f'WHERE timestamp >= %s AND timestamp < %s',
+                                    (chunk_first_ts, chunk_end_ts))
+        src_count, src_hash = source_cursor.fetchone()
+        sink_count, sink_hash = sink_cursor.fetchone()
+        if src_count == sink_count and int(src_hash) == int(sink_hash):
+            continue
+
+        if mismatches and mismatches[-1]['last_id'] + 1 == chunk_first_id:
+            # Merge adjacent ranges, they can be re-migrated at once
+            mismatch = mismatches[-1]
+            mismatch['last_id'] = chunk_last_id
+            mismatch['end_timestamp'] = chunk_end_ts
+            mismatch['source_rows'] += src_count
+            mismatch['sink_rows'] += sink_count
         else:
-            runtime = f'{((end - start) / 60):.4} minutes'
-        print(f'{(100 / row_cnt * counter_migrated_tuples):.4} % work done in {runtime} '
-              f'- estimated remaining time: {remaining_time}')
+            mismatches.append({'first_id': chunk_first_id,
+                               'last_id': chunk_last_id,
+                               'start_timestamp': chunk_first_ts,
+                               'end_timestamp': chunk_end_ts,
+                               'source_rows': src_count,
+                               'sink_rows': sink_count})
 
-    return
+    for m in mismatches:
+        print(f'Mismatch in ids {m["first_id"]} - {m["last_id"]} '
+              f'(timestamps {m["start_timestamp"]} - {m["end_timestamp"] or "end"}): '
+              f'{m["source_rows"]} source rows, {m["sink_rows"]} sink rows')
+    print(f'Verified {len(boundaries)} chunks, {len(mismatches)} mismatching range(s)')
+
+    return mismatches
 
 
 def translate_one_record(row):
@@ -87,7 +365,7 @@ def translate_one_record(row):
 def translate_to_sink_row(src_row):
     sink_row = sinkRow.SinkRow()
 
-    src_telegram = knx.parse_knx_telegram(bytes.fromhex(src_row.cemi))
+    src_telegram = TELEGRAM_CACHE.parse(src_row.cemi)
 
     sink_row.sequence_number = 'NULL'                                   # auto-increment
     sink_row.timestamp = str(src_row.date) + " " + str(src_row.time)    # constructing datetime document from strings
@@ -155,7 +433,57 @@ def close_db_connection(source_connection, sink_connection, source_cursor, sink_
     return
 
 
-src_conn, sink_conn, src_csr, snk_csr = init_db_connections()
-migrate_records(0, 8000000, 10000, src_csr, snk_csr, sink_conn)
-close_db_connection(src_conn, sink_conn, src_csr, snk_csr)
+def main():
+    args = ARGS.parse_args()
+    if not args.cmd:
+        ARGS.print_help()
+        sys.exit(1)
+    logging.basicConfig(level=logging.INFO, format='[%(asctime)s] %(message)s')
+    src_table = f'{db_cfg.src_db["db"]}.{args.src_table}'
+    sink_table = f'{db_cfg.sink_db["db"]}.{args.sink_table}'
+    condition, params = range_condition(args.start_id, args.end_id, args.start_time, args.end_time)
 
+    src_conn, sink_conn, src_csr, snk_csr = init_db_connections()
+    if src_conn is None or sink_conn is None:
+        sys.exit(1)
+    try:
+        row_cnt, first_id, last_id = count_records(src_csr, src_table, condition, params)
+        print(f'{row_cnt} rows selected in {src_table} (ids {first_id} - {last_id})')
+        if not row_cnt:
+            return
+
+        if args.cmd == 'verify':
+            verify_records(first_id, last_id, args.chunk_size, src_csr, snk_csr, src_table, sink_table)
+        elif args.dry_run:
+            sampled, read_time, translate_time, write_time = estimate_throughput(
+                first_id, last_id, args.batch_size, src_csr, snk_csr, sink_conn,
+                src_table, sink_table, condition, params)
+            rows_per_second = sampled / (read_time + translate_time + write_time)
+            if args.rate:
+                rows_per_second = min(rows_per_second * args.workers, args.rate)
+            else:
+                rows_per_second *= args.workers
+            print(f'Sampled {sampled} rows: read {format_duration(read_time)}, '
+                  f'translate {format_duration(translate_time)}, write {format_duration(write_time)}')
+            print(f'Estimated duration for {row_cnt} rows with {args.workers} worker(s): '
+                  f'{format_duration(row_cnt / rows_per_second)} ({rows_per_second:.1f} rows/s)')
+        else:
+            meter = ProgressMeter('migrate', total=row_cnt, interval=args.report_interval,
+                                  metrics_file=args.metrics_file, logger=LOGGER)
+            throttle = None
+            if args.rate or args.target_latency:
+                throttle = Throttle(max_rate=args.rate, target_latency=args.target_latency,
+                                    min_rate=args.min_rate)
+            if args.workers > 1:
+                migrate_parallel(first_id, last_id, args.workers, args.batch_size, src_table, sink_table,
+                                 condition, params, throttle, meter)
+            else:
+                migrate_records(first_id, last_id, row_cnt, args.batch_size, src_csr, snk_csr, sink_conn,
+                                src_table, sink_table, condition, params, throttle, meter)
+            meter.emit()
+    finally:
+        close_db_connection(src_conn, sink_conn, src_csr, snk_csr)
+
+
+if __name__ == '__main__':
+    main()
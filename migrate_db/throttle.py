@@ -0,0 +1,82 @@
+"""Rate limiting for bulk database writes that share a server with the live logger."""
+import logging
+import threading
+import time
+
+__all__ = ['Throttle']
+
+LOGGER = logging.getLogger(__name__)
+
+
+class Throttle(object):
+    """A thread-safe rate limiter with an optional latency feedback loop.
+
+    acquire() blocks until the given count of rows may be written without
+    exceeding the current rate. If target_latency is set, the rate is
+    adapted with AIMD (additive increase, multiplicative decrease) to the
+    commit latencies passed to observe(): as soon as the smoothed latency
+    exceeds the target, the rate is cut by decrease, otherwise it grows
+    by increase rows/s per observation up to max_rate.
+
+    A max_rate of 0 means unlimited, until the latency exceeds the target
+    for the first time. From then on the rate is derived from the current
+    throughput that is passed to observe()."""
+    def __init__(self, max_rate=0, target_latency=None, min_rate=10, increase=None,
+                 decrease=0.5, alpha=0.3):
+        self.max_rate = max_rate or None
+        self.target_latency = target_latency
+        self.min_rate = min_rate
+        self.increase = increase or max((max_rate or 0) * 0.05, min_rate)
+        self.decrease = decrease
+        self.alpha = alpha
+        self.rate = self.max_rate
+        self.latency = None
+        self._next = time.time()
+        self._lock = threading.Lock()
+
+    def __repr__(self):
+        return '%s rate: %s, latency: %s, target_latency: %s' % (
+            self.__class__.__name__,
+            self.rate,
+            self.latency,
+            self.target_latency)
+
+    def acquire(self, rows):
+        """Wait until rows may be written at the current rate."""
+        with self._lock:
+            if not self.rate:
+                return 0.0
+            now = time.time()
+            # Do not save up unused time for bursts after idle periods
+            start = max(self._next, now)
+            self._next = start + rows / self.rate
+            delay = start - now
+        if delay > 0:
+            time.sleep(delay)
+        return delay
+
+    def observe(self, latency, current_rate=None):
+        """Feed back the latency (in seconds) of a write and
+        the current throughput (in rows/s) if known."""
+        if not self.target_latency:
+            return
+        with self._lock:
+            if self.latency is None:
+                self.latency = latency
+            else:
+                self.latency = self.alpha * latency + (1 - self.alpha) * self.latency
+            rate = self.rate
+            if self.latency > self.target_latency:
+                if rate is None:
+                    if not current_rate:
+                        return
+                    rate = current_rate
+                rate = max(rate * self.decrease, self.min_rate)
+            elif rate is not None:
+                rate = rate + self.increase
+                if self.max_rate:
+                    rate = min(rate, self.max_rate)
+            if rate != self.rate:
+                LOGGER.debug('Throttling to {:.1f} rows/s (latency {:.3f}s, target {:.3f}s)'.format(
+                    rate, self.latency, self.target_latency))
+                self.rate = rate
@@ -0,0 +1,5 @@
+"""Helpers shared by knxmap and the database migrator.
+
+Modules in this package must not import the knxmap package: importing
+any knxmap module runs knxmap/__init__, which pulls in the scanner, the
+message layer and all their dependencies."""
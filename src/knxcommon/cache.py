@@ -0,0 +1,64 @@
+"""A bounded cache for parsed cEMI telegrams.
+
+Building automation traffic is very repetitive: the same sensors send the
+same few frames over and over again. Parsing results are therefore cached
+by the raw cEMI bytes, so that repeated frames are only decoded once."""
+import functools
+import logging
+
+import baos_knx_parser as knx_parser
+
+__all__ = ['TelegramCache']
+
+LOGGER = logging.getLogger(__name__)
+
+
+class TelegramCache(object):
+    """A LRU cache in front of baos_knx_parser.parse_knx_telegram().
+
+    The returned telegram objects are shared between all callers
+    that requested the same cEMI frame, they must not be modified.
+    Frames that cannot be parsed are not cached, the exception of
+    the parser is raised to the caller on every call."""
+    def __init__(self, maxsize=4096):
+        self.maxsize = maxsize
+        self._parse = functools.lru_cache(maxsize=maxsize)(knx_parser.parse_knx_telegram)
+
+    def __repr__(self):
+        return '%s hits: %s, misses: %s, size: %s/%s, hit_rate: %.2f%%' % (
+            self.__class__.__name__,
+            self.hits,
+            self.misses,
+            self.size,
+            self.maxsize,
+            self.hit_rate * 100)
+
+    def parse(self, cemi):
+        """Return the parsed telegram of the raw cEMI frame. cemi
+        can either be bytes, a bytearray or a hex string."""
+        if isinstance(cemi, str):
+            cemi = bytes.fromhex(cemi)
+        elif not isinstance(cemi, bytes):
+            cemi = bytes(cemi)
+        return self._parse(cemi)
+
+    @property
+    def hits(self):
+        return self._parse.cache_info().hits
+
+    @property
+    def misses(self):
+        return self._parse.cache_info().misses
+
+    @property
+    def size(self):
+        return self._parse.cache_info().currsize
+
+    @property
+    def hit_rate(self):
+        info = self._parse.cache_info()
+        lookups = info.hits + info.misses
+        return info.hits / lookups if lookups else 0.0
+
+    def clear(self):
+        self._parse.cache_clear()
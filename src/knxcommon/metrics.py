@@ -0,0 +1,178 @@
+"""Progress and throughput reporting for long running jobs like
+database migrations or the database writer of the bus monitor."""
+import collections
+import contextlib
+import json
+import logging
+import math
+import threading
+import time
+
+__all__ = ['ProgressMeter']
+
+LOGGER = logging.getLogger(__name__)
+
+
+class StageStats(object):
+    """Latency statistics of a single processing stage."""
+    def __init__(self, alpha):
+        self.alpha = alpha
+        self.count = 0
+        self.total = 0.0
+        self.last = None
+        self.ewma = None
+
+    def add(self, seconds):
+        self.count += 1
+        self.total += seconds
+        self.last = seconds
+        if self.ewma is None:
+            self.ewma = seconds
+        else:
+            self.ewma = self.alpha * seconds + (1 - self.alpha) * self.ewma
+
+    @property
+    def average(self):
+        return self.total / self.count if self.count else 0.0
+
+
+class ProgressMeter(object):
+    """Track the progress of a job and report it as structured log lines.
+
+    The throughput is a time-decayed moving average of the rows/s: rows
+    are summed up for at least sample_interval seconds, and each sample
+    is weighted with 1 - exp(-duration / tau). The weight depends on
+    the time a sample covers, not on the count of updates, so a meter
+    that is updated for every row at irregular times does not overrate
+    bursts, and the ETA follows the speed of the last tau seconds
+    instead of the average since the start. Until the first sample is
+    complete, the average since the start is reported. The meter can
+    be shared between threads.
+
+    Every report is a single log line of key=value pairs. If metrics_file
+    is set, the same values are appended to it as JSON lines."""
+    def __init__(self, name, total=None, alpha=0.3, interval=10, metrics_file=None,
+                 logger=None, tau=30, sample_interval=1):
+        self.name = name
+        self.total = total
+        # alpha is the EWMA weight of the stage latencies
+        self.alpha = alpha
+        self.tau = tau
+        self.sample_interval = sample_interval
+        self.interval = interval
+        self.metrics_file = metrics_file
+        self.logger = logger or LOGGER
+        self.done = 0
+        self.bytes_read = 0
+        self.bytes_written = 0
+        self.rate = None
+        self.stages = collections.OrderedDict()
+        self.gauges = collections.OrderedDict()
+        self.start_time = time.time()
+        self._sample_start = self.start_time
+        self._sample_rows = 0
+        self._last_emit = self.start_time
+        self._lock = threading.RLock()
+
+    def update(self, rows, bytes_read=0, bytes_written=0):
+        """Add rows that have been processed since the last update."""
+        with self._lock:
+            now = time.time()
+            self.done += rows
+            self.bytes_read += bytes_read
+            self.bytes_written += bytes_written
+            self._sample_rows += rows
+            elapsed = now - self._sample_start
+            if elapsed >= self.sample_interval and elapsed > 0:
+                sample = self._sample_rows / elapsed
+                if self.rate is None:
+                    self.rate = sample
+                else:
+                    weight = 1 - math.exp(-elapsed / self.tau) if self.tau else 1.0
+                    self.rate += weight * (sample - self.rate)
+                self._sample_start = now
+                self._sample_rows = 0
+
+    def add_latency(self, stage, seconds):
+        with self._lock:
+            if stage not in self.stages:
+                self.stages[stage] = StageStats(self.alpha)
+            self.stages[stage].add(seconds)
+
+    @contextlib.contextmanager
+    def stage(self, name):
+        """Measure the latency of a processing stage:
+
+            with meter.stage('read'):
+                rows = cursor.fetchall()
+        """
+        start = time.time()
+        try:
+            yield
+        finally:
+            self.add_latency(name, time.time() - start)
+
+    def set_gauge(self, name, value):
+        with self._lock:
+            self.gauges[name] = value
+
+    @property
+    def elapsed(self):
+        return time.time() - self.start_time
+
+    @property
+    def current_rate(self):
+        """The rows/s, the average since the start until the first sample is complete."""
+        if self.rate is not None:
+            return self.rate
+        elapsed = self.elapsed
+        return self.done / elapsed if elapsed > 0 else 0.0
+
+    @property
+    def eta(self):
+        """Estimated remaining time in seconds, or None if unknown."""
+        rate = self.current_rate
+        if self.total is None or not rate:
+            return None
+        return max(self.total - self.done, 0) / rate
+
+    def snapshot(self):
+        with self._lock:
+            values = collections.OrderedDict()
+            values['job'] = self.name
+            values['done'] = self.done
+            if self.total is not None:
+                values['total'] = self.total
+                values['percent'] = round(100 * self.done / self.total, 2) if self.total else 100.0
+            values['rate'] = round(self.current_rate, 1)
+            eta = self.eta
+            if eta is not None:
+                values['eta_s'] = round(eta, 1)
+            values['elapsed_s'] = round(self.elapsed, 1)
+            values['bytes_read'] = self.bytes_read
+            values['bytes_written'] = self.bytes_written
+            for name, stats in self.stages.items():
+                values[name + '_ms'] = round(stats.ewma * 1000, 2)
+                values[name + '_avg_ms'] = round(stats.average * 1000, 2)
+            values.update(self.gauges)
+            return values
+
+    def emit(self):
+        """Log the current values as a single line of key=value
+        pairs and append them to the metrics file if set."""
+        values = self.snapshot()
+        with self._lock:
+            self._last_emit = time.time()
+            self.logger.info(' '.join('{}={}'.format(k, v) for k, v in values.items()))
+            if self.metrics_file:
+                values['time'] = round(self._last_emit, 3)
+                try:
+                    with open(self.metrics_file, 'a') as f:
+                        f.write(json.dumps(values) + '\n')
+                except OSError as e:
+                    self.logger.error('Could not write metrics file {}: {}'.format(self.metrics_file, e))
+
+    def maybe_emit(self):
+        """Emit the current values if interval seconds passed since the last report."""
+        if time.time() - self._last_emit >= self.interval:
+            self.emit()
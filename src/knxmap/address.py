@@ -0,0 +1,164 @@
+"""KNX individual and group addresses.
+
+Addresses are handled as 16 bit integers everywhere, only reports and
+the bus monitor need their string forms. There are only 65536 of each
+kind, so every string is built once and then served from a table:
+
+    parse_knx_address(4364)
+    '1.1.12'
+    parse_knx_group_address(2305)
+    '1/1/1'
+    parse_knx_group_address(2305, levels=2)
+    '1/257'
+
+The tables are filled on first use of an address, the strings are
+interned, so equal addresses also share a single string object."""
+import sys
+
+__all__ = ['parse_knx_address',
+           'pack_knx_address',
+           'parse_knx_group_address',
+           'pack_knx_group_address',
+           'is_valid_individual_address',
+           'is_valid_group_address']
+
+_INDIVIDUAL_ADDRESSES = {}
+_GROUP_ADDRESSES = {}
+_GROUP_ADDRESSES_2_LEVEL = {}
+_PACKED_INDIVIDUAL_ADDRESSES = {}
+_PACKED_GROUP_ADDRESSES = {}
+
+
+def _cache(table, key, value):
+    # Only valid 16 bit addresses and their strings are cached,
+    # so the tables can never grow beyond 65536 entries.
+    if len(table) < 0x10000:
+        table[key] = value
+    return value
+
+
+def parse_knx_address(address):
+    """Parse physical/individual KNX address.
+
+    Address structure (A=Area, L=Line, B=Bus device):
+    --------------------
+    |AAAA|LLLL|BBBBBBBB|
+    --------------------
+    4 Bit|4 Bit| 8 Bit
+
+    parse_knx_address(99999)
+    '8.6.159'
+    """
+    try:
+        return _INDIVIDUAL_ADDRESSES[address]
+    except KeyError:
+        pass
+    assert isinstance(address, int), 'Address should be an integer, got %s instead' % type(address)
+    string = sys.intern('{}.{}.{}'.format((address >> 12) & 0xf, (address >> 8) & 0xf, address & 0xff))
+    if 0 <= address <= 0xffff:
+        _cache(_INDIVIDUAL_ADDRESSES, address, string)
+    return string
+
+
+def pack_knx_address(address):
+    """Pack physical/individual KNX address.
+
+    pack_knx_address('15.15.255')
+    65535
+    """
+    try:
+        return _PACKED_INDIVIDUAL_ADDRESSES[address]
+    except KeyError:
+        pass
+    assert isinstance(address, str), 'Address should be a string, got %s instead' % type(address)
+    parts = address.split('.')
+    packed = (int(parts[0]) << 12) + (int(parts[1]) << 8) + (int(parts[2]))
+    if 0 <= packed <= 0xffff:
+        _cache(_PACKED_INDIVIDUAL_ADDRESSES, address, packed)
+    return packed
+
+
+def parse_knx_group_address(address, levels=3):
+    """Parse KNX group address, in the 3 level (main/middle/sub)
+    or the 2 level (main/sub) notation.
+
+    parse_knx_group_address(12345)
+    '6/0/57'
+    parse_knx_group_address(12345, levels=2)
+    '6/57'
+    """
+    table = _GROUP_ADDRESSES if levels == 3 else _GROUP_ADDRESSES_2_LEVEL
+    try:
+        return table[address]
+    except KeyError:
+        pass
+    assert isinstance(address, int), 'Address should be an integer, got %s instead' % type(address)
+    if levels == 3:
+        string = '{}/{}/{}'.format((address >> 11) & 0x1f, (address >> 8) & 0x7, address & 0xff)
+    elif levels == 2:
+        string = '{}/{}'.format((address >> 11) & 0x1f, address & 0x7ff)
+    else:
+        raise ValueError('Group addresses have 2 or 3 levels, not %s' % levels)
+    string = sys.intern(string)
+    if 0 <= address <= 0xffff:
+        _cache(table, address, string)
+    return string
+
+
+def pack_knx_group_address(address):
+    """Pack KNX group address in the 3 or 2 level notation.
+
+    pack_knx_group_address('6/0/57')
+    12345
+    pack_knx_group_address('6/57')
+    12345
+    """
+    try:
+        return _PACKED_GROUP_ADDRESSES[address]
+    except KeyError:
+        pass
+    assert isinstance(address, str), 'Address should be a string, got %s instead' % type(address)
+    parts = address.split('/')
+    if len(parts) == 2:
+        packed = (int(parts[0]) << 11) + int(parts[1])
+    else:
+        packed = (int(parts[0]) << 11) + (int(parts[1]) << 8) + (int(parts[2]))
+    if 0 <= packed <= 0xffff:
+        _cache(_PACKED_GROUP_ADDRESSES, address, packed)
+    return packed
+
+
+def is_valid_individual_address(address):
+    """Check if address is an individual address string
+    of a bus device, e.g. '1.1.12'. Area 0 is not allowed."""
+    assert isinstance(address, str)
+    try:
+        parts = [int(i) for i in address.split('.')]
+    except ValueError:
+        return False
+    if len(parts) != 3:
+        return False
+    if (parts[0] < 1 or parts[0] > 15) or (parts[1] < 0 or parts[1] > 15):
+        return False
+    if parts[2] < 0 or parts[2] > 255:
+        return False
+    return True
+
+
+def is_valid_group_address(address):
+    """Check if address is a group address string in
+    the 2 or 3 level notation, e.g. '1/257' or '1/1/1'."""
+    assert isinstance(address, str)
+    try:
+        parts = [int(i) for i in address.split('/')]
+    except ValueError:
+        return False
+    if len(parts) < 2 or len(parts) > 3:
+        return False
+    if parts[0] < 0 or parts[0] > 15:
+        return False
+    if len(parts) == 2:
+        return 0 <= parts[1] <= 0x7ff
+    if (parts[1] < 0 or parts[1] > 15) or (parts[2] < 0 or parts[2] > 255):
+        return False
+    return True
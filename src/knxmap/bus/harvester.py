@@ -0,0 +1,264 @@
+"""Read information from many bus devices over all tunnel connections of a gateway."""
+import asyncio
+import codecs
+import collections
+import logging
+import struct
+
+import knxmap.utils
+from knxmap.data.constants import *
+from knxmap.messages import CemiFrame
+from knxmap.targets import KnxBusTargetReport
+
+__all__ = ['KnxBusInfoHarvester']
+
+LOGGER = logging.getLogger(__name__)
+
+
+class KnxBusInfoHarvester(object):
+    """Read the device descriptor, manufacturer, serial number, properties,
+    memory and group address table of bus devices.
+
+    Each device is read in a connection oriented session, so the requests
+    for one device have to be sent one after another. Devices are
+    independent though: every tunnel connection (one per additional
+    individual address of the gateway) takes the next device from a
+    shared queue, so as many devices are read at the same time as there
+    are connections.
+
+    A device gets timeout seconds for all of its reads. Results are
+    written into its KnxBusTargetReport as soon as they arrive, so a
+    device that runs out of time is still reported with everything that
+    has been read until then and a status of 'timeout'. The status of
+    the other devices is 'complete', or 'unauthorized' if auth_key has
+    been rejected. Devices that do not respond to T_Connect or
+    A_DeviceDescriptor_Read are not reported.
+
+    harvest() returns the list of KnxBusTargetReport objects."""
+    def __init__(self, protocols, loop=None, timeout=60, auth_key=0xffffffff,
+                 ignore_auth=False, scheduler=None, gateway=None):
+        self.loop = loop or asyncio.get_event_loop()
+        self.protocols = protocols
+        self.timeout = timeout
+        self.auth_key = auth_key
+        self.ignore_auth = ignore_auth
+        # An optional ScanScheduler, gateway is the host the budget is taken from
+        self.scheduler = scheduler
+        self.gateway = gateway
+        self.targets = collections.deque()
+        self.reports = []
+        self.statuses = collections.Counter()
+        self.t0 = None
+        self.t1 = None
+
+    def __repr__(self):
+        return '%s connections: %s, devices: %s, pending: %s' % (
+            self.__class__.__name__,
+            len(self.protocols),
+            len(self.reports),
+            len(self.targets))
+
+    @asyncio.coroutine
+    def harvest(self, targets):
+        self.targets.extend(targets)
+        self.t0 = self.loop.time()
+        workers = [asyncio.Task(self._worker(p), loop=self.loop)
+                   for p in self.protocols if p.tunnel_established]
+        try:
+            if workers:
+                yield from asyncio.wait(workers)
+        finally:
+            for w in workers:
+                w.cancel()
+            self.t1 = self.loop.time()
+        if self.targets:
+            LOGGER.error('Tunnel connections closed, {} bus devices have not been read'.format(
+                len(self.targets)))
+        LOGGER.info(self.format_report())
+        return self.reports
+
+    @asyncio.coroutine
+    def _worker(self, protocol):
+        while self.targets and protocol.tunnel_established:
+            target = self.targets.popleft()
+            LOGGER.info('BUS INFO: target: {}'.format(target))
+            if self.scheduler:
+                yield from self.scheduler.acquire(self.gateway)
+                ack_errors = protocol.ack_errors
+            try:
+                report = yield from self._harvest_device(protocol, target)
+            finally:
+                if self.scheduler:
+                    self.scheduler.release(self.gateway,
+                                           loss=protocol.ack_errors > ack_errors)
+            if report:
+                self.statuses[report.status] += 1
+                self.reports.append(report)
+
+    @asyncio.coroutine
+    def _harvest_device(self, protocol, target):
+        """Read target with a deadline of timeout seconds, return its
+        KnxBusTargetReport or None if it did not respond."""
+        report = KnxBusTargetReport(address=target, properties=collections.OrderedDict())
+        start = self.loop.time()
+        try:
+            found = yield from asyncio.wait_for(self._read_device(protocol, report),
+                                                self.timeout)
+        except asyncio.TimeoutError:
+            LOGGER.error('Reading bus device {} timed out'.format(target))
+            report.status = 'timeout'
+            found = report.type is not None
+            # Close the session, the device may still be waiting
+            # for an acknowledgement of the interrupted request.
+            yield from protocol.tpci_disconnect(target)
+        report.duration = self.loop.time() - start
+        return report if found else None
+
+    @asyncio.coroutine
+    def _read_device(self, protocol, report):
+        """Fill report with the information of the device, return
+        False if it does not respond to T_Connect or A_DeviceDescriptor_Read."""
+        target = report.address
+        alive = yield from protocol.tpci_connect(target)
+        if not alive:
+            return False
+
+        descriptor = yield from protocol.apci_device_descriptor_read(target)
+        if not descriptor:
+            yield from protocol.tpci_disconnect(target)
+            return False
+
+        dev_desc = struct.unpack('!H', descriptor)[0]
+        report.medium, report.type, report.version = \
+            knxmap.utils.parse_device_descriptor(dev_desc)
+        properties = report.properties
+
+        if report.type > 1:
+            # Read System 2 and System 7 manufacturer ID object
+            manufacturer = yield from protocol.apci_property_value_read(
+                target,
+                property_id=DEVICE_OBJECTS.get('PID_MANUFACTURER_ID'))
+            if isinstance(manufacturer, (str, bytes, bytearray)):
+                manufacturer = int.from_bytes(manufacturer, 'big')
+                report.manufacturer = knxmap.utils.get_manufacturer_by_id(manufacturer)
+
+            # Read the device state
+            device_state_data = yield from protocol.apci_memory_read(
+                target,
+                memory_address=0x0060)
+            if device_state_data:
+                report.device_state = CemiFrame.unpack_cemi_runstate(
+                    int.from_bytes(device_state_data, 'big'))
+
+            # Read the serial number object on System 2 and System 7 devices
+            serial = yield from protocol.apci_property_value_read(
+                target,
+                property_id=DEVICE_OBJECTS.get('PID_SERIAL_NUMBER'))
+            if isinstance(serial, (str, bytes, bytearray)):
+                report.device_serial = codecs.encode(serial, 'hex').decode().upper()
+
+            for object_index, props in OBJECTS.items():
+                x = collections.OrderedDict()
+                for k, v in props.items():
+                    ret = yield from protocol.apci_property_value_read(
+                        target,
+                        property_id=v,
+                        object_index=object_index)
+                    if ret:
+                        x[k.replace('PID_', '')] = codecs.encode(ret, 'hex')
+                if x:
+                    properties[OBJECT_TYPES.get(object_index)] = x
+        else:
+            # Try to MemoryRead the manufacturer ID on System 1 devices.
+            # Note: System 1 devices do not support access controls, so
+            # an authorization request is not needed.
+            manufacturer = yield from protocol.apci_memory_read(
+                target,
+                memory_address=0x0104,
+                read_count=1)
+            if isinstance(manufacturer, (str, bytes, bytearray)):
+                manufacturer = int.from_bytes(manufacturer, 'big')
+                report.manufacturer = knxmap.utils.get_manufacturer_by_id(manufacturer)
+
+            device_state_data = yield from protocol.apci_memory_read(
+                target,
+                memory_address=0x0060)
+            if device_state_data:
+                report.device_state = codecs.encode(device_state_data, 'hex')
+
+            for name, memory_address, read_count in (('Device Type', 0x0105, 2),
+                                                     ('ManData', 0x0101, 3),
+                                                     ('CheckLim', 0x0108, 1),
+                                                     ('User Program', 0x01FE, 1)):
+                ret = yield from protocol.apci_memory_read(
+                    target,
+                    memory_address=memory_address,
+                    read_count=read_count)
+                if ret:
+                    properties[name] = codecs.encode(ret, 'hex')
+
+            start_addr = 0x0100
+            properties['EEPROM_DUMP'] = b''
+            for i in range(51):
+                ret = yield from protocol.apci_memory_read(
+                    target,
+                    memory_address=start_addr,
+                    read_count=5)
+                if ret:
+                    properties['EEPROM_DUMP'] += codecs.encode(ret, 'hex')
+                start_addr += 5
+
+        # Try to read group addresses
+        if report.type == 7:
+            group_address_table = 0x4000
+        else:
+            group_address_table = 0x0116
+
+        if report.type > 1 and not self.ignore_auth:
+            auth_level = yield from protocol.apci_authenticate(
+                target,
+                key=self.auth_key)
+            if auth_level > 0:
+                yield from protocol.tpci_disconnect(target)
+                LOGGER.error('Invalid authentication key for target %s' % target)
+                report.status = 'unauthorized'
+                return True
+
+        ret = yield from protocol.apci_memory_read(
+            target,
+            memory_address=group_address_table,
+            read_count=1)
+        if ret and int.from_bytes(ret, 'big') > 1:
+            byte_count = (int.from_bytes(ret, 'big') * 2) + 1
+            address_table = yield from protocol.apci_memory_read(
+                target,
+                memory_address=group_address_table,
+                read_count=byte_count) # each address is 2 bytes long
+            if address_table:
+                properties['Group Addresses'] = []
+                ga = address_table[3:] # skip length and individual address
+                for addr in [ga[i:i + 2] for i in range(0, len(ga), 2)]:
+                    properties['Group Addresses'].append(
+                        knxmap.utils.parse_knx_group_address(int.from_bytes(addr, 'big')))
+
+        report.status = 'complete'
+        # Properly close the TPCI layer
+        yield from protocol.tpci_disconnect(target)
+        return True
+
+    def report(self):
+        """Return the statistics of the harvest as an ordered dict."""
+        duration = ((self.t1 or self.loop.time()) - self.t0) if self.t0 else 0.0
+        report = collections.OrderedDict()
+        report['connections'] = len(self.protocols)
+        report['devices'] = len(self.reports)
+        report['complete'] = self.statuses['complete']
+        report['timeouts'] = self.statuses['timeout']
+        report['unauthorized'] = self.statuses['unauthorized']
+        report['duration'] = duration
+        return report
+
+    def format_report(self):
+        return ('Bus info: {devices} devices over {connections} connections, {complete} '
+                'complete, {timeouts} timeouts, {unauthorized} unauthorized, '
+                '{duration:.1f} seconds').format(**self.report())
@@ -8,8 +8,11 @@ from datetime import datetime
 import bitstruct
 import baos_knx_parser as knx_parser
 
+from knxmap.address import parse_knx_address, parse_knx_group_address
 from knxmap.database import DatabaseWriter
+from knxcommon.cache import TelegramCache
 from knxmap.bus.tunnel import KnxTunnelConnection
+from knxmap.messages.templates import pack_tunnelling_ack
 from knxmap.data.telegram import Telegram, AckTelegram, UnknownTelegram
 from knxmap.data.constants import *
 from knxmap.messages import parse_message, KnxConnectRequest, KnxConnectResponse, \
@@ -28,6 +31,7 @@ class KnxBusMonitor(KnxTunnelConnection):
             sys.path.insert(0, db_config)
             self.db_config = importlib.import_module('config')
             self.telegram_queue = Queue()
+            self.telegram_cache = TelegramCache()
             self.dbWriter = DatabaseWriter(self.telegram_queue, self.db_config)
             self.dbWriter.start()
         else:
@@ -77,11 +81,10 @@ class KnxBusMonitor(KnxTunnelConnection):
             if CEMI_PRIMITIVES[knx_message.cemi.message_code] == 'L_Data.con' or \
                     CEMI_PRIMITIVES[knx_message.cemi.message_code] == 'L_Data.ind' or \
                     CEMI_PRIMITIVES[knx_message.cemi.message_code] == 'L_Busmon.ind':
-                tunnelling_ack = KnxTunnellingAck(
-                    communication_channel=knx_message.communication_channel,
-                    sequence_count=knx_message.sequence_counter)
+                tunnelling_ack = pack_tunnelling_ack(knx_message.communication_channel,
+                                                     knx_message.sequence_counter)
                 LOGGER.trace_outgoing(tunnelling_ack)
-                self.transport.sendto(tunnelling_ack.get_message())
+                self.transport.sendto(tunnelling_ack)
         elif isinstance(knx_message, KnxTunnellingAck):
             self.print_message(knx_message)
             #self.enqueue_message(knx_message)
@@ -110,9 +113,9 @@ class KnxBusMonitor(KnxTunnelConnection):
                     apci = cemi.apci
         if cemi.knx_destination and cemi.extended_control_field and \
                 cemi.extended_control_field.get('address_type'):
-            dst_addr = message.parse_knx_group_address(cemi.knx_destination)
+            dst_addr = parse_knx_group_address(cemi.knx_destination)
         elif cemi.knx_destination:
-            dst_addr = message.parse_knx_address(cemi.knx_destination)
+            dst_addr = parse_knx_address(cemi.knx_destination)
         if self.group_monitor:
             format = ('[ chan_id: {chan_id}, seq_no: {seq_no}, message_code: {msg_code}, '
                       'source_addr: {src_addr}, dest_addr: {dst_addr}, tpci_type: {tpci_type}, '
@@ -120,7 +123,7 @@ class KnxBusMonitor(KnxTunnelConnection):
                 chan_id=message.communication_channel,
                 seq_no=message.sequence_counter,
                 msg_code=CEMI_PRIMITIVES.get(cemi.message_code),
-                src_addr=message.parse_knx_address(cemi.knx_source),
+                src_addr=parse_knx_address(cemi.knx_source),
                 dst_addr=dst_addr,
                 tpci_type=_CEMI_TPCI_TYPES.get(tpci.tpci_type),
                 tpci_seq=tpci.sequence,
@@ -148,7 +151,7 @@ class KnxBusMonitor(KnxTunnelConnection):
                 cemi = data[header_len+add_len:]
 
                 # parse cEMI and create Telegram/AckTelegram object
-                parsed_telegram = knx_parser.parse_knx_telegram(cemi)
+                parsed_telegram = self.telegram_cache.parse(cemi)
                 if isinstance(parsed_telegram, knx_parser.KnxBaseTelegram):
                     t = Telegram()
                     t.timestamp = str(timestamp)
@@ -1,17 +1,134 @@
 import asyncio
+import collections
+import heapq
+import itertools
 import logging
 import struct
 
-import knxmap.utils
 from knxmap.data.constants import *
 from knxmap.exceptions import *
 from knxmap.messages import parse_message, KnxMessage, KnxConnectRequest, KnxConnectResponse, \
                             KnxDisconnectRequest, KnxDisconnectResponse, KnxDeviceConfigurationRequest, \
                             KnxDeviceConfigurationAck, KnxTunnellingRequest, KnxTunnellingAck, \
                             KnxConnectionStateRequest, KnxConnectionStateResponse
+from knxmap.messages.templates import TunnellingRequestTemplates, pack_tunnelling_ack, \
+                                      pack_device_configuration_ack
 
 LOGGER = logging.getLogger(__name__)
 
+# The service of the response to a request that is only confirmed by the gateway
+L_DATA_CON = 'L_Data.con'
+M_PROP_READ_CON = 'M_PropRead.con'
+
+# The responses to APCI requests, their L_Data.con only tells
+# that the request has been delivered on the bus.
+_APCI_RESPONSES = {
+    CEMI_APCI_TYPES[request]: response for request, response in (
+        ('A_DeviceDescriptor_Read', 'A_DeviceDescriptor_Response'),
+        ('A_PropertyValue_Read', 'A_PropertyValue_Response'),
+        ('A_PropertyDescription_Read', 'A_PropertyDescription_Response'),
+        ('A_Memory_Read', 'A_Memory_Response'),
+        ('A_Authorize_Request', 'A_Authorize_Response'),
+        ('A_Key_Write', 'A_Key_Response'),
+        ('A_IndividualAddress_Read', 'A_IndividualAddress_Response'),
+        ('A_UserManufacturerInfo_Read', 'A_UserManufacturerInfo_Response'))}
+_APCI_NAMES = {v: k for k, v in CEMI_APCI_TYPES.items()}
+
+
+def _property_key(request):
+    """The service of the M_PropRead.con to a M_PropRead.req, it
+    repeats the property and start index of the request."""
+    return (M_PROP_READ_CON, request.object_type, request.object_instance,
+            request.property, request.start_index)
+
+
+class PendingRequests(object):
+    """Futures of requests that wait for a response, keyed by
+    (address, service) of the expected response.
+
+    Responses are matched with a single dict lookup the moment they
+    arrive. Every request has a deadline, after which its future is
+    resolved with False. Deadlines are kept in a heap that is served by
+    a single timer, extending a deadline pushes a new entry and leaves
+    the old one to be skipped when it comes up."""
+    def __init__(self, loop):
+        self.loop = loop
+        # Maps (address, service) to [future, deadline]
+        self.requests = {}
+        self.deadlines = []
+        self.counter = itertools.count()
+        self.timer = None
+        self.timer_deadline = None
+
+    def __len__(self):
+        return len(self.requests)
+
+    def __contains__(self, key):
+        return key in self.requests
+
+    def add(self, address, service, timeout):
+        """Return the future for the response service from address.
+        A request that is still waiting for the same response is
+        resolved with False, it can not be told apart any more."""
+        key = (address, service)
+        self.resolve(address, service, False)
+        future = asyncio.Future(loop=self.loop)
+        self.requests[key] = [future, None]
+        self.extend(address, service, timeout)
+        return future
+
+    def extend(self, address, service, timeout):
+        """Set the deadline of a request to timeout seconds from now."""
+        request = self.requests.get((address, service))
+        if request is None:
+            return
+        deadline = self.loop.time() + timeout
+        request[1] = deadline
+        heapq.heappush(self.deadlines, (deadline, next(self.counter), (address, service)))
+        if self.timer_deadline is None or deadline < self.timer_deadline:
+            self._schedule(deadline)
+
+    def resolve(self, address, service, value):
+        """Resolve the request for service from address with value,
+        return False if there is no such request."""
+        request = self.requests.pop((address, service), None)
+        if request is None:
+            return False
+        if not request[0].done():
+            request[0].set_result(value)
+        return True
+
+    def discard(self, address, service, future):
+        """Forget the request without resolving its future."""
+        request = self.requests.get((address, service))
+        if request and request[0] is future:
+            del self.requests[(address, service)]
+
+    def fail(self, address=None):
+        """Resolve all requests, or all of address, with False."""
+        for key in list(self.requests):
+            if address is None or key[0] == address:
+                self.resolve(key[0], key[1], False)
+
+    def _schedule(self, deadline):
+        if self.timer:
+            self.timer.cancel()
+        self.timer = self.loop.call_at(deadline, self._expire)
+        self.timer_deadline = deadline
+
+    def _expire(self):
+        self.timer = None
+        self.timer_deadline = None
+        now = self.loop.time()
+        while self.deadlines and self.deadlines[0][0] <= now:
+            deadline, _, key = heapq.heappop(self.deadlines)
+            request = self.requests.get(key)
+            if request and request[1] == deadline:
+                LOGGER.debug('No {} from {}'.format(key[1], key[0]))
+                self.resolve(key[0], key[1], False)
+        if self.deadlines:
+            self._schedule(self.deadlines[0][0])
+
 
 class KnxTunnelConnection(asyncio.DatagramProtocol):
     """Communicate with bus devices via a KNX gateway using TunnellingRequests. A tunneling
@@ -23,21 +140,28 @@ class KnxTunnelConnection(asyncio.DatagramProtocol):
         self.future = future
         self.connection_type = connection_type
         self.layer_type = layer_type
-        self.target_futures = {}
         self.loop = loop or asyncio.get_event_loop()
+        # Requests that wait for a response
+        self.pending = PendingRequests(self.loop)
         self.transport = None
         self.peername = None
         self.sockname = None
         self.tunnel_established = False
         self.communication_channel = None
+        self.templates = None  # preassembled frames, available once the tunnel is established
         self.sequence_count = 0  # sequence counter in KNX body
         self.tpci_seq_counts = {}  # NCD/NPD counter for each TPCI connection
         self.knx_source_address = knx_source
-        self.response_queue = []
+        # Responses that arrived without a request waiting for them
+        self.unclaimed = collections.deque(maxlen=64)
         self.ndp_defer_time = ndp_defer_time
         self.tunnel_timeout = tunnel_timeout
         self.nat_mode = nat_mode
         self.wait = None
+        # TUNNELLING_ACKs with an error status
+        self.ack_errors = 0
+        # Futures for TUNNELLING_ACKs, by sequence counter
+        self.ack_futures = {}
 
     def connection_made(self, transport):
         """The connection setup function that takes care of:
@@ -59,26 +183,12 @@ class KnxTunnelConnection(asyncio.DatagramProtocol):
         self.transport.sendto(connect_request.get_message())
         # Schedule CONNECTIONSTATE_REQUEST to keep the connection alive
         self.loop.call_later(50, self.knx_keep_alive)
-        self.loop.call_later(1, self.poll_response_queue)
         self.wait = self.loop.call_later(self.tunnel_timeout,
                                          self.connection_timeout)
 
     def connection_timeout(self):
         LOGGER.debug('Tunnel connection timed out')
-        if self.target_futures:
-            for k, v in self.target_futures.items():
-                if not v.done():
-                    v.set_result(False)
-        if self.response_queue:
-            for r in self.response_queue:
-                try:
-                    cemi_msg_code = r.cemi.message_code
-                    cemi_tpci_type = r.cemi.tpci.tpci_type
-                    cemi_apci_type = None
-                    if r.cemi.apci:
-                        cemi_apci_type = r.cemi.apci.apci_type
-                except AttributeError:
-                    continue
+        self.pending.fail()
         if self.tunnel_established:
             self.knx_tunnel_disconnect()
         self.transport.close()
@@ -90,54 +200,14 @@ class KnxTunnelConnection(asyncio.DatagramProtocol):
         self.wait = self.loop.call_later(self.tunnel_timeout,
                                          self.connection_timeout)
 
-    def poll_response_queue(self):
-        """Check if there if there is a KNX message for a
-        target that arrived out-of-band."""
-        if self.response_queue:
-            for response in self.response_queue:
-                if isinstance(response, bool):
-                    self.response_queue.remove(response)
-                    continue
-                try:
-                    src_addr = knxmap.utils.parse_knx_address(response.cemi.knx_source)
-                    dst_addr = knxmap.utils.parse_knx_address(response.cemi.knx_destination)
-                except AttributeError:
-                    src_addr = knxmap.utils.unpack_ip_address(response.source)
-                    dst_addr = self.sockname[0]
-                if not src_addr and not dst_addr:
-                    continue
-                if dst_addr in self.target_futures.keys():
-                    if not self.target_futures[dst_addr].done():
-                        self.target_futures[dst_addr].set_result(response)
-                    del self.target_futures[dst_addr]
-                elif src_addr in self.target_futures.keys():
-                    if not self.target_futures[src_addr].done():
-                        self.target_futures[src_addr].set_result(response)
-                    del self.target_futures[src_addr]
-        # Reschedule polling
-        self.loop.call_later(2, self.poll_response_queue)
-
-    def process_target(self, target, value, knx_msg=None):
-        """When a L_Data.con NDP request request arrives after
-        e.g. a A_DeviceDescriptor_Read, check if we get a
-        L_Data.ind NDP request with the actual data.
-
-        Note: Between a L_Data.con NDP and a L_Data.ind NDP
-        there will most likely (pretty sure) be a L_Data.ind
-        NCD request."""
-        if target in self.target_futures.keys():
-            if not self.target_futures[target].done():
-                self.target_futures[target].set_result(value)
-                del self.target_futures[target]
-        else:
-            if isinstance(value, KnxMessage):
-                # If value is a KnxMessage itself,
-                # jsut add it to the response_queue.
-                self.response_queue.append(value)
-            elif knx_msg and isinstance(knx_msg, KnxMessage):
-                # If knx_msg is set, append it to
-                # the response_queue.
-                self.response_queue.append(knx_msg)
+    def process_response(self, address, service, value, knx_msg=None):
+        """Resolve the request that waits for service from address.
+        If there is none, the message is kept in self.unclaimed."""
+        if not self.pending.resolve(address, service, value):
+            knx_msg = value if isinstance(value, KnxMessage) else knx_msg
+            if knx_msg is not None:
+                LOGGER.debug('Unclaimed {} from {}'.format(service, address))
+                self.unclaimed.append(knx_msg)
 
     def datagram_received(self, data, addr):
         """This function gets called whenever a data packet is received. It
@@ -153,7 +223,7 @@ class KnxTunnelConnection(asyncio.DatagramProtocol):
             return
         knx_msg.set_peer(addr)
         LOGGER.trace_incoming(knx_msg)
-        knx_service_type = knx_msg.header.get('service_type') >> 8
+        knx_service_type = knx_msg.header.service_type >> 8
         if knx_service_type is 0x02:  # Core
             self.handle_core_services(knx_msg)
         elif knx_service_type is 0x03:  # Device Management
@@ -173,6 +243,8 @@ class KnxTunnelConnection(asyncio.DatagramProtocol):
                 self.communication_channel = knx_msg.communication_channel
                 if not self.knx_source_address:
                     self.knx_source_address = knx_msg.data_block.get('knx_address')
+                self.templates = TunnellingRequestTemplates(self.communication_channel,
+                                                            self.knx_source_address)
                 self.future.set_result(True)
             else:
                 #LOGGER.error('Establishing tunnel connection failed: %s' %
@@ -196,7 +268,7 @@ class KnxTunnelConnection(asyncio.DatagramProtocol):
                 self.future.set_result(None)
         else:
             LOGGER.error('Unknown Core Service message: {}'.format(
-                knx_msg.header.get('service_type')))
+                knx_msg.header.service_type))
 
     def handle_configuration_services(self, knx_msg):
         if isinstance(knx_msg, KnxDeviceConfigurationRequest):
@@ -207,20 +279,23 @@ class KnxTunnelConnection(asyncio.DatagramProtocol):
                         LOGGER.debug(CEMI_ERROR_CODES.get(knx_msg.data[0]))
                     else:
                         LOGGER.debug('An unknown error occured')
-                    self.process_target(knx_msg.source, False, knx_msg)
+                    # None tells a rejected request apart from one
+                    # that has not been answered in time (False)
+                    self.process_response(knx_msg.source, _property_key(knx_msg), None,
+                                          knx_msg)
                 else:
-                    self.process_target(knx_msg.source, knx_msg)
-            conf_ack = KnxDeviceConfigurationAck(
-                communication_channel=knx_msg.communication_channel,
-                sequence_count=knx_msg.sequence_count)
+                    self.process_response(knx_msg.source, _property_key(knx_msg), knx_msg)
+            conf_ack = pack_device_configuration_ack(knx_msg.communication_channel,
+                                                     knx_msg.sequence_count)
             LOGGER.trace_outgoing(conf_ack)
-            self.transport.sendto(conf_ack.get_message())
+            self.transport.sendto(conf_ack)
         elif isinstance(knx_msg, KnxDeviceConfigurationAck):
-            # TODO: is there anything to do with an ACK?
-            pass
+            ack_future = self.ack_futures.pop(knx_msg.sequence_counter, None)
+            if ack_future and not ack_future.done():
+                ack_future.set_result(knx_msg.status)
         else:
             LOGGER.error('Unknown Configuration Servuce message: {}'.format(
-                knx_msg.header.get('service_type')))
+                knx_msg.header.service_type))
 
     def handle_tunnel_services(self, knx_msg):
         if isinstance(knx_msg, KnxTunnellingRequest):
@@ -246,52 +321,40 @@ class KnxTunnelConnection(asyncio.DatagramProtocol):
                     # or an error happened (NCD).
                     if knx_msg.cemi.control_field.get('confirm'):
                         # If the confirm flag is set, the device is not alive
-                        self.process_target(knx_dst, False, knx_msg)
+                        self.process_response(knx_dst, L_DATA_CON, False, knx_msg)
                     else:
                         # If the confirm flag is not set, the device is alive
-                        self.process_target(knx_dst, True, knx_msg)
+                        self.process_response(knx_dst, L_DATA_CON, True, knx_msg)
 
                         if cemi_tpci_type == CEMI_TPCI_TYPES.get('UCD'):
                             # For each alive device, create a new sequence counter
                             self.tpci_seq_counts[knx_dst] = 0
 
                 elif cemi_tpci_type == CEMI_TPCI_TYPES.get('NDP'):
-                    # If we get a confirmation for our device descriptor request,
-                    # check if L_Data.ind arrives.
-                    if cemi_apci_type in [CEMI_APCI_TYPES.get('A_DeviceDescriptor_Read'),
-                                          CEMI_APCI_TYPES.get('A_PropertyValue_Read')]:
-                        self.loop.call_later(self.ndp_defer_time,
-                                             self.process_target,
-                                             knx_dst,
-                                             False,
-                                             knx_msg)
+                    response = _APCI_RESPONSES.get(cemi_apci_type)
+                    if response:
+                        # The request has been delivered, its response is
+                        # a L_Data.ind that has to arrive within ndp_defer_time.
+                        if knx_msg.cemi.control_field.get('confirm'):
+                            self.pending.resolve(knx_dst, response, False)
+                        else:
+                            self.pending.extend(knx_dst, response, self.ndp_defer_time)
                     elif cemi_apci_type in [CEMI_APCI_TYPES.get('A_Restart'),
                                             CEMI_APCI_TYPES.get('A_Memory_Write')]:
-                        self.process_target(knx_dst, True, knx_msg)
+                        self.process_response(knx_dst, L_DATA_CON, True, knx_msg)
 
                 elif cemi_tpci_type == CEMI_TPCI_TYPES.get('UDP'):
                     # After e.g. an A_GroupValue_Write we just get a
                     # L_Data.con for a UDP.
-                    if knx_dst in self.target_futures.keys() and \
-                            not self.target_futures[knx_dst].done():
-                        self.target_futures[knx_dst].set_result(False)
-                        del self.target_futures[knx_dst]
-                    else:
-                        self.response_queue.append(knx_msg)
+                    self.process_response(knx_dst, L_DATA_CON, False, knx_msg)
 
             elif cemi_msg_code == CEMI_MSG_CODES.get('L_Data.ind'):
 
                 if cemi_tpci_type == CEMI_TPCI_TYPES.get('UCD'):
-                    # TODO: will this even happen?
-                    # TODO: doesn't it need to use knx_src instead of knx_dst?
-                    if knx_msg.cemi.tpci.status is 1:
-                        # TODO: why checking status here? pls document why
-                        if knx_dst in self.target_futures.keys():
-                            if not self.target_futures[knx_dst].done():
-                                self.target_futures[knx_dst].set_result(False)
-                                del self.target_futures[knx_dst]
-                        else:
-                            self.response_queue.append(knx_msg)
+                    if knx_msg.cemi.tpci.status == 1:
+                        # A T_Disconnect from the device, e.g. after its connection
+                        # timed out. None of the pending requests will be answered.
+                        self.pending.fail(knx_src)
                 elif cemi_tpci_type == CEMI_TPCI_TYPES.get('NCD'):
                     # If we sent e.g. a A_DeviceDescriptor_Read, this
                     # would arrive right before the actual data.
@@ -320,49 +383,44 @@ class KnxTunnelConnection(asyncio.DatagramProtocol):
                             knx_src=knx_src,
                             data=knx_msg.cemi.data))
 
-                    # Check if there is still a confirmation packet
-                    # left in the queue.
-                    for r in self.response_queue:
-                        if isinstance(r, KnxTunnellingRequest) and \
-                                knx_src == r.parse_knx_address(r.cemi.knx_destination) and \
-                                knx_dst == r.parse_knx_address(r.cemi.knx_source) and \
-                                r.cemi.message_code == CEMI_MSG_CODES.get('L_Data.con') and \
-                                r.cemi.tpci.tpci_type == CEMI_TPCI_TYPES.get('NDP'):
-                            self.response_queue.remove(r)
-
-                    # If we receive any Numbered Data Packets for
-                    # targets without futures, add the knx_source
-                    # to the response queue for later processing.
-                    self.process_target(knx_src, knx_msg)
+                    self.process_response(knx_src, _APCI_NAMES.get(cemi_apci_type), knx_msg)
 
             # If we receive any L_Data.con or L_Data.ind from a KNXnet/IP gateway
             # we have to reply with a tunnelling ack.
             if cemi_msg_code in [CEMI_MSG_CODES.get('L_Data.con'),
                                  CEMI_MSG_CODES.get('L_Data.ind')]:
-                tunnelling_ack = KnxTunnellingAck(
-                    communication_channel=knx_msg.communication_channel,
-                    sequence_count=knx_msg.sequence_counter)
+                tunnelling_ack = pack_tunnelling_ack(knx_msg.communication_channel,
+                                                     knx_msg.sequence_counter)
                 LOGGER.trace_outgoing(tunnelling_ack)
-                self.transport.sendto(tunnelling_ack.get_message())
+                self.transport.sendto(tunnelling_ack)
 
         elif isinstance(knx_msg, KnxTunnellingAck):
             # TODO: do we have to increase any sequence here?
             LOGGER.debug('Tunnelling ACK reqceived')
+            ack_future = self.ack_futures.pop(knx_msg.sequence_counter, None)
+            if ack_future and not ack_future.done():
+                ack_future.set_result(knx_msg.status)
             if knx_msg.status:
+                self.ack_errors += 1
                 LOGGER.error('An error occured during frame transmission')
         else:
             LOGGER.error('Unknown Tunnelling Service message: {}'.format(
-                knx_msg.header.get('service_type')))
+                knx_msg.header.service_type))
 
-    def send_data(self, data, target=None):
+    def send_data(self, data, target=None, service=L_DATA_CON, timeout=None):
         """A wrapper for sendto() that takes care of incrementing the sequence counter.
 
+        The returned future is resolved with the response service from
+        target, or with False if there is none within timeout seconds
+        (tunnel_timeout by default).
+
         Note: the sequence counter field is only 1 byte. After incrementing the counter
         to 255, it seems to be OK to just start over from 0. At least this applies
         to the tested devices."""
-        f = asyncio.Future()
         if target:
-            self.target_futures[target] = f
+            f = self.pending.add(target, service, timeout or self.tunnel_timeout)
+        else:
+            f = asyncio.Future(loop=self.loop)
         self.transport.sendto(data)
         if self.sequence_count == 255:
             self.sequence_count = 0
@@ -370,28 +428,136 @@ class KnxTunnelConnection(asyncio.DatagramProtocol):
             self.sequence_count += 1
         return f
 
+    @asyncio.coroutine
+    def send_data_acked(self, data, target=None, service=L_DATA_CON, timeout=None,
+                        ack_timeout=1):
+        """Like send_data(), but wait until the gateway acknowledged the
+        TUNNELLING_REQUEST. If there is no TUNNELLING_ACK within ack_timeout
+        seconds, the request is repeated once, as the tunnelling protocol
+        demands.
+
+        :return: The future of send_data() and the status of the
+        TUNNELLING_ACK, None if there was none.
+        """
+        sequence_count = self.sequence_count
+        ack_future = asyncio.Future(loop=self.loop)
+        self.ack_futures[sequence_count] = ack_future
+        future = self.send_data(data, target, service, timeout)
+        for _try in range(2):
+            if _try:
+                LOGGER.debug('Repeating TUNNELLING_REQUEST {}'.format(sequence_count))
+                self.transport.sendto(data)
+            try:
+                status = yield from asyncio.wait_for(asyncio.shield(ack_future), ack_timeout)
+                return future, status
+            except asyncio.TimeoutError:
+                continue
+        self.ack_futures.pop(sequence_count, None)
+        return future, None
+
+    @asyncio.coroutine
+    def tpci_connect_pipelined(self, targets, window=8, timeout=2, callback=None,
+                               connected=None):
+        """Send a T_Connect to each of targets, with up to window of them
+        waiting for their L_Data.con at the same time.
+
+        The gateway only accepts a TUNNELLING_REQUEST after it acknowledged
+        the previous one, so requests are sent one by one, but the next one
+        does not wait for the bus. L_Data.con messages are matched to the
+        targets by their destination address. Targets without L_Data.con
+        within timeout seconds are not alive. Targets that are alive are
+        disconnected again right away.
+
+        :param callback: Called with target and alive for every target as
+        soon as it is known whether it is alive.
+        :param connected: A coroutine function that is called with every
+        alive target before it is disconnected, e.g. to read its device
+        descriptor over the connection. No T_Connect is sent meanwhile.
+        :return: An ordered dict of targets to True if they are alive.
+        """
+        results = collections.OrderedDict()
+        # Maps futures of T_Connect and T_Disconnect requests
+        # to (target, True for T_Connect)
+        pending = {}
+        targets = iter(targets)
+        exhausted = False
+        while pending or not exhausted:
+            while not exhausted and len(pending) < window and self.tunnel_established:
+                target = next(targets, None)
+                if target is None:
+                    exhausted = True
+                    break
+                if target in results:
+                    if callback:
+                        callback(target, results[target])
+                    continue
+                tunnel_request = self.templates.tpci_connect(
+                    self.sequence_count, KnxMessage.pack_knx_address(target))
+                LOGGER.trace_outgoing(tunnel_request)
+                future, status = yield from self.send_data_acked(tunnel_request, target,
+                                                                 timeout=timeout)
+                if status is None or status:
+                    LOGGER.debug('T_Connect to {} has not been accepted'.format(target))
+                pending[future] = (target, True)
+            if not self.tunnel_established:
+                exhausted = True
+            if not pending:
+                break
+            # Every future is resolved by its deadline at the latest
+            done, _ = yield from asyncio.wait(list(pending), return_when=asyncio.FIRST_COMPLETED)
+            for future in done:
+                target, connect = pending.pop(future)
+                if not connect:
+                    continue
+                alive = future.result() is True
+                results[target] = alive
+                if alive and connected:
+                    yield from connected(target)
+                if alive:
+                    tunnel_request = self.templates.tpci_disconnect(
+                        self.sequence_count, KnxMessage.pack_knx_address(target))
+                    LOGGER.trace_outgoing(tunnel_request)
+                    # The L_Data.con of the T_Disconnect must have arrived before
+                    # the target is connected again, so it is pending as well.
+                    disconnect, _ = yield from self.send_data_acked(tunnel_request, target,
+                                                                    timeout=timeout)
+                    pending[disconnect] = (target, False)
+                if callback:
+                    callback(target, alive)
+        return results
+
     def tpci_connect(self, target):
-        tunnel_request = self.make_tunnel_request(target)
-        tunnel_request.tpci_unnumbered_control_data('CONNECT')
+        tunnel_request = self.templates.tpci_connect(
+            self.sequence_count, KnxMessage.pack_knx_address(target))
         LOGGER.trace_outgoing(tunnel_request)
-        return self.send_data(tunnel_request.get_message(), target)
+        return self.send_data(tunnel_request, target)
 
     def tpci_disconnect(self, target):
-        tunnel_request = self.make_tunnel_request(target)
-        tunnel_request.tpci_unnumbered_control_data('DISCONNECT')
+        tunnel_request = self.templates.tpci_disconnect(
+            self.sequence_count, KnxMessage.pack_knx_address(target))
         LOGGER.trace_outgoing(tunnel_request)
-        return self.send_data(tunnel_request.get_message(), target)
-
-    def tpci_send_ncd(self, target):
-        tunnel_request = self.make_tunnel_request(target)
-        tunnel_request.tpci_numbered_control_data('ACK', sequence=self.tpci_seq_counts.get(target))
+        return self.send_data(tunnel_request, target)
+
+    def tpci_send_ncd(self, target, tpci_sequence=None):
+        """Send a T_ACK for the response of target to the current request and
+        increment the TPCI sequence counter. If tpci_sequence is given, the
+        response with this sequence number is acknowledged instead, e.g. a
+        late one, and the counter is left alone."""
+        if tpci_sequence is not None:
+            tunnel_request = self.templates.tpci_ack(
+                self.sequence_count, KnxMessage.pack_knx_address(target), tpci_sequence)
+            LOGGER.trace_outgoing(tunnel_request)
+            return self.send_data(tunnel_request, target)
+        tunnel_request = self.templates.tpci_ack(
+            self.sequence_count, KnxMessage.pack_knx_address(target),
+            self.tpci_seq_counts.get(target))
         # increment TPCI sequence counter
         if self.tpci_seq_counts.get(target) == 15:
             self.tpci_seq_counts[target] = 0
         else:
             self.tpci_seq_counts[target] += 1
         LOGGER.trace_outgoing(tunnel_request)
-        return self.send_data(tunnel_request.get_message(), target)
+        return self.send_data(tunnel_request, target)
 
     def make_tunnel_request(self, knx_dst):
         """A helper function that returns a KnxTunnellingRequest that is already predefined
@@ -406,8 +572,8 @@ class KnxTunnelConnection(asyncio.DatagramProtocol):
         tunnel_request.set_peer(self.transport.get_extra_info('sockname'))
         return tunnel_request
 
-    def configuration_request(self, target, object_type=0, object_instance=1,
-                              property=0, num_elements=1, start_index=1):
+    def _make_configuration_request(self, object_type=0, object_instance=1,
+                                    property=0, num_elements=1, start_index=1):
         conf_request = KnxDeviceConfigurationRequest(
             sockname=self.transport.get_extra_info('sockname'),
             communication_channel=self.communication_channel,
@@ -418,7 +584,121 @@ class KnxTunnelConnection(asyncio.DatagramProtocol):
             num_elements=num_elements,
             start_index=start_index)
         LOGGER.trace_outgoing(conf_request)
-        return self.send_data(conf_request.get_message(), target[0])
+        return conf_request
+
+    def configuration_request(self, target, object_type=0, object_instance=1,
+                              property=0, num_elements=1, start_index=1):
+        conf_request = self._make_configuration_request(object_type, object_instance,
+                                                        property, num_elements, start_index)
+        return self.send_data(conf_request.get_message(), target[0],
+                              service=_property_key(conf_request))
+
+    @asyncio.coroutine
+    def configuration_read_properties(self, target, properties, object_instance=1,
+                                      window=8, cache=None):
+        """Read the values of properties, (object_type, property) tuples,
+        with M_PropRead requests on a DEVICE_MGMT_CONNECTION.
+
+        The count of elements of all properties is read first, then their
+        elements, at most 15 per request. Requests are sent as soon as the
+        gateway acknowledged the previous one, with up to window of them
+        waiting for their M_PropRead.con. Each M_PropRead.con is matched to
+        its request by the property and start index it repeats.
+
+        If cache, a dict, is given, properties in it are not read again
+        and the results are added to it. It should belong to a single
+        device, e.g. keyed by its serial number. Only values and
+        properties the device rejected (an M_PropRead.con without
+        elements) or reported as empty are cached, reads that failed
+        without a response are tried again next time.
+
+        :return: An ordered dict of (object_type, property) to the bytes of
+        all elements, or False if the property could not be read.
+        """
+        results = collections.OrderedDict()
+        todo = []
+        for key in properties:
+            if key in results:
+                continue
+            if cache is not None and key in cache:
+                results[key] = cache[key]
+            else:
+                results[key] = False
+                todo.append(key)
+        counts = yield from self._configuration_pipeline(
+            target, [(o, p, object_instance, 1, 0) for o, p in todo], window)
+        reads = []
+        # Properties the device answered without a value
+        rejected = set()
+        for object_type, property in todo:
+            # Requests that have not been sent are missing
+            response = counts.get((object_type, property, object_instance, 1, 0), False)
+            if response is None:
+                rejected.add((object_type, property))
+                continue
+            if not response or not response.data:
+                continue
+            count = int.from_bytes(response.data, 'big')
+            if not count:
+                rejected.add((object_type, property))
+            for start_index in range(1, count + 1, 15):
+                reads.append((object_type, property, object_instance,
+                              min(count - start_index + 1, 15), start_index))
+        values = yield from self._configuration_pipeline(target, reads, window)
+        data = collections.OrderedDict()
+        for read in reads:
+            key = read[:2]
+            response = values.get(read, False)
+            if key not in data:
+                data[key] = bytearray()
+            if response is None:
+                rejected.add(key)
+            if data[key] is None or not response or not response.data:
+                data[key] = None
+            else:
+                data[key].extend(response.data)
+        for key in todo:
+            value = data.get(key)
+            results[key] = bytes(value) if value else False
+            if cache is not None and (value or key in rejected):
+                cache[key] = results[key]
+        return results
+
+    @asyncio.coroutine
+    def _configuration_pipeline(self, target, requests, window):
+        """Send a M_PropRead.req for each (object_type, property, object_instance,
+        num_elements, start_index) in requests and return a dict of them to
+        their M_PropRead.con, None if the device rejected the request or
+        False if there was no response in time."""
+        results = {}
+        # Maps futures of the requests to their arguments
+        pending = {}
+        requests = iter(requests)
+        exhausted = False
+        while pending or not exhausted:
+            while not exhausted and len(pending) < window and self.tunnel_established:
+                request = next(requests, None)
+                if request is None:
+                    exhausted = True
+                    break
+                object_type, property, object_instance, num_elements, start_index = request
+                conf_request = self._make_configuration_request(
+                    object_type, object_instance, property, num_elements, start_index)
+                future, status = yield from self.send_data_acked(
+                    conf_request.get_message(), target[0],
+                    service=_property_key(conf_request))
+                if status is None or status:
+                    LOGGER.debug('M_PropRead.req has not been accepted')
+                pending[future] = request
+            if not self.tunnel_established:
+                exhausted = True
+            if not pending:
+                break
+            # Every future is resolved by its deadline at the latest
+            done, _ = yield from asyncio.wait(list(pending), return_when=asyncio.FIRST_COMPLETED)
+            for future in done:
+                results[pending.pop(future)] = future.result()
+        return results
 
     def knx_keep_alive(self):
         """Sending CONNECTIONSTATE_REQUESTS periodically to
@@ -438,10 +718,10 @@ class KnxTunnelConnection(asyncio.DatagramProtocol):
         self.transport.sendto(disconnect_request.get_message())
 
     def knx_tpci_disconnect(self, target):
-        tunnel_request = self.make_tunnel_request(target)
-        tunnel_request.tpci_unnumbered_control_data('DISCONNECT')
+        tunnel_request = self.templates.tpci_disconnect(
+            self.sequence_count, KnxMessage.pack_knx_address(target))
         LOGGER.trace_outgoing(tunnel_request)
-        self.transport.sendto(tunnel_request.get_message())
+        self.transport.sendto(tunnel_request)
 
     @asyncio.coroutine
     def get_device_type(self, target):
@@ -461,11 +741,12 @@ class KnxTunnelConnection(asyncio.DatagramProtocol):
 
     @asyncio.coroutine
     def apci_device_descriptor_read(self, target):
-        tunnel_request = self.make_tunnel_request(target)
-        tunnel_request.apci_device_descriptor_read(
-            sequence=self.tpci_seq_counts.get(target))
+        tunnel_request = self.templates.apci_device_descriptor_read(
+            self.sequence_count, KnxMessage.pack_knx_address(target),
+            self.tpci_seq_counts.get(target))
         LOGGER.trace_outgoing(tunnel_request)
-        value = yield from self.send_data(tunnel_request.get_message(), target)
+        value = yield from self.send_data(tunnel_request, target,
+                                          service='A_DeviceDescriptor_Response')
         yield from self.tpci_send_ncd(target)
         if isinstance(value, KnxTunnellingRequest):
             cemi = value.cemi
@@ -486,7 +767,8 @@ class KnxTunnelConnection(asyncio.DatagramProtocol):
             num_elements=num_elements,
             start_index=start_index)
         LOGGER.trace_outgoing(tunnel_request)
-        value = yield from self.send_data(tunnel_request.get_message(), target)
+        value = yield from self.send_data(tunnel_request.get_message(), target,
+                                          service='A_PropertyValue_Response')
         yield from self.tpci_send_ncd(target)
         if isinstance(value, KnxTunnellingRequest) and \
                 value.cemi.data:
@@ -505,7 +787,8 @@ class KnxTunnelConnection(asyncio.DatagramProtocol):
             num_elements=num_elements,
             start_index=start_index)
         LOGGER.trace_outgoing(tunnel_request)
-        value = yield from self.send_data(tunnel_request.get_message(), target)
+        value = yield from self.send_data(tunnel_request.get_message(), target,
+                                          service='A_PropertyDescription_Response')
         yield from self.tpci_send_ncd(target)
         if isinstance(value, KnxTunnellingRequest) and \
                 value.cemi.data:
@@ -521,27 +804,21 @@ class KnxTunnelConnection(asyncio.DatagramProtocol):
             memory_address=memory_address,
             read_count=read_count)
         LOGGER.trace_outgoing(tunnel_request)
-        knx_msg = yield from self.send_data(tunnel_request.get_message(), target)
-        # TODO: if that works, it should be implemented for all APCI functions!
-        if not isinstance(knx_msg, KnxTunnellingRequest) or \
-                knx_msg.cemi.apci.apci_type == CEMI_APCI_TYPES.get('A_Memory_Response') or \
-                int.from_bytes(knx_msg.cemi.data[:2], 'big') == memory_address:
-            # Put the response back in the queue
-            if not isinstance(knx_msg, bool):
-                self.response_queue.append(knx_msg)
-            yield from asyncio.sleep(.3)
-            knx_msg = None
-            for response in self.response_queue:
-                if isinstance(response, KnxTunnellingRequest) and \
-                        response.cemi and response.cemi.apci and \
-                        response.cemi.apci.apci_type == CEMI_APCI_TYPES.get('A_Memory_Response') or \
-                        int.from_bytes(response.cemi.data[:2], 'big') == memory_address:
-                    knx_msg = response
-                    self.response_queue.remove(response)
-            if not knx_msg:
-                LOGGER.debug('No proper response received')
+        knx_msg = yield from self.send_data(tunnel_request.get_message(), target,
+                                            service='A_Memory_Response')
+        if isinstance(knx_msg, KnxTunnellingRequest) and \
+                int.from_bytes(knx_msg.cemi.data[:2], 'big') != memory_address:
+            # A late response to an earlier request, wait for the one to this
+            # request. The device repeats the late one until it is acknowledged.
+            LOGGER.debug('Ignoring A_Memory_Response for another memory address')
+            future = self.pending.add(target, 'A_Memory_Response', self.ndp_defer_time)
+            yield from self.tpci_send_ncd(target, knx_msg.cemi.tpci.sequence)
+            knx_msg = yield from future
+            if isinstance(knx_msg, KnxTunnellingRequest) and \
+                    int.from_bytes(knx_msg.cemi.data[:2], 'big') != memory_address:
+                knx_msg = None
         yield from self.tpci_send_ncd(target)
-        if knx_msg and knx_msg.cemi.data:
+        if isinstance(knx_msg, KnxTunnellingRequest) and knx_msg.cemi.data:
             return knx_msg.cemi.data[2:]
         else:
             return False
@@ -572,7 +849,8 @@ class KnxTunnelConnection(asyncio.DatagramProtocol):
             level=level,
             key=key)
         LOGGER.trace_outgoing(tunnel_request)
-        value = yield from self.send_data(tunnel_request.get_message(), target)
+        value = yield from self.send_data(tunnel_request.get_message(), target,
+                                          service='A_Key_Response')
         yield from self.tpci_send_ncd(target)
         if isinstance(value, KnxTunnellingRequest) and \
                 value.cemi.data:
@@ -585,12 +863,12 @@ class KnxTunnelConnection(asyncio.DatagramProtocol):
         """Send an A_Authorize_Request to target with the
         supplied key. Returns the access level as an int
         or False if an error occurred."""
-        tunnel_request = self.make_tunnel_request(target)
-        tunnel_request.apci_authorize_request(
-            sequence=self.tpci_seq_counts.get(target),
-            key=key)
+        tunnel_request = self.templates.apci_authorize_request(
+            self.sequence_count, KnxMessage.pack_knx_address(target),
+            self.tpci_seq_counts.get(target), key=key)
         LOGGER.trace_outgoing(tunnel_request)
-        auth = yield from self.send_data(tunnel_request.get_message(), target)
+        auth = yield from self.send_data(tunnel_request, target,
+                                         service='A_Authorize_Response')
         yield from self.tpci_send_ncd(target)
         if isinstance(auth, KnxTunnellingRequest):
             return int.from_bytes(auth.cemi.data, 'big')
@@ -615,7 +893,8 @@ class KnxTunnelConnection(asyncio.DatagramProtocol):
         tunnel_request.apci_individual_address_read(
             sequence=self.tpci_seq_counts.get(target))
         LOGGER.trace_outgoing(tunnel_request)
-        value = yield from self.send_data(tunnel_request.get_message(), target)
+        value = yield from self.send_data(tunnel_request.get_message(), target,
+                                          service='A_IndividualAddress_Response')
         yield from self.tpci_send_ncd(target)
         if isinstance(value, KnxTunnellingRequest) and \
                 value.cemi.data:
@@ -629,7 +908,8 @@ class KnxTunnelConnection(asyncio.DatagramProtocol):
         tunnel_request.apci_user_manufacturer_info_read(
             sequence=self.tpci_seq_counts.get(target))
         LOGGER.trace_outgoing(tunnel_request)
-        value = yield from self.send_data(tunnel_request.get_message(), target)
+        value = yield from self.send_data(tunnel_request.get_message(), target,
+                                          service='A_UserManufacturerInfo_Response')
         yield from self.tpci_send_ncd(target)
         if isinstance(value, KnxTunnellingRequest) and \
                 value.cemi.data:
@@ -19,8 +19,11 @@ from knxmap.data.constants import *
 from knxmap.messages import CemiFrame, KnxDescriptionResponse, KnxEmi1Frame
 from knxmap.gateway import *
 from knxmap.targets import *
+from knxmap.scheduler import *
 from knxmap.exceptions import *
 from knxmap.bus.tunnel import KnxTunnelConnection
+from knxmap.bus.harvester import KnxBusInfoHarvester
+from knxmap.bus.bruteforce import *
 from knxmap.bus.router import KnxRoutingConnection
 from knxmap.bus.monitor import KnxBusMonitor
 
@@ -47,8 +50,9 @@ class KnxMap(object):
         # The number of concurrent tunnel connection
         # (0 means use as much as a device supports)
         self.max_connections = max_connections
-        # q contains all KNXnet/IP gateways
-        self.q = Queue(loop=self.loop)
+        # q contains the KNXnet/IP gateways that are about to be scanned,
+        # it is bounded and filled from the targets while workers consume it
+        self.q = Queue(maxsize=max_workers * 2, loop=self.loop)
         # bus_queues is a dict containing a bus queue for each KNXnet/IP gateway
         self.bus_queues = {}
         # bus_protocols is a list of all bus protocol instances for proper connection shutdown
@@ -58,6 +62,17 @@ class KnxMap(object):
         # bus_devices is a list of KnxBusTargetReport objects, one for each found bus device
         self.bus_devices = set()
         self.bus_info = False
+        # Maps gateways to the alive bus devices that are read with
+        # bus_info, and the seconds each of them may take
+        self.bus_info_targets = {}
+        self.bus_info_timeout = 60
+        # Maps gateways to the KnxBusTargetReports of the bus devices found through them
+        self.gateway_bus_devices = {}
+        # The count of T_Connect probes in flight per tunnel
+        # connection, 1 scans one bus device after another
+        self.bus_window = 1
+        # Maps (gateway, line) to a dict with the scan time of each bus line
+        self.bus_lines = collections.OrderedDict()
         self.t0 = time.time()
         self.t1 = None
         self.iface = None
@@ -73,18 +88,51 @@ class KnxMap(object):
         self.testing = testing
         self.ignore_auth = ignore_auth
         self.nat_mode = nat_mode
+        # Read all properties of OBJECTS from gateways, not only the ones
+        # needed for the scan, property_cache maps gateway serials to the
+        # properties read from them
+        self.configuration_properties = False
+        self.property_cache = {}
+        # An optional ScanScheduler that adapts the requests in flight
+        self.scheduler = None
+        # An optional ScanStore for the results, with rescan_age targets
+        # probed within rescan_age seconds are not probed again
+        self.store = None
+        self.rescan_age = 0
+        self.fresh_targets = TargetRanges()
         if targets:
             self.set_targets(targets)
         else:
             self.targets = set()
 
     def set_targets(self, targets):
+        """Set the targets, any iterable of (host, port) tuples with
+        a length. They are not expanded before they are scanned."""
         self.targets = targets
+
+    def _scan_targets(self):
+        """Iterate the targets that are not in fresh_targets."""
         for target in self.targets:
-            self.add_target(target)
+            if target not in self.fresh_targets:
+                yield target
+
+    @asyncio.coroutine
+    def _put_targets(self):
+        """Feed all targets into the bounded queue."""
+        for target in self._scan_targets():
+            yield from self.q.put(target)
 
-    def add_target(self, target):
-        self.q.put_nowait(target)
+    @asyncio.coroutine
+    def _knx_description_sweep(self):
+        """Let _knx_description_worker scan all targets."""
+        workers = [asyncio.Task(self._knx_description_worker(), loop=self.loop)
+                   for _ in range(min(self.max_workers, len(self.targets)))]
+        # Put returns only when there is room in the queue, only a few
+        # targets are expanded ahead of the workers.
+        yield from self._put_targets()
+        yield from self.q.join()
+        for w in workers:
+            w.cancel()
 
     def add_bus_queue(self, gateway, bus_targets):
         self.bus_queues[gateway] = Queue(loop=self.loop)
@@ -93,37 +141,54 @@ class KnxMap(object):
         return self.bus_queues[gateway]
 
     @asyncio.coroutine
-    def bruteforce_auth_key(self, knx_gateway, target, full_key_space=False):
+    def bruteforce_auth_key(self, knx_gateways, target, full_key_space=False, wordlist=None,
+                            start_key=0, checkpoint=None):
+        """Search the authorization key of the bus device target with a
+        KnxAuthKeyBruteforcer over max_connections tunnel connections to
+        each of the (host, port) tuples in knx_gateways, which have to be
+        on the same bus line as target. The vendor default keys and the
+        keys in wordlist are tested first, with full_key_space all keys
+        from start_key on afterwards."""
         if isinstance(target, set):
             target = list(target)[0]
-        future = asyncio.Future()
-        transport, protocol = yield from self.loop.create_datagram_endpoint(
-            functools.partial(KnxTunnelConnection, future, nat_mode=self.nat_mode),
-            remote_addr=(knx_gateway[0], knx_gateway[1]))
-        self.bus_protocols.append(protocol)
-        # Make sure the tunnel has been established
-        connected = yield from future
-        alive = yield from protocol.tpci_connect(target)
-        if full_key_space:
-            key_space = range(0, 0xffffffff)
-        else:
-            key_space = [0x11223344, 0x12345678, 0x00000000, 0x87654321, 0x11111111, 0xffffffff]
-        # Bruteforce the key via A_Authorize_Request messages
-        for key in key_space:
-            access_level = yield from protocol.apci_authenticate(target, key)
-            if access_level == 0:
-                LOGGER.info("GOT THE KEY: {}".format(format(key, '08x')))
-                break
+        if isinstance(knx_gateways, tuple):
+            knx_gateways = [knx_gateways]
+        tunnels = []
+        for knx_gateway in knx_gateways:
+            for _ in range(self.max_connections or 1):
+                future = asyncio.Future()
+                transport, protocol = yield from self.loop.create_datagram_endpoint(
+                    functools.partial(KnxTunnelConnection, future, knx_source=self.knx_source,
+                                      nat_mode=self.nat_mode),
+                    remote_addr=(knx_gateway[0], knx_gateway[1]))
+                tunnels.append((future, protocol))
+        protocols = []
+        # Make sure the tunnels have been established
+        for future, protocol in tunnels:
+            connected = yield from future
+            if connected:
+                protocols.append(protocol)
+        self.bus_protocols.extend(protocols)
+        keys = KeySpace(VENDOR_DEFAULT_KEYS + list(wordlist or []), start=start_key,
+                        end=0xffffffff if full_key_space else None)
+        bruteforcer = KnxAuthKeyBruteforcer(protocols, target, keys, loop=self.loop,
+                                            checkpoint=checkpoint)
+        found = yield from bruteforcer.run()
+        for protocol in protocols:
+            protocol.knx_tunnel_disconnect()
+        return found
 
     @asyncio.coroutine
     def _knx_description_worker(self):
         """Send a KnxDescription request to see if target is a KNX device."""
         try:
             while True:
-                target = self.q.get_nowait()
+                target = yield from self.q.get()
                 LOGGER.debug('Scanning {}'.format(target))
                 response = None
                 for _try in range(self.desc_retries):
+                    if self.scheduler:
+                        yield from self.scheduler.acquire(target[0])
                     LOGGER.debug('Sending {}. KnxDescriptionRequest to {}'.format(_try, target))
                     future = asyncio.Future()
                     yield from self.loop.create_datagram_endpoint(
@@ -131,107 +196,139 @@ class KnxMap(object):
                                           timeout=self.desc_timeout, nat_mode=self.nat_mode),
                         remote_addr=target)
                     response = yield from future
+                    if self.scheduler:
+                        # A response to a retransmission means a request got lost
+                        self.scheduler.release(target[0], loss=bool(response) and _try > 0)
                     if response:
                         break
 
                 if response and isinstance(response, KnxDescriptionResponse):
-                    target_report = KnxTargetReport(
-                        host=target[0],
-                        port=target[1],
-                        mac_address=response.dib_dev_info.get('knx_mac_address'),
-                        knx_address=response.dib_dev_info.get('knx_address'),
-                        device_serial=response.dib_dev_info.get('knx_device_serial'),
-                        friendly_name=response.dib_dev_info.get('device_friendly_name'),
-                        device_status=response.dib_dev_info.get('device_status'),
-                        knx_medium=response.dib_dev_info.get('knx_medium'),
-                        project_install_identifier=response.dib_dev_info.get('project_install_identifier'),
-                        supported_services=[
-                            KNX_SERVICES[k] for k, v in
-                            response.dib_supp_sv_families.get('families').items()],
-                        bus_devices=[])
-
-                    # TODO: should we check if the device announces support? (support is mandatory)
-                    if self.configuration_reads:
-                        # Try to create a DEVICE_MGMT_CONNECTION connection
-                        future = asyncio.Future()
-                        transport, bus_protocol = yield from self.loop.create_datagram_endpoint(
-                            functools.partial(
-                                KnxTunnelConnection,
-                                future,
-                                connection_type=_CONNECTION_TYPES.get('DEVICE_MGMT_CONNECTION'),
-                                ndp_defer_time=self.bus_timeout,
-                                knx_source=self.knx_source,
-                                nat_mode=self.nat_mode),
-                            remote_addr=target)
-                        self.bus_protocols.append(bus_protocol)
-                        # Make sure the tunnel has been established
-                        connected = yield from future
-                        if connected:
-                            configuration = collections.OrderedDict()
-                            # Read additional individual addresses
-                            count = yield from bus_protocol.configuration_request(
-                                        target,
-                                        object_type=11,
-                                        start_index=0,
-                                        property=OBJECTS.get(11).get('PID_ADDITIONAL_INDIVIDUAL_ADDRESSES'))
-                            if count and count.data:
-                                count = int.from_bytes(count.data, 'big')
-                                conf_response = yield from bus_protocol.configuration_request(
-                                        target,
-                                        object_type=11,
-                                        num_elements=count,
-                                        property=OBJECTS.get(11).get('PID_ADDITIONAL_INDIVIDUAL_ADDRESSES'))
-                                if conf_response and conf_response.data:
-                                    data = conf_response.data
-                                    target_report.additional_individual_addresses = []
-                                    for addr in [data[i:i+2] for i in range(0, len(data), 2)]:
-                                        target_report.additional_individual_addresses.append(
-                                            knxmap.utils.parse_knx_address(int.from_bytes(addr, 'big')))
-
-                            # Read manufacurer ID
-                            count = yield from bus_protocol.configuration_request(
-                                        target,
-                                        object_type=0,
-                                        start_index=0,
-                                        property=OBJECTS.get(0).get('PID_MANUFACTURER_ID'))
-                            if count and count.data:
-                                count = int.from_bytes(count.data, 'big')
-                                conf_response = yield from bus_protocol.configuration_request(
-                                        target,
-                                        object_type=0,
-                                        num_elements=count,
-                                        property=OBJECTS.get(0).get('PID_MANUFACTURER_ID'))
-                                if conf_response and conf_response.data:
-                                    target_report.manufacturer = knxmap.utils.get_manufacturer_by_id(
-                                        int.from_bytes(conf_response.data, 'big'))
-
-                            # TODO: do more precise checks what to extract and add it to the target report
-                            # for k, v in OBJECTS.get(11).items():
-                            #     count = yield from bus_protocol.configuration_request(target,
-                            #                                                           object_type=11,
-                            #                                                           start_index=0,
-                            #                                                           property=v)
-                            #     if count and count.data:
-                            #         count = int.from_bytes(count.data, 'big')
-                            #     else:
-                            #         continue
-                            #     conf_response = yield from bus_protocol.configuration_request(target,
-                            #                                                                   object_type=11,
-                            #                                                                   num_elements=count,
-                            #                                                                   property=v)
-                            #     if conf_response and conf_response.data:
-                            #
-                            #         print(k + ':')
-                            #         print(conf_response.data)
-
-                            bus_protocol.knx_tunnel_disconnect()
-
-                    # TODO: at the end, add alive gateways to this list
-                    self.knx_gateways.append(target_report)
+                    yield from self._knx_gateway_report(target, response)
                 self.q.task_done()
+        except asyncio.CancelledError:
+            pass
+
+    @asyncio.coroutine
+    def _knx_gateway_report(self, target, response):
+        """Create a KnxTargetReport for a gateway that
+        responded to a KnxDescriptionRequest."""
+        target_report = KnxTargetReport(
+            host=target[0],
+            port=target[1],
+            mac_address=response.dib_dev_info.get('knx_mac_address'),
+            knx_address=response.dib_dev_info.get('knx_address'),
+            device_serial=response.dib_dev_info.get('knx_device_serial'),
+            friendly_name=response.dib_dev_info.get('device_friendly_name'),
+            device_status=response.dib_dev_info.get('device_status'),
+            knx_medium=response.dib_dev_info.get('knx_medium'),
+            project_install_identifier=response.dib_dev_info.get('project_install_identifier'),
+            supported_services=[
+                KNX_SERVICES[k] for k, v in
+                response.dib_supp_sv_families.get('families').items()],
+            bus_devices=[])
+
+        # TODO: should we check if the device announces support? (support is mandatory)
+        if self.configuration_reads:
+            additional_addresses = (11, OBJECTS.get(11).get('PID_ADDITIONAL_INDIVIDUAL_ADDRESSES'))
+            manufacturer_id = (0, OBJECTS.get(0).get('PID_MANUFACTURER_ID'))
+            properties = [additional_addresses, manufacturer_id]
+            if self.configuration_properties:
+                properties.extend((object_type, property)
+                                  for object_type, props in OBJECTS.items()
+                                  for property in props.values())
+            cache = None
+            if target_report.device_serial:
+                cache = self.property_cache.setdefault(target_report.device_serial, {})
+            if cache is not None and all(p in cache for p in properties):
+                # All properties have been read from this device
+                # before, e.g. through another of its addresses
+                values = {p: cache[p] for p in properties}
+            else:
+                values = yield from self._configuration_read(target, properties, cache)
+
+            data = values.get(additional_addresses)
+            if data:
+                target_report.additional_individual_addresses = []
+                for addr in [data[i:i+2] for i in range(0, len(data), 2)]:
+                    target_report.additional_individual_addresses.append(
+                        knxmap.utils.parse_knx_address(int.from_bytes(addr, 'big')))
+
+            data = values.get(manufacturer_id)
+            if data:
+                target_report.manufacturer = knxmap.utils.get_manufacturer_by_id(
+                    int.from_bytes(data, 'big'))
+
+            if self.configuration_properties and values:
+                target_report.properties = collections.OrderedDict()
+                for object_type, props in OBJECTS.items():
+                    x = collections.OrderedDict()
+                    for k, v in props.items():
+                        if values.get((object_type, v)):
+                            x[k.replace('PID_', '')] = codecs.encode(values[(object_type, v)],
+                                                                     'hex')
+                    if x:
+                        target_report.properties[OBJECT_TYPES.get(object_type)] = x
+
+        # TODO: at the end, add alive gateways to this list
+        self.knx_gateways.append(target_report)
+
+    @asyncio.coroutine
+    def _configuration_read(self, target, properties, cache=None):
+        """Read properties from the gateway target over a DEVICE_MGMT_CONNECTION,
+        see configuration_read_properties(). Return an empty dict if
+        the connection could not be established."""
+        future = asyncio.Future()
+        transport, bus_protocol = yield from self.loop.create_datagram_endpoint(
+            functools.partial(
+                KnxTunnelConnection,
+                future,
+                connection_type=_CONNECTION_TYPES.get('DEVICE_MGMT_CONNECTION'),
+                ndp_defer_time=self.bus_timeout,
+                knx_source=self.knx_source,
+                nat_mode=self.nat_mode),
+            remote_addr=target)
+        self.bus_protocols.append(bus_protocol)
+        # Make sure the tunnel has been established
+        connected = yield from future
+        if not connected:
+            return {}
+        values = yield from bus_protocol.configuration_read_properties(
+            target, properties, cache=cache)
+        bus_protocol.knx_tunnel_disconnect()
+        return values
+
+    @asyncio.coroutine
+    def _knx_gateway_report_worker(self, queue):
+        """Create reports for (target, response) tuples from queue."""
+        try:
+            while True:
+                target, response = queue.get_nowait()
+                yield from self._knx_gateway_report(target, response)
+                queue.task_done()
         except (asyncio.CancelledError, asyncio.QueueEmpty):
             pass
 
+    @asyncio.coroutine
+    def _knx_description_scan(self, desc_rate, desc_sockets):
+        """Probe all targets from shared sockets with a KnxDescriptionScanner,
+        instead of a socket per target like _knx_description_worker."""
+        scanner = KnxDescriptionScanner(self._scan_targets(), loop=self.loop,
+                                        timeout=self.desc_timeout,
+                                        retries=self.desc_retries,
+                                        rate=desc_rate,
+                                        sockets=desc_sockets,
+                                        nat_mode=self.nat_mode,
+                                        limiter=self.scheduler.limiter if self.scheduler else None)
+        responses = yield from scanner.scan()
+        queue = Queue(loop=self.loop)
+        for target, response in responses.items():
+            queue.put_nowait((target, response))
+        workers = [asyncio.Task(self._knx_gateway_report_worker(queue), loop=self.loop)
+                   for _ in range(min(self.max_workers, len(responses)))]
+        yield from queue.join()
+        for w in workers:
+            w.cancel()
+
     @asyncio.coroutine
     def monitor(self, targets=None, group_monitor_mode=False, db_config=None):
         if targets:
@@ -243,7 +340,7 @@ class KnxMap(object):
         future = asyncio.Future()
         transport, protocol = yield from self.loop.create_datagram_endpoint(
             functools.partial(KnxBusMonitor, future, group_monitor=group_monitor_mode, db_config=db_config),
-            remote_addr=list(self.targets)[0])
+            remote_addr=next(iter(self.targets)))
         self.bus_protocols.append(protocol)
         yield from future
         if group_monitor_mode:
@@ -251,58 +348,41 @@ class KnxMap(object):
         else:
             LOGGER.debug('Stopping bus monitor')
 
+    def _knx_search_response(self, peer, response, interface):
+        """Add the gateway of a SEARCH_RESPONSE as soon as it arrives."""
+        t = KnxTargetReport(
+            host=peer[0],
+            port=peer[1],
+            mac_address=response.dib_dev_info.get('knx_mac_address'),
+            knx_address=response.dib_dev_info.get('knx_address'),
+            device_serial=response.dib_dev_info.get('knx_device_serial'),
+            friendly_name=response.dib_dev_info.get('device_friendly_name'),
+            device_status=response.dib_dev_info.get('device_status'),
+            knx_medium=response.dib_dev_info.get('knx_medium'),
+            project_install_identifier=response.dib_dev_info.get('project_install_identifier'),
+            supported_services=[
+                KNX_SERVICES[k] for k, v in
+                response.dib_supp_sv_families.get('families').items()],
+            bus_devices=[])
+        self.knx_gateways.append(t)
+        LOGGER.info('Found gateway {}:{} on interface {}'.format(peer[0], peer[1], interface))
+        if not self.testing:
+            print_knx_target(t)
+
     @asyncio.coroutine
     def _knx_search_worker(self):
-        """Send a KnxSearch request to see if target is a KNX device."""
+        """Send KnxSearch requests on all interfaces to find KNXnet/IP gateways."""
+        searcher = KnxGatewaySearcher(interfaces=self.iface,
+                                      loop=self.loop,
+                                      multicast_addr=self.multicast_addr,
+                                      port=self.port,
+                                      timeout=self.search_timeout,
+                                      idle_timeout=self.search_idle_timeout,
+                                      expected=self.search_expected,
+                                      diagnostic=self.search_diagnostic,
+                                      callback=self._knx_search_response)
         try:
-            sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-            sock.setblocking(0)
-            sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
-            sock.setsockopt(socket.SOL_SOCKET, socket.SO_BINDTODEVICE,
-                            struct.pack('256s', str.encode(self.iface)))
-            protocol = KnxGatewaySearch(multicast_addr=self.multicast_addr,
-                                        port=self.port)
-            waiter = asyncio.Future(loop=self.loop)
-            transport = self.loop._make_datagram_transport(
-                sock, protocol, (self.multicast_addr, self.port), waiter)
-            try:
-                # Wait until connection_made() has been called on the transport
-                yield from waiter
-            except asyncio.CancelledError:
-                LOGGER.error('Creating multicast transport failed!')
-                transport.close()
-                return
-
-            # Wait SEARCH_TIMEOUT seconds for responses to our multicast packets
-            yield from asyncio.sleep(self.search_timeout)
-
-            if protocol.responses:
-                if True:
-                    # TODO: check if we want diagnostic requests as well
-                    print('sending diagnostic request')
-                    protocol.send_diagnostic_request()
-                    yield from asyncio.sleep(self.search_timeout)
-
-                # If protocol received SEARCH_RESPONSE packets, print them
-                for response in protocol.responses:
-                    peer = response[0]
-                    response = response[1]
-                    t = KnxTargetReport(
-                        host=peer[0],
-                        port=peer[1],
-                        mac_address=response.dib_dev_info.get('knx_mac_address'),
-                        knx_address=response.dib_dev_info.get('knx_address'),
-                        device_serial=response.dib_dev_info.get('knx_device_serial'),
-                        friendly_name=response.dib_dev_info.get('device_friendly_name'),
-                        device_status=response.dib_dev_info.get('device_status'),
-                        knx_medium=response.dib_dev_info.get('knx_medium'),
-                        project_install_identifier=response.dib_dev_info.get('project_install_identifier'),
-                        supported_services=[
-                            KNX_SERVICES[k] for k, v in
-                            response.dib_supp_sv_families.get('families').items()],
-                        bus_devices=[])
-
-                    self.knx_gateways.append(t)
+            yield from searcher.search()
         except asyncio.CancelledError:
             pass
 
@@ -315,25 +395,36 @@ class KnxMap(object):
 
     @asyncio.coroutine
     def search(self, search_timeout=5, iface=None, multicast_addr='224.0.23.12',
-               port=3671):
+               port=3671, expected=None, idle_timeout=1, diagnostic=False):
+        """Search gateways on the interfaces in iface, a list or a
+        comma separated string of names or addresses. Gateways are
+        printed as they respond, the search ends when expected gateways
+        responded or none responded for idle_timeout seconds."""
+        if isinstance(iface, str):
+            iface = [i.strip() for i in iface.split(',') if i.strip()]
         self.iface = iface
         self.multicast_addr = multicast_addr
         self.port = port
         self.search_timeout = search_timeout
+        self.search_idle_timeout = idle_timeout
+        self.search_expected = expected
+        self.search_diagnostic = diagnostic
         LOGGER.info('Make sure there are no filtering rules that drop UDP multicast packets!')
         yield from self._search_gateways()
-        if not self.testing:
-            for t in self.knx_gateways:
-                print_knx_target(t)
         LOGGER.info('Searching done')
 
     @asyncio.coroutine
-    def brute(self, targets=None, bus_target=None, full_key_space=False):
+    def brute(self, targets=None, bus_target=None, full_key_space=False, wordlist=None,
+              start_key=0, checkpoint=None):
+        """Search the key of bus_target over all targets, see bruteforce_auth_key()."""
         if targets:
             self.set_targets(targets)
-        tasks = [asyncio.Task(self.bruteforce_auth_key(t, bus_target, full_key_space),
-                              loop=self.loop) for t in self.targets]
-        yield from asyncio.wait(tasks)
+        found = yield from self.bruteforce_auth_key(list(self.targets), bus_target,
+                                                    full_key_space=full_key_space,
+                                                    wordlist=wordlist,
+                                                    start_key=start_key,
+                                                    checkpoint=checkpoint)
+        return found
 
     @asyncio.coroutine
     def _knx_bus_worker(self, transport, protocol, knx_gateway=None, queue=None):
@@ -343,6 +434,7 @@ class KnxMap(object):
             return
         elif not queue and knx_gateway:
             queue = self.bus_queues.get(knx_gateway.host)
+        gateway = knx_gateway.host if knx_gateway else protocol.peername[0]
         try:
             while True:
                 target = queue.get_nowait()
@@ -351,179 +443,113 @@ class KnxMap(object):
                     LOGGER.error('KNX tunnel is not open!')
                     return
 
-                alive = yield from protocol.tpci_connect(target)
-
-                if alive:
-                    properties = collections.OrderedDict()
-                    serial = None
-
-                    # DeviceDescriptorRead
-                    descriptor = yield from protocol.apci_device_descriptor_read(target)
-                    if not descriptor:
-                        tunnel_request = protocol.make_tunnel_request(target)
-                        tunnel_request.tpci_unnumbered_control_data('DISCONNECT')
-                        protocol.send_data(tunnel_request.get_message(), target)
-                        queue.task_done()
-                        continue
-
-                    if not self.bus_info:
-                        t = KnxBusTargetReport(address=target)
-                        self.bus_devices.add(t)
-                        tunnel_request = protocol.make_tunnel_request(target)
-                        tunnel_request.tpci_unnumbered_control_data('DISCONNECT')
-                        protocol.send_data(tunnel_request.get_message(), target)
-                        queue.task_done()
-                        continue
-
-                    dev_desc = struct.unpack('!H', descriptor)[0]
-                    desc_medium, desc_type, desc_version = knxmap.utils.parse_device_descriptor(dev_desc)
-                    device_state = None
-
-                    if desc_type > 1:
-                        # Read System 2 and System 7 manufacturer ID object
-                        manufacturer = yield from protocol.apci_property_value_read(
-                            target,
-                            property_id=DEVICE_OBJECTS.get('PID_MANUFACTURER_ID'))
-                        if isinstance(manufacturer, (str, bytes, bytearray)):
-                            manufacturer = int.from_bytes(manufacturer, 'big')
-                            manufacturer = knxmap.utils.get_manufacturer_by_id(manufacturer)
-
-                        # Read the device state
-                        device_state_data = yield from protocol.apci_memory_read(
-                            target,
-                            memory_address=0x0060)
-                        if device_state_data:
-                            device_state = CemiFrame.unpack_cemi_runstate(
-                                int.from_bytes(device_state_data, 'big'))
-
-                        # Read the serial number object on System 2 and System 7 devices
-                        serial = yield from protocol.apci_property_value_read(
-                            target,
-                            property_id=DEVICE_OBJECTS.get('PID_SERIAL_NUMBER'))
-                        if isinstance(serial, (str, bytes, bytearray)):
-                            serial = codecs.encode(serial, 'hex').decode().upper()
-
-                        for object_index, props in OBJECTS.items():
-                            x = collections.OrderedDict()
-                            for k, v in props.items():
-                                ret = yield from protocol.apci_property_value_read(
-                                    target,
-                                    property_id=v,
-                                    object_index=object_index)
-                                if ret:
-                                    x[k.replace('PID_', '')] = codecs.encode(ret, 'hex')
-                            if x:
-                                properties[OBJECT_TYPES.get(object_index)] = x
-                    else:
-                        # Try to MemoryRead the manufacturer ID on System 1 devices.
-                        # Note: System 1 devices do not support access controls, so
-                        # an authorization request is not needed.
-                        manufacturer = yield from protocol.apci_memory_read(
-                            target,
-                            memory_address=0x0104,
-                            read_count=1)
-                        if isinstance(manufacturer, (str, bytes, bytearray)):
-                            manufacturer = int.from_bytes(manufacturer, 'big')
-                            manufacturer = knxmap.utils.get_manufacturer_by_id(manufacturer)
+                self._bus_line_started(gateway, target)
+                if self.scheduler:
+                    yield from self.scheduler.acquire(gateway)
+                    ack_errors = protocol.ack_errors
+                try:
+                    alive = yield from self._knx_bus_target(protocol, target, gateway)
+                finally:
+                    if self.scheduler:
+                        # Errors reported by the gateway mean it is overloaded
+                        self.scheduler.release(gateway, loss=protocol.ack_errors > ack_errors)
+                self._bus_line_done(gateway, target, alive)
+                queue.task_done()
+        except asyncio.CancelledError:
+            pass
+        except asyncio.QueueEmpty:
+            pass
 
-                        device_state_data = yield from protocol.apci_memory_read(
-                            target,
-                            memory_address=0x0060)
-                        if device_state_data:
-                            device_state = codecs.encode(device_state_data, 'hex')
+    @asyncio.coroutine
+    def _knx_bus_pipeline_worker(self, transport, protocol, knx_gateway, queue):
+        """Like _knx_bus_worker, but the targets are probed with up to
+        bus_window T_Connects in flight. The device descriptor of each
+        device that is alive is read over the connection of its probe,
+        or, with bus_info, the device is left to the harvester."""
+        def targets():
+            while protocol.tunnel_established:
+                try:
+                    target = queue.get_nowait()
+                except asyncio.QueueEmpty:
+                    return
+                LOGGER.info('BUS: target: {}'.format(target))
+                self._bus_line_started(knx_gateway.host, target)
+                yield target
+
+        def probed(target, alive):
+            if alive and self.bus_info:
+                # The harvester reads the device after the scan
+                self.bus_info_targets[knx_gateway.host].append(target)
+            self._bus_line_done(knx_gateway.host, target, alive)
+            queue.task_done()
+
+        @asyncio.coroutine
+        def connected(target):
+            if self.scheduler:
+                yield from self.scheduler.acquire(knx_gateway.host)
+                ack_errors = protocol.ack_errors
+            try:
+                yield from self._knx_bus_descriptor(protocol, target, knx_gateway.host)
+            finally:
+                if self.scheduler:
+                    self.scheduler.release(knx_gateway.host,
+                                           loss=protocol.ack_errors > ack_errors)
 
-                        ret = yield from protocol.apci_memory_read(
-                            target,
-                            memory_address=0x0105,
-                            read_count=2)
-                        if ret:
-                            properties['Device Type'] = codecs.encode(ret, 'hex')
+        try:
+            if not protocol.tunnel_established:
+                LOGGER.error('KNX tunnel is not open!')
+                return
+            yield from protocol.tpci_connect_pipelined(
+                targets(),
+                window=self.bus_window,
+                timeout=self.bus_timeout,
+                callback=probed,
+                connected=None if self.bus_info else connected)
+        except asyncio.CancelledError:
+            pass
 
-                        ret = yield from protocol.apci_memory_read(
-                            target,
-                            memory_address=0x0101,
-                            read_count=3)
-                        if ret:
-                            properties['ManData'] = codecs.encode(ret, 'hex')
+    def _bus_line_started(self, gateway, target):
+        line = (gateway, target.rsplit('.', 1)[0])
+        if line not in self.bus_lines:
+            self.bus_lines[line] = {'start': time.time(), 'end': None,
+                                    'targets': 0, 'devices': 0}
 
-                        ret = yield from protocol.apci_memory_read(
-                            target,
-                            memory_address=0x0108,
-                            read_count=1)
-                        if ret:
-                            properties['CheckLim'] = codecs.encode(ret, 'hex')
+    def _bus_line_done(self, gateway, target, alive):
+        stats = self.bus_lines[(gateway, target.rsplit('.', 1)[0])]
+        stats['end'] = time.time()
+        stats['targets'] += 1
+        if alive:
+            stats['devices'] += 1
 
-                        ret = yield from protocol.apci_memory_read(
-                            target,
-                            memory_address=0x01FE,
-                            read_count=1)
-                        if ret:
-                            properties['User Program'] = codecs.encode(ret, 'hex')
-
-                        start_addr = 0x0100
-                        properties['EEPROM_DUMP'] = b''
-                        for i in range(51):
-                            ret = yield from protocol.apci_memory_read(
-                                target,
-                                memory_address=start_addr,
-                                read_count=5)
-                            if ret:
-                                properties['EEPROM_DUMP'] += codecs.encode(ret, 'hex')
-                            start_addr += 5
-
-                    # Try to read group addresses
-                    if desc_type ==7:
-                        group_address_table = 0x4000
-                    else:
-                        group_address_table = 0x0116
+    @asyncio.coroutine
+    def _knx_bus_target(self, protocol, target, gateway):
+        """Scan a single device on the bus, return True if it is alive.
+        With bus_info, alive devices are only recorded in bus_info_targets,
+        they are read by a KnxBusInfoHarvester after the scan."""
+        alive = yield from protocol.tpci_connect(target)
 
-                    if desc_type > 1 and not self.ignore_auth:
-                        auth_level = yield from protocol.apci_authenticate(
-                            target,
-                            key=self.auth_key)
-                        if auth_level > 0:
-                            yield from protocol.tpci_disconnect(target)
-                            queue.task_done()
-                            LOGGER.error('Invalid authentication key for target %s' % target)
-                            continue
+        if alive:
+            if self.bus_info:
+                self.bus_info_targets[gateway].append(target)
+                yield from protocol.tpci_disconnect(target)
+                return True
 
-                    ret = yield from protocol.apci_memory_read(
-                        target,
-                        memory_address=group_address_table,
-                        read_count=1)
-                    if ret and int.from_bytes(ret, 'big') > 1:
-                        byte_count = (int.from_bytes(ret, 'big') * 2) + 1
-                        address_table = yield from protocol.apci_memory_read(
-                            target,
-                            memory_address=group_address_table,
-                            read_count=byte_count) # each address is 2 bytes long
-                        if address_table:
-                            properties['Group Addresses'] = []
-                            ga = address_table[3:] # skip length and individual address
-                            for addr in [ga[i:i + 2] for i in range(0, len(ga), 2)]:
-                                properties['Group Addresses'].append(
-                                    knxmap.utils.parse_knx_group_address(int.from_bytes(addr, 'big')))
-
-                    if descriptor:
-                        t = KnxBusTargetReport(
-                            address=target,
-                            medium=desc_medium,
-                            type=desc_type,
-                            version=desc_version,
-                            device_serial=serial,
-                            device_state=device_state,
-                            manufacturer=manufacturer,
-                            properties=properties)
-                        self.bus_devices.add(t)
-
-                    # Properly close the TPCI layer
-                    yield from protocol.tpci_disconnect(target)
+            yield from self._knx_bus_descriptor(protocol, target, gateway)
+            tunnel_request = protocol.make_tunnel_request(target)
+            tunnel_request.tpci_unnumbered_control_data('DISCONNECT')
+            protocol.send_data(tunnel_request.get_message(), target)
+            return True
+        return alive
 
-                queue.task_done()
-        except asyncio.CancelledError:
-            pass
-        except asyncio.QueueEmpty:
-            pass
+    @asyncio.coroutine
+    def _knx_bus_descriptor(self, protocol, target, gateway):
+        """Read the device descriptor of target over the open connection
+        to it and record the device if it responds."""
+        descriptor = yield from protocol.apci_device_descriptor_read(target)
+        if descriptor:
+            t = KnxBusTargetReport(address=target)
+            self.bus_devices.add(t)
+            self.gateway_bus_devices.setdefault(gateway, []).append(t)
 
     @asyncio.coroutine
     def _tunnel_connection(self, knx_gateway):
@@ -550,43 +576,118 @@ class KnxMap(object):
 
     @asyncio.coroutine
     def _bus_scan(self, knx_gateway, bus_targets):
+        skipped = set()
+        if self.store and self.rescan_age:
+            fresh = self.store.fresh_bus_devices(knx_gateway.host, self.rescan_age)
+            skipped = set(t for t in bus_targets if t in fresh)
+            bus_targets = [t for t in bus_targets if t not in fresh]
+            LOGGER.info('Skipping bus targets of {} probed within {} seconds ({} in store)'.format(
+                knx_gateway.host, self.rescan_age, len(fresh)))
+            if not bus_targets:
+                knx_gateway.bus_devices.extend(
+                    self.store.bus_device_reports(knx_gateway.host, skipped))
+                return
         # Make sure the tunnel has been established
         queue = self.add_bus_queue(knx_gateway.host, bus_targets)
         connections = 1
         self.bus_connections[knx_gateway.host] = []
-        if len(bus_targets) > 10:
+        self.bus_info_targets[knx_gateway.host] = []
+        self.gateway_bus_devices[knx_gateway.host] = []
+        if len(bus_targets) > 10 or self.bus_info:
             if len(knx_gateway.additional_individual_addresses) > 1:
                 LOGGER.info('Additional individual addresses available')
                 connections = len(knx_gateway.additional_individual_addresses)
             if self.max_connections and connections > self.max_connections:
                 connections = self.max_connections
+        if self.scheduler:
+            # The gateway gets a budget of a request per tunnel connection
+            self.scheduler.gateway(knx_gateway.host, window=connections)
         connectors = [asyncio.Task(self._tunnel_connection(knx_gateway))
                       for _ in range(connections)]
         yield from asyncio.wait(connectors)
         LOGGER.info('Established %d connections to target %s' %
                     (len(self.bus_connections[knx_gateway.host]),
                      knx_gateway.host))
-        workers = [asyncio.Task(self._knx_bus_worker(c.get('transport'),
-                                                     c.get('protocol'),
-                                                     knx_gateway),
-                                loop=self.loop) for c in self.bus_connections[knx_gateway.host]]
+        if self.bus_window > 1:
+            workers = [asyncio.Task(self._knx_bus_pipeline_worker(c.get('transport'),
+                                                                  c.get('protocol'),
+                                                                  knx_gateway, queue),
+                                    loop=self.loop) for c in self.bus_connections[knx_gateway.host]]
+        else:
+            workers = [asyncio.Task(self._knx_bus_worker(c.get('transport'),
+                                                         c.get('protocol'),
+                                                         knx_gateway),
+                                    loop=self.loop) for c in self.bus_connections[knx_gateway.host]]
         self.t0 = time.time()
         yield from queue.join()
         self.t1 = time.time()
         for w in workers:
             w.cancel()
+        if self.bus_info_targets[knx_gateway.host]:
+            harvester = KnxBusInfoHarvester(
+                [c.get('protocol') for c in self.bus_connections[knx_gateway.host]],
+                loop=self.loop,
+                timeout=self.bus_info_timeout,
+                auth_key=self.auth_key,
+                ignore_auth=self.ignore_auth,
+                scheduler=self.scheduler,
+                gateway=knx_gateway.host)
+            reports = yield from harvester.harvest(self.bus_info_targets[knx_gateway.host])
+            self.bus_devices.update(reports)
+            self.gateway_bus_devices[knx_gateway.host].extend(reports)
+            self.t1 = time.time()
         for c in self.bus_connections[knx_gateway.host]:
             c.get('protocol').knx_tunnel_disconnect()
-        for i in self.bus_devices:
-            knx_gateway.bus_devices.append(i)
-
+        # Only the devices found through this gateway, gateways
+        # on other lines may have devices with the same addresses
+        knx_gateway.bus_devices.extend(self.gateway_bus_devices[knx_gateway.host])
+        if self.store:
+            diff = self.store.record_bus_devices(knx_gateway.host, bus_targets,
+                                                 knx_gateway.bus_devices)
+            LOGGER.info(diff.format_report())
+            # The stored devices of the skipped bus targets, after recording
+            # them would mark them as seen in this run
+            knx_gateway.bus_devices.extend(
+                self.store.bus_device_reports(knx_gateway.host, skipped))
+
+        for (gateway, line), stats in self.bus_lines.items():
+            if gateway == knx_gateway.host and stats['end']:
+                LOGGER.info('Bus line {line} on {gateway}: {targets} targets, {devices} devices, '
+                            '{duration:.1f} seconds'.format(line=line, gateway=gateway,
+                                                            duration=stats['end'] - stats['start'],
+                                                            **stats))
         LOGGER.info('Bus scan took {} seconds'.format(self.t1 - self.t0))
 
     @asyncio.coroutine
     def scan(self, targets=None, desc_timeout=2, desc_retries=2, bus_timeout=2,
              bus_targets=None, bus_info=False, knx_source=None, auth_key=0xffffffff,
-             configuration_reads=True, ignore_auth=False):
-        """The function that will be called by run_until_complete(). This is the main coroutine."""
+             configuration_reads=True, ignore_auth=False, desc_rate=0, desc_sockets=1,
+             adaptive=False, gateway_rate=0, bus_window=1, bus_info_timeout=60,
+             store=None, rescan_age=0, configuration_properties=False):
+        """The function that will be called by run_until_complete(). This is the main coroutine.
+
+        If desc_rate is set, DESCRIPTION_REQUESTs are sent at desc_rate packets per
+        second from desc_sockets shared sockets instead of a socket per target.
+
+        If adaptive is set, a ScanScheduler adapts the requests in flight (and
+        the desc_rate) to the observed loss, up to max_workers. gateway_rate
+        limits the requests per second to each gateway and implies adaptive.
+
+        If bus_window is larger than 1, each tunnel connection keeps up to
+        bus_window T_Connect probes in flight, see tpci_connect_pipelined().
+
+        With bus_info, the devices found on the bus are read afterwards by a
+        KnxBusInfoHarvester over all tunnel connections, each device may take
+        up to bus_info_timeout seconds.
+
+        If store, a ScanStore, is given, the results are recorded in it and
+        the changes since the last run are logged. With rescan_age, targets
+        and bus targets probed within rescan_age seconds are not probed
+        again, their stored reports are reported instead. The bus targets of
+        skipped gateways that have not been probed recently are scanned.
+
+        With configuration_properties, all properties in OBJECTS are read
+        from the gateways, see configuration_read_properties()."""
         if not isinstance(auth_key, int):
             try:
                 auth_key = int(auth_key, 16)
@@ -594,23 +695,50 @@ class KnxMap(object):
             except ValueError:
                 LOGGER.debug('Invalid key, using the default')
         self.configuration_reads = configuration_reads
+        self.configuration_properties = configuration_properties
         self.knx_source = knx_source
         self.desc_timeout = desc_timeout
         self.desc_retries = desc_retries
         self.bus_timeout = bus_timeout
         self.bus_info = bus_info
         self.ignore_auth = ignore_auth
+        self.bus_window = bus_window
+        self.bus_info_timeout = bus_info_timeout
+        self.store = store
+        self.rescan_age = rescan_age
         if targets:
             self.set_targets(targets)
+        if store and rescan_age:
+            self.fresh_targets = store.fresh_gateways(rescan_age)
+            LOGGER.info('Skipping targets probed within {} seconds ({} in store)'.format(
+                rescan_age, len(self.fresh_targets)))
+        if adaptive or gateway_rate:
+            self.scheduler = ScanScheduler(loop=self.loop,
+                                           max_window=self.max_workers,
+                                           max_rate=desc_rate,
+                                           gateway_rate=gateway_rate,
+                                           holdoff=desc_timeout)
         if self.medium == 'net':
-            workers = [asyncio.Task(self._knx_description_worker(), loop=self.loop)
-                       for _ in range(self.max_workers
-                                      if len(self.targets) > self.max_workers else len(self.targets))]
             self.t0 = time.time()
-            yield from self.q.join()
+            if desc_rate:
+                yield from self._knx_description_scan(desc_rate, desc_sockets)
+            else:
+                yield from self._knx_description_sweep()
             self.t1 = time.time()
-            for w in workers:
-                w.cancel()
+            if self.scheduler:
+                LOGGER.info(self.scheduler.format_report())
+            if self.store:
+                targets = TargetRanges.from_targets(self.targets)
+                probed = targets.difference(self.fresh_targets)
+                diff = self.store.record_gateways(probed, self.knx_gateways)
+                LOGGER.info(diff.format_report())
+                if self.rescan_age:
+                    # Report the skipped gateways as stored, and scan their
+                    # bus targets that have not been probed recently
+                    stored = self.store.gateway_reports(targets.difference(probed))
+                    LOGGER.info('Reporting {} gateways probed within {} seconds '
+                                'from the store'.format(len(stored), self.rescan_age))
+                    self.knx_gateways.extend(stored)
 
             if bus_targets and self.knx_gateways:
                 # Start scanning on the bus
@@ -671,13 +799,9 @@ class KnxMap(object):
         self.desc_timeout = desc_timeout
         self.desc_retries = desc_retries
         self.iface = iface
-        workers = [asyncio.Task(self._knx_description_worker(), loop=self.loop)
-                   for _ in range(self.max_workers if len(self.targets) > self.max_workers else len(self.targets))]
         self.t0 = time.time()
-        yield from self.q.join()
+        yield from self._knx_description_sweep()
         self.t1 = time.time()
-        for w in workers:
-            w.cancel()
 
         if self.knx_gateways:
             # TODO: make sure only a single gateway is supplied
@@ -735,13 +859,9 @@ class KnxMap(object):
         self.desc_retries = desc_retries
         self.iface = iface
         self.knx_source = args.knx_source
-        workers = [asyncio.Task(self._knx_description_worker(), loop=self.loop)
-                   for _ in range(self.max_workers if len(self.targets) > self.max_workers else len(self.targets))]
         self.t0 = time.time()
-        yield from self.q.join()
+        yield from self._knx_description_sweep()
         self.t1 = time.time()
-        for w in workers:
-            w.cancel()
 
         if self.knx_gateways:
             # TODO: make sure only a single gateway is supplied
@@ -6,6 +6,7 @@ from time import sleep
 from queue import Queue
 
 from knxmap.data.telegram import Telegram, AckTelegram, UnknownTelegram
+from knxcommon.metrics import ProgressMeter
 
 __all__ = ['DatabaseWriter']
 
@@ -16,6 +17,9 @@ class DatabaseWriter(Thread):
         Thread.__init__(self)
         self.__telegram_queue = queue
         self.__db_config = db_config
+        # Throughput of inserted telegrams, reported once a minute
+        self.__meter = ProgressMeter('db_writer', interval=60, logger=LOGGER,
+                                     metrics_file=getattr(db_config, 'metrics_file', None))
 
     def run(self):
         LOGGER.info("Starting database writer")
@@ -26,10 +30,17 @@ class DatabaseWriter(Thread):
                 self.__cursor.close()
                 self.__con.close()
                 break
-            while self.__insert_telegram(telegram) == False:
+            with self.__meter.stage('insert'):
+                inserted = self.__insert_telegram(telegram)
+            while inserted == False:
                 LOGGER.info("Reconnecting after 5 seconds")
                 sleep(5) # wait 5 sec, then try again
                 self.__connect_db() # reconnect on insert failure
+                with self.__meter.stage('insert'):
+                    inserted = self.__insert_telegram(telegram)
+            self.__meter.update(1)
+            self.__meter.set_gauge('queue_size', self.__telegram_queue.qsize())
+            self.__meter.maybe_emit()
             self.__telegram_queue.task_done()
 
     def __connect_db(self):
@@ -1,57 +1,196 @@
 """Implementation of KNXnet/IP communication with KNXnet/IP gateways."""
 import asyncio
+import collections
+import functools
 import logging
+import math
+import socket
 
+import knxmap.utils
 from knxmap.data.constants import *
 from knxmap.messages import parse_message, KnxSearchRequest, KnxSearchResponse, KnxDescriptionRequest, \
                             KnxDescriptionResponse, KnxRemoteDiagnosticRequest, \
                             KnxRemoteDiagnosticResponse
 
-__all__ = ['KnxGatewaySearch',
-           'KnxGatewayDescription']
+__all__ = ['KnxGatewaySearcher',
+           'KnxGatewayDescription',
+           'KnxDescriptionScanner',
+           'TimerWheel']
 
 LOGGER = logging.getLogger(__name__)
 
 
-class KnxGatewaySearch(asyncio.DatagramProtocol):
-    """A protocol implementation for searching KNXnet/IP gateways via
-    multicast messages. The protocol will hold a set responses with
-    all the KNXnet/IP gateway responses."""
-    def __init__(self, loop=None, multicast_addr=KNX_CONSTANTS.get('MULTICAST_ADDR'),
-                 port=KNX_CONSTANTS.get('DEFAULT_PORT')):
-        self.loop = loop or asyncio.get_event_loop()
-        self.multicast_addr = multicast_addr
-        self.port = port
+class KnxSearchEndpoint(asyncio.DatagramProtocol):
+    """The UDP socket of a KnxGatewaySearcher on a single interface."""
+    def __init__(self, searcher, interface):
+        self.searcher = searcher
+        self.interface = interface
         self.transport = None
-        self.peername = None
         self.sockname = None
-        self.responses = set()
-        self.diagnostic_responses = set()
 
     def connection_made(self, transport):
         self.transport = transport
-        self.peername = self.transport.get_extra_info('peername')
         self.sockname = self.transport.get_extra_info('sockname')
-        packet = KnxSearchRequest(sockname=self.sockname)
+        self.send(KnxSearchRequest(sockname=self.sockname))
+        if self.searcher.diagnostic:
+            self.send(KnxRemoteDiagnosticRequest(sockname=self.sockname))
+
+    def send(self, packet):
         LOGGER.trace_outgoing(packet)
-        packet = packet.get_message()
-        self.transport.get_extra_info('socket').sendto(packet, (self.multicast_addr, self.port))
+        self.transport.sendto(packet.get_message(),
+                              (self.searcher.multicast_addr, self.searcher.port))
 
     def datagram_received(self, data, addr):
+        self.searcher.response_received(self, data, addr)
+
+    def error_received(self, exc):
+        LOGGER.debug('Search socket error on {}: {}'.format(self.interface, exc))
+
+
+class KnxGatewaySearcher(object):
+    """Search KNXnet/IP gateways on several network interfaces at once.
+
+    A UDP socket is bound to the address of each interface and sends a
+    SEARCH_REQUEST to the multicast group through this interface, so no
+    superuser privileges are required. Gateways send their responses
+    to the address of the request, the socket of the interface.
+
+    callback(peer, response, interface) is called for each gateway as
+    soon as its first response arrives. The search ends when expected
+    gateways responded, when no new gateway responded within
+    idle_timeout seconds after the last one or at the latest after
+    timeout seconds. Interfaces can be names or IPv4 addresses, the
+    interface of the default route is used if there are none.
+
+    search() returns an ordered dict of peer (host, port) to
+    KnxSearchResponse for all gateways that responded."""
+    def __init__(self, interfaces=None, loop=None,
+                 multicast_addr=KNX_CONSTANTS.get('MULTICAST_ADDR'),
+                 port=KNX_CONSTANTS.get('DEFAULT_PORT'), timeout=5, idle_timeout=1,
+                 expected=None, diagnostic=False, callback=None, ttl=16):
+        self.loop = loop or asyncio.get_event_loop()
+        self.interfaces = list(interfaces or [None])
+        self.multicast_addr = multicast_addr
+        self.port = port
+        self.timeout = timeout
+        self.idle_timeout = idle_timeout
+        self.expected = expected
+        self.diagnostic = diagnostic
+        self.callback = callback
+        self.ttl = ttl
+        self.endpoints = []
+        self.responses = collections.OrderedDict()
+        self.diagnostic_responses = collections.OrderedDict()
+        self.done = asyncio.Event(loop=self.loop)
+        self.idle = None
+        self.reason = None
+        self.t0 = None
+        self.t1 = None
+
+    def __repr__(self):
+        return '%s interfaces: %s, responses: %s' % (
+            self.__class__.__name__,
+            len(self.endpoints),
+            len(self.responses))
+
+    @asyncio.coroutine
+    def search(self):
+        self.t0 = self.loop.time()
+        for interface in self.interfaces:
+            try:
+                sock = self._make_socket(interface)
+                _, endpoint = yield from self.loop.create_datagram_endpoint(
+                    functools.partial(KnxSearchEndpoint, self, interface or 'default'),
+                    sock=sock)
+            except OSError as e:
+                LOGGER.error('Cannot search on interface {}: {}'.format(interface, e))
+                continue
+            self.endpoints.append(endpoint)
+        if not self.endpoints:
+            return self.responses
+        deadline = self.loop.call_later(self.timeout, self._finish, 'timeout')
+        try:
+            yield from self.done.wait()
+        finally:
+            deadline.cancel()
+            if self.idle:
+                self.idle.cancel()
+            self.t1 = self.loop.time()
+            for endpoint in self.endpoints:
+                endpoint.transport.close()
+        LOGGER.info(self.format_report())
+        return self.responses
+
+    def _make_socket(self, interface):
+        if interface:
+            address = knxmap.utils.get_interface_address(interface)
+        else:
+            address = self._default_address()
+        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        try:
+            sock.setblocking(False)
+            sock.bind((address, 0))
+            sock.setsockopt(socket.IPPROTO_IP, socket.IP_MULTICAST_IF,
+                            socket.inet_aton(address))
+            sock.setsockopt(socket.IPPROTO_IP, socket.IP_MULTICAST_TTL, self.ttl)
+            # Allow responses of gateways that run on this host
+            sock.setsockopt(socket.IPPROTO_IP, socket.IP_MULTICAST_LOOP, 1)
+        except OSError:
+            sock.close()
+            raise
+        return sock
+
+    def _default_address(self):
+        """Return the address of the interface that is used
+        to reach the multicast group without sending anything."""
+        with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as sock:
+            sock.connect((self.multicast_addr, self.port))
+            return sock.getsockname()[0]
+
+    def _finish(self, reason):
+        if not self.done.is_set():
+            self.reason = reason
+            self.done.set()
+
+    def response_received(self, endpoint, data, addr):
         knx_message = parse_message(data)
-        if knx_message:
-            knx_message.set_peer(addr)
-            LOGGER.trace_incoming(knx_message)
-            if isinstance(knx_message, KnxSearchResponse):
-                self.responses.add((addr, knx_message))
-            elif isinstance(knx_message, KnxRemoteDiagnosticResponse):
-                self.diagnostic_responses.add((addr, knx_message))
+        if not knx_message:
+            return
+        knx_message.set_peer(addr)
+        LOGGER.trace_incoming(knx_message)
+        peer = (addr[0], addr[1])
+        if isinstance(knx_message, KnxRemoteDiagnosticResponse):
+            self.diagnostic_responses[peer] = knx_message
+            return
+        if not isinstance(knx_message, KnxSearchResponse) or peer in self.responses:
+            # Gateways on more than one of the interfaces respond more than once
+            return
+        self.responses[peer] = knx_message
+        if self.callback:
+            self.callback(peer, knx_message, endpoint.interface)
+        if self.expected and len(self.responses) >= self.expected:
+            self._finish('expected')
+            return
+        if self.idle:
+            self.idle.cancel()
+        if self.idle_timeout:
+            self.idle = self.loop.call_later(self.idle_timeout, self._finish, 'idle')
 
-    def send_diagnostic_request(self, selector=None):
-        packet = KnxRemoteDiagnosticRequest(sockname=self.sockname)
-        LOGGER.trace_outgoing(packet)
-        packet = packet.get_message()
-        self.transport.get_extra_info('socket').sendto(packet, (self.multicast_addr, self.port))
+    def report(self):
+        """Return the statistics of the search as an ordered dict."""
+        duration = ((self.t1 or self.loop.time()) - self.t0) if self.t0 else 0.0
+        report = collections.OrderedDict()
+        report['interfaces'] = len(self.endpoints)
+        report['gateways'] = len(self.responses)
+        report['diagnostic_responses'] = len(self.diagnostic_responses)
+        report['reason'] = self.reason
+        report['duration'] = duration
+        return report
+
+    def format_report(self):
+        return ('Gateway search: {gateways} gateways on {interfaces} interfaces, '
+                '{diagnostic_responses} diagnostic responses, ended by {reason} '
+                'after {duration:.1f} seconds').format(**self.report())
 
 
 class KnxGatewayDescription(asyncio.DatagramProtocol):
@@ -93,3 +232,242 @@ class KnxGatewayDescription(asyncio.DatagramProtocol):
                 self.future.set_result(knx_message)
             else:
                 self.future.set_result(False)
+
+
+class TimerWheel(object):
+    """Expire a large number of timeouts of the same length with a single
+    timer handle. Keys are put into the slot that the wheel reaches after
+    timeout seconds, callback(key) is called for each of them when it
+    does. Expired keys cannot be cancelled, the callback has to ignore
+    keys that are no longer relevant. The wheel only ticks while it
+    contains keys."""
+    def __init__(self, timeout, callback, loop=None, resolution=0.1):
+        self.loop = loop or asyncio.get_event_loop()
+        self.callback = callback
+        self.resolution = resolution
+        self.slots = [[] for _ in range(int(math.ceil(timeout / resolution)) + 1)]
+        self.position = 0
+        self.count = 0
+        self.handle = None
+
+    def __len__(self):
+        return self.count
+
+    def add(self, key):
+        self.slots[(self.position - 1) % len(self.slots)].append(key)
+        self.count += 1
+        if not self.handle:
+            self.handle = self.loop.call_later(self.resolution, self._tick)
+
+    def _tick(self):
+        self.position = (self.position + 1) % len(self.slots)
+        expired = self.slots[self.position]
+        self.slots[self.position] = []
+        self.count -= len(expired)
+        self.handle = self.loop.call_later(self.resolution, self._tick) if self.count else None
+        for key in expired:
+            self.callback(key)
+
+    def cancel(self):
+        if self.handle:
+            self.handle.cancel()
+            self.handle = None
+
+
+class KnxDescriptionEndpoint(asyncio.DatagramProtocol):
+    """A shared UDP socket of a KnxDescriptionScanner."""
+    def __init__(self, scanner):
+        self.scanner = scanner
+        self.transport = None
+        self.sockname = None
+        self.packet = None
+
+    def connection_made(self, transport):
+        self.transport = transport
+        self.sockname = self.transport.get_extra_info('sockname')
+        if self.scanner.nat_mode or self.sockname[0] == '0.0.0.0':
+            # Gateways send the response to the source of the request
+            packet = KnxDescriptionRequest(sockname=('0.0.0.0', 0))
+        else:
+            packet = KnxDescriptionRequest(sockname=self.sockname)
+        LOGGER.trace_outgoing(packet)
+        self.packet = bytes(packet.get_message())
+
+    def datagram_received(self, data, addr):
+        self.scanner.response_received(data, addr)
+
+    def error_received(self, exc):
+        self.scanner.errors += 1
+        LOGGER.debug('Description scan socket error: {}'.format(exc))
+
+
+class KnxDescriptionScanner(object):
+    """Send DESCRIPTION_REQUESTs to a large number of targets from a few
+    shared UDP sockets, at a fixed rate of packets per second.
+
+    Unlike KnxGatewayDescription, which opens a socket and a timer for
+    every target, responses are matched to their targets by the source
+    address and all timeouts share a single TimerWheel. Targets that
+    do not respond within timeout seconds are probed again up to
+    retries times in total.
+
+    If limiter, an AimdLimiter, is given, its current rate is used instead
+    of rate. Responses to retransmitted probes are reported to it as loss,
+    so the rate drops when targets or the network start dropping probes.
+
+    scan() returns an ordered dict of (host, port) to
+    KnxDescriptionResponse for all targets that responded."""
+    def __init__(self, targets, loop=None, timeout=2, retries=2, rate=1000, sockets=1,
+                 local_addr=None, nat_mode=False, limiter=None):
+        self.loop = loop or asyncio.get_event_loop()
+        self.targets = iter(targets)
+        self.total = len(targets) if hasattr(targets, '__len__') else None
+        self.timeout = timeout
+        self.retries = max(retries, 1)
+        self.rate = rate
+        self.sockets = max(sockets, 1)
+        self.local_addr = local_addr or '0.0.0.0'
+        self.nat_mode = nat_mode
+        self.limiter = limiter
+        self.endpoints = []
+        # Maps (host, port) of targets that have not responded yet to the count of probes
+        self.pending = {}
+        self.retry = collections.deque()
+        self.responses = collections.OrderedDict()
+        self.wheel = TimerWheel(timeout, self._timeout, loop=self.loop)
+        self.exhausted = False
+        self.wakeup = asyncio.Event(loop=self.loop)
+        self.probes = 0
+        self.retransmissions = 0
+        self.timeouts = 0
+        self.unmatched = 0
+        self.errors = 0
+        self.t0 = None
+        self.t1 = None
+
+    def __repr__(self):
+        return '%s probes: %s, responses: %s, pending: %s' % (
+            self.__class__.__name__,
+            self.probes,
+            len(self.responses),
+            len(self.pending))
+
+    @asyncio.coroutine
+    def scan(self):
+        for _ in range(self.sockets):
+            _, endpoint = yield from self.loop.create_datagram_endpoint(
+                functools.partial(KnxDescriptionEndpoint, self),
+                local_addr=(self.local_addr, 0))
+            self.endpoints.append(endpoint)
+        self.t0 = self.loop.time()
+        try:
+            yield from self._send()
+        finally:
+            self.t1 = self.loop.time()
+            self.wheel.cancel()
+            for endpoint in self.endpoints:
+                endpoint.transport.close()
+        LOGGER.info(self.format_report())
+        return self.responses
+
+    def _next_target(self):
+        if self.retry:
+            self.retransmissions += 1
+            return self.retry.popleft()
+        if not self.exhausted:
+            try:
+                return next(self.targets)
+            except StopIteration:
+                self.exhausted = True
+        return None
+
+    @asyncio.coroutine
+    def _send(self):
+        tokens = 1.0
+        last = self.loop.time()
+        while True:
+            rate = self.limiter.rate if self.limiter else self.rate
+            interval = max(1.0 / rate, 0.001) if rate else 0
+            # Token bucket that holds up to 10ms worth of probes, so the
+            # rate is not exceeded in bursts after the loop has been busy.
+            burst = max(rate / 100.0, 1.0) if rate else 1000
+            if self.exhausted and not self.retry:
+                if not self.pending:
+                    return
+                # Nothing to send until a target times out or the last one responded
+                self.wakeup.clear()
+                yield from self.wakeup.wait()
+                continue
+            now = self.loop.time()
+            tokens = min(tokens + (now - last) * rate, burst) if rate else burst
+            last = now
+            while tokens >= 1:
+                target = self._next_target()
+                if target is None:
+                    break
+                self._probe(target)
+                tokens -= 1
+            yield from asyncio.sleep(interval)
+
+    def _probe(self, target):
+        endpoint = self.endpoints[self.probes % len(self.endpoints)]
+        attempt = self.pending.get(target, 0) + 1
+        self.pending[target] = attempt
+        self.probes += 1
+        self.wheel.add((target, attempt))
+        endpoint.transport.sendto(endpoint.packet, target)
+
+    def _timeout(self, key):
+        target, attempt = key
+        if self.pending.get(target) != attempt:
+            # Answered or probed again in the meantime
+            return
+        if attempt < self.retries:
+            self.retry.append(target)
+        else:
+            del self.pending[target]
+            self.timeouts += 1
+        self.wakeup.set()
+
+    def response_received(self, data, addr):
+        target = (addr[0], addr[1])
+        attempt = self.pending.pop(target, None)
+        if attempt is None:
+            self.unmatched += 1
+            return
+        if self.limiter:
+            if attempt > 1:
+                self.limiter.loss()
+            else:
+                self.limiter.success()
+        knx_message = parse_message(data)
+        if knx_message:
+            knx_message.set_peer(addr)
+            LOGGER.trace_incoming(knx_message)
+            if isinstance(knx_message, KnxDescriptionResponse):
+                self.responses[target] = knx_message
+        if not self.pending:
+            self.wakeup.set()
+
+    def report(self):
+        """Return the statistics of the scan as an ordered dict."""
+        duration = ((self.t1 or self.loop.time()) - self.t0) if self.t0 else 0.0
+        targets = self.probes - self.retransmissions
+        report = collections.OrderedDict()
+        report['targets'] = targets
+        report['probes'] = self.probes
+        report['retransmissions'] = self.retransmissions
+        report['responses'] = len(self.responses)
+        report['timeouts'] = self.timeouts
+        report['unmatched'] = self.unmatched
+        report['errors'] = self.errors
+        report['duration'] = duration
+        report['probes_per_second'] = self.probes / duration if duration else 0.0
+        report['response_rate'] = len(self.responses) / targets if targets else 0.0
+        return report
+
+    def format_report(self):
+        report = self.report()
+        return ('Description scan: {targets} targets, {probes} probes ({probes_per_second:.0f}/s), '
+                '{responses} responses ({response_rate:.2%}), {timeouts} timeouts, '
+                '{unmatched} unmatched, {duration:.1f} seconds').format(**report)
@@ -1,12 +1,13 @@
 #!/usr/bin/env python3
 import sys
-import os
 import argparse
 import logging
 import functools
 
 from knxmap import KnxMap, Targets, KnxTargets
 from knxmap.misc import setup_logger
+from knxmap.store import ScanStore
+from knxmap.bus.bruteforce import load_wordlist
 
 # asyncio requires at least Python 3.3
 if sys.version_info.major < 3 or \
@@ -42,9 +43,16 @@ ARGS.add_argument(
 ARGS.add_argument(
     '-p', action='store', dest='port', type=int,
     default=3671, help='target UDP port')
+ARGS.add_argument(
+    '--exclude', action='append', dest='exclude', metavar='TARGET',
+    default=None, help='do not scan this address or network (can be repeated)')
+ARGS.add_argument(
+    '--randomize', action='store_true', dest='randomize',
+    default=False, help='scan targets in random order')
 ARGS.add_argument(
     '-i', action='store', dest='iface',
-    default=None, help='network interface')
+    default=None, help='network interface, search accepts a comma separated list '
+                       'of interfaces or addresses')
 ARGS.add_argument(
     '--workers', action='store', type=int, metavar='N',
     default=30, help='count of concurrent workers')
@@ -77,18 +85,48 @@ pscan.add_argument(
 pscan.add_argument(
     '--omit-configuration-reads', action='store_false', dest='configuration_reads',
     default=True, help='omit DEVICE_CONFIGURATION_REQUESTs (scanning will be faster, but less verbose')
+pscan.add_argument(
+    '--configuration-properties', action='store_true', dest='configuration_properties',
+    default=False, help='read all properties of the interface objects of gateways')
 pscan.add_argument(
     '--bus-info', action='store_true', dest='bus_info',
     default=False, help='try to extract information from alive bus devices')
+pscan.add_argument(
+    '--bus-info-timeout', action='store', dest='bus_info_timeout', type=int,
+    default=60, help='time (in seconds) to extract information from a single bus device')
 pscan.add_argument(
     '--key', action='store', dest='auth_key',
     default=0xffffffff, help='authorization key for System 2 and System 7 devices')
 pscan.add_argument(
     '--bus-timeout', action='store', dest='bus_timeout', type=int,
     default=2, help='waiting time (in seconds) for deferred NDP messages')
+pscan.add_argument(
+    '--bus-window', action='store', dest='bus_window', type=int, metavar='N',
+    default=1, help='count of T_Connect probes in flight per tunnel connection')
 pscan.add_argument(
     '--ignore-auth', action='store_true', dest='ignore_auth',
     default=False, help='ignore authorization')
+pscan.add_argument(
+    '--rate', action='store', dest='desc_rate', type=int, metavar='N',
+    default=0, help='send description requests from shared sockets at N packets per '
+                    'second (0 opens a socket per target)')
+pscan.add_argument(
+    '--sockets', action='store', dest='desc_sockets', type=int, metavar='N',
+    default=1, help='count of shared sockets for --rate')
+pscan.add_argument(
+    '--adaptive', action='store_true', dest='adaptive',
+    default=False, help='adapt the requests in flight (up to --workers) and --rate '
+                        'to packet loss')
+pscan.add_argument(
+    '--gateway-rate', action='store', dest='gateway_rate', type=float, metavar='N',
+    default=0, help='send at most N requests per second to each gateway (implies --adaptive)')
+pscan.add_argument(
+    '--store', action='store', dest='store', metavar='PATH',
+    default=None, help='record the results in an SQLite database and log the changes '
+                       'since the last scan')
+pscan.add_argument(
+    '--rescan-age', action='store', dest='rescan_age', type=int, metavar='SECONDS',
+    default=0, help='with --store, skip targets probed within the last SECONDS')
 
 psearch = SUBARGS.add_parser('search',
                              help='search for KNXnet/IP gateways on the local network')
@@ -98,6 +136,15 @@ ARGS.add_argument(
 psearch.add_argument(
     '--search-timeout', action='store', dest='search_timeout', type=int,
     default=5, help='timeout (in seconds) for multicast responses')
+psearch.add_argument(
+    '--idle-timeout', action='store', dest='idle_timeout', type=float, metavar='SECONDS',
+    default=1, help='stop when no new gateway responded for SECONDS')
+psearch.add_argument(
+    '--expected', action='store', dest='expected', type=int, metavar='N',
+    default=None, help='stop as soon as N gateways responded')
+psearch.add_argument(
+    '--diagnostic', action='store_true', dest='diagnostic',
+    default=False, help='send remote diagnostic requests as well')
 
 pwrite = SUBARGS.add_parser('write', help='Write a value to a group address',
                             formatter_class=argparse.ArgumentDefaultsHelpFormatter)
@@ -162,12 +209,24 @@ papci.add_argument(
 pbrute = SUBARGS.add_parser('brute', help='Bruteforce authentication key',
                             formatter_class=argparse.ArgumentDefaultsHelpFormatter)
 pbrute.add_argument(
-    'targets', help='KNXnet/IP gateway IP address or hostname', metavar='gateway')
+    'targets', nargs='+', metavar='gateway',
+    help='KNXnet/IP gateway IP address or hostname (several gateways on the same '
+         'line share the key space)')
 pbrute.add_argument(
     'bus_target', help='individual address of a bus device')
 pbrute.add_argument(
     '--full-key-space', action='store_true', dest='full_key_space',
     default=False, help='bruteforce the full key space (0 - 0xffffffff)')
+pbrute.add_argument(
+    '--wordlist', action='store', dest='wordlist', metavar='PATH',
+    default=None, help='file with keys (one hex key per line) to test after the vendor '
+                       'default keys')
+pbrute.add_argument(
+    '--start-key', action='store', dest='start_key',
+    default='0', help='first key (hex) of --full-key-space')
+pbrute.add_argument(
+    '--checkpoint', action='store', dest='checkpoint', metavar='PATH',
+    default=None, help='save the progress to PATH and resume from it')
 
 pmonitor = SUBARGS.add_parser('monitor', help='Monitor bus and group messages',
                               formatter_class=argparse.ArgumentDefaultsHelpFormatter)
@@ -184,8 +243,9 @@ def main():
     loop = asyncio.get_event_loop()
 
     if hasattr(args, 'targets'):
-        targets = Targets(args.targets, args.port)
-        knxmap = KnxMap(targets=targets.targets,
+        targets = Targets(args.targets, args.port, exclude=args.exclude,
+                          randomize=args.randomize)
+        knxmap = KnxMap(targets=targets,
                         max_workers=args.workers,
                         max_connections=args.connections,
                         medium=args.medium,
@@ -197,17 +257,14 @@ def main():
                         nat_mode=args.nat_mode)
     try:
         if args.cmd == 'search':
-            if not args.iface:
-                LOGGER.error('--search option requires -i/--interface argument')
-                sys.exit(1)
-            if os.geteuid() != 0:
-                LOGGER.error('-i/--interface option requires superuser privileges')
-                sys.exit(1)
             loop.run_until_complete(knxmap.search(
                 search_timeout=args.search_timeout,
                 iface=args.iface,
                 multicast_addr=args.multicast_addr,
-                port=args.port))
+                port=args.port,
+                expected=args.expected,
+                idle_timeout=args.idle_timeout,
+                diagnostic=args.diagnostic))
         elif args.cmd == 'apci':
             loop.run_until_complete(knxmap.apci(
                 target=args.device,
@@ -230,10 +287,14 @@ def main():
             bus_target = KnxTargets(args.bus_target)
             loop.run_until_complete(knxmap.brute(
                 bus_target=bus_target.targets,
-                full_key_space=args.full_key_space))
+                full_key_space=args.full_key_space,
+                wordlist=load_wordlist(args.wordlist) if args.wordlist else None,
+                start_key=int(args.start_key, 16),
+                checkpoint=args.checkpoint))
         elif args.cmd == 'scan':
-            LOGGER.info('Scanning {} target(s)'.format(len(targets.targets)))
+            LOGGER.info('Scanning {} target(s)'.format(len(targets)))
             bus_targets = KnxTargets(args.bus_targets)
+            store = ScanStore(args.store) if args.store else None
             loop.run_until_complete(knxmap.scan(
                 desc_timeout=args.timeout,
                 desc_retries=args.retries,
@@ -243,7 +304,18 @@ def main():
                 knx_source=args.knx_source,
                 auth_key=args.auth_key,
                 ignore_auth=args.ignore_auth,
-                configuration_reads=args.configuration_reads))
+                configuration_reads=args.configuration_reads,
+                desc_rate=args.desc_rate,
+                desc_sockets=args.desc_sockets,
+                adaptive=args.adaptive,
+                gateway_rate=args.gateway_rate,
+                bus_window=args.bus_window,
+                bus_info_timeout=args.bus_info_timeout,
+                store=store,
+                rescan_age=args.rescan_age,
+                configuration_properties=args.configuration_properties))
+            if store:
+                store.close()
     except KeyboardInterrupt:
         for t in asyncio.Task.all_tasks():
             t.cancel()
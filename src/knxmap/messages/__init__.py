@@ -2,7 +2,7 @@ import struct
 import logging
 
 from knxmap import KNX_MESSAGE_TYPES
-from knxmap.messages.main import KnxMessage
+from knxmap.messages.main import KnxMessage, KnxHeader
 from knxmap.messages.tpci import Tpci
 from knxmap.messages.apci import Apci
 from knxmap.messages.cemi import CemiFrame
@@ -18,6 +18,54 @@ from knxmap.messages.remconf import KnxRemoteDiagnosticRequest, KnxRemoteDiagnos
 
 LOGGER = logging.getLogger(__name__)
 
+# The service type is the third field of the KNXnet/IP header
+_SERVICE_TYPE = struct.Struct('!H')
+
+# Maps KNXnet/IP service types to the KnxMessage subclasses that parse them
+MESSAGE_CLASSES = {}
+
+
+def register_message_type(service_type, cls=None):
+    """
+    Register a KnxMessage subclass that parse_message() will use for messages of the
+    given service type. Already registered service types are overwritten. This can also
+    be used as a class decorator:
+
+        @register_message_type('OBJECTSERVER_REQUEST')
+        class KnxObjectServerRequest(KnxMessage):
+            ...
+
+    :param service_type: A service type as integer or its name in KNX_MESSAGE_TYPES.
+    :param cls: A KnxMessage subclass that takes the raw message as first argument.
+    :return: cls, or a decorator if cls is not given.
+    """
+    if isinstance(service_type, str):
+        service_type = KNX_MESSAGE_TYPES[service_type]
+    if cls is None:
+        return lambda c: register_message_type(service_type, c)
+    MESSAGE_CLASSES[service_type] = cls
+    return cls
+
+
+for _service_type, _cls in [
+        ('SEARCH_RESPONSE', KnxSearchResponse),
+        ('DESCRIPTION_RESPONSE', KnxDescriptionResponse),
+        ('CONNECT_RESPONSE', KnxConnectResponse),
+        ('TUNNELLING_REQUEST', KnxTunnellingRequest),
+        ('TUNNELLING_ACK', KnxTunnellingAck),
+        ('CONNECTIONSTATE_REQUEST', KnxConnectionStateRequest),
+        ('CONNECTIONSTATE_RESPONSE', KnxConnectionStateResponse),
+        ('DISCONNECT_REQUEST', KnxDisconnectRequest),
+        ('DISCONNECT_RESPONSE', KnxDisconnectResponse),
+        ('DEVICE_CONFIGURATION_REQUEST', KnxDeviceConfigurationRequest),
+        ('DEVICE_CONFIGURATION_RESPONSE', KnxDeviceConfigurationAck),
+        ('ROUTING_INDICATION', KnxRoutingIndication),
+        ('ROUTING_LOST_MESSAGE', KnxRoutingLostMessage),
+        ('ROUTING_BUSY', KnxRoutingBusy),
+        ('REMOTE_DIAGNOSTIC_REQUEST', KnxRemoteDiagnosticRequest),
+        ('REMOTE_DIAGNOSTIC_RESPONSE', KnxRemoteDiagnosticResponse)]:
+    register_message_type(_service_type, _cls)
+
 
 def parse_message(data):
     """
@@ -28,48 +76,13 @@ def parse_message(data):
     :return: A class instance of any KnxMessage subclass or None if data is not a valid KNX message.
     """
     try:
-        _, _, message_type = struct.unpack('>BBH', data[:4])
-        message_type = int(message_type)
+        message_type = _SERVICE_TYPE.unpack_from(data, 2)[0]
     except struct.error as e:
         LOGGER.exception(e)
         return
-    except ValueError as e:
-        LOGGER.exception(e)
-        return
 
-    if message_type == KNX_MESSAGE_TYPES.get('SEARCH_RESPONSE'):
-        LOGGER.debug('Parsing KnxSearchResponse')
-        return KnxSearchResponse(data)
-    elif message_type == KNX_MESSAGE_TYPES.get('DESCRIPTION_RESPONSE'):
-        LOGGER.debug('Parsing KnxDescriptionResponse')
-        return KnxDescriptionResponse(data)
-    elif message_type == KNX_MESSAGE_TYPES.get('CONNECT_RESPONSE'):
-        LOGGER.debug('Parsing KnxConnectResponse')
-        return KnxConnectResponse(data)
-    elif message_type == KNX_MESSAGE_TYPES.get('TUNNELLING_REQUEST'):
-        LOGGER.debug('Parsing KnxTunnellingRequest')
-        return KnxTunnellingRequest(data)
-    elif message_type == KNX_MESSAGE_TYPES.get('TUNNELLING_ACK'):
-        LOGGER.debug('Parsing KnxTunnelingAck')
-        return KnxTunnellingAck(data)
-    elif message_type == KNX_MESSAGE_TYPES.get('CONNECTIONSTATE_REQUEST'):
-        LOGGER.debug('Parsing KnxConnectionStateRequest')
-        return KnxConnectionStateRequest(data)
-    elif message_type == KNX_MESSAGE_TYPES.get('CONNECTIONSTATE_RESPONSE'):
-        LOGGER.debug('Parsing KnxConnectionStateResponse')
-        return KnxConnectionStateResponse(data)
-    elif message_type == KNX_MESSAGE_TYPES.get('DISCONNECT_REQUEST'):
-        LOGGER.debug('Parsing KnxDisconnectRequest')
-        return KnxDisconnectRequest(data)
-    elif message_type == KNX_MESSAGE_TYPES.get('DISCONNECT_RESPONSE'):
-        LOGGER.debug('Parsing KnxDisconnectResponse')
-        return KnxDisconnectResponse(data)
-    elif message_type == KNX_MESSAGE_TYPES.get('DEVICE_CONFIGURATION_REQUEST'):
-        LOGGER.debug('Parsing KnxDeviceConfigurationRequest')
-        return KnxDeviceConfigurationRequest(data)
-    elif message_type == KNX_MESSAGE_TYPES.get('DEVICE_CONFIGURATION_RESPONSE'):
-        LOGGER.debug('Parsing KnxDeviceConfigurationAck')
-        return KnxDeviceConfigurationAck(data)
-    else:
+    message_class = MESSAGE_CLASSES.get(message_type)
+    if message_class is None:
         LOGGER.error('Unknown message type: {}'.format(message_type))
-        return None
\ No newline at end of file
+        return None
+    return message_class(data)
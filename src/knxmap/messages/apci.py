@@ -52,36 +52,40 @@ class Apci(object):
         return apci
 
     def unpack(self, data=None):
+        """Decode the APCI from the first two bytes of data (TPCI/APCI and APCI/data).
+        Frames without an APCI byte are decoded as if it would be zero."""
         data = data or self.data
-        if len(data) == 1:
-            data.extend([0])
-        #assert len(data) >= 2, 'APCI data too short (only %d bytes)' % len(data)
-        self.apci_type = 0
-        self.apci_type |= ((data[1] >> 6) & 1) << 0
-        self.apci_type |= ((data[1] >> 7) & 1) << 1
-        self.apci_type |= ((data[0] >> 0) & 1) << 2
-        self.apci_type |= ((data[0] >> 1) & 1) << 3
-        if self.apci_type in CEMI_APCI_TYPES.values():
-            self.apci_data = 0
-            self.apci_data |= ((data[1] >> 0) & 1) << 0
-            self.apci_data |= ((data[1] >> 1) & 1) << 1
-            self.apci_data |= ((data[1] >> 2) & 1) << 2
-            self.apci_data |= ((data[1] >> 3) & 1) << 3
-            self.apci_data |= ((data[1] >> 4) & 1) << 4
-            self.apci_data |= ((data[1] >> 5) & 1) << 5
-        else:
-            self.apci_type <<= 2
-            self.apci_type |= ((data[1] >> 4) & 1) << 0
-            self.apci_type |= ((data[1] >> 5) & 1) << 1
-            if self.apci_type in CEMI_APCI_TYPES.values():
-                self.apci_data = 0
-                self.apci_data |= ((data[1] >> 0) & 1) << 0
-                self.apci_data |= ((data[1] >> 1) & 1) << 1
-                self.apci_data |= ((data[1] >> 2) & 1) << 2
-                self.apci_data |= ((data[1] >> 3) & 1) << 3
-            else:
-                self.apci_type <<= 4
-                self.apci_type |= ((data[1] >> 0) & 1) << 0
-                self.apci_type |= ((data[1] >> 1) & 1) << 1
-                self.apci_type |= ((data[1] >> 2) & 1) << 2
-                self.apci_type |= ((data[1] >> 3) & 1) << 3
+        second = data[1] if len(data) > 1 else 0
+        self.apci_type, data_mask = APCI_TABLE[((data[0] & 0x03) << 8) | second]
+        if data_mask is not None:
+            self.apci_data = second & data_mask
+
+
+def _unpack_bitwise(first, second):
+    """Decode the 10 APCI bits bit by bit. The APCI type has either 4, 6
+    or 10 bits, the remaining bits of the second byte carry data. Returns
+    the APCI type and the mask of the data bits (None for 10 bit types).
+    This is used to build APCI_TABLE, Apci.unpack() uses the table."""
+    apci_type = 0
+    apci_type |= ((second >> 6) & 1) << 0
+    apci_type |= ((second >> 7) & 1) << 1
+    apci_type |= ((first >> 0) & 1) << 2
+    apci_type |= ((first >> 1) & 1) << 3
+    if apci_type in _CEMI_APCI_TYPES:
+        return apci_type, 0x3f
+    apci_type <<= 2
+    apci_type |= ((second >> 4) & 1) << 0
+    apci_type |= ((second >> 5) & 1) << 1
+    if apci_type in _CEMI_APCI_TYPES:
+        return apci_type, 0x0f
+    apci_type <<= 4
+    apci_type |= ((second >> 0) & 1) << 0
+    apci_type |= ((second >> 1) & 1) << 1
+    apci_type |= ((second >> 2) & 1) << 2
+    apci_type |= ((second >> 3) & 1) << 3
+    return apci_type, None
+
+
+# (apci_type, data_mask) for all values of the 10 APCI bits, indexed
+# by the lower two bits of the first byte followed by the second byte.
+APCI_TABLE = tuple(_unpack_bitwise(i >> 8, i & 0xff) for i in range(1024))
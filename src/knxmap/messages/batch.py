@@ -0,0 +1,157 @@
+"""Vectorized decoding of stored cEMI L_Data frames.
+
+Analytics and backfills have to decode millions of frames from the
+database. Instead of decoding them one by one with ExtendedDataRequest,
+the frames are packed into a single buffer and all header fields are
+extracted with NumPy in one pass:
+
+    frames = [row.cemi for row in rows]
+    batch = decode_frames(*pack_frames(frames))
+    group_writes = batch.apci_type == CEMI_APCI_TYPES['A_GroupValue_Write']
+    sources = batch.knx_source[group_writes]
+
+Frames must have the same layout as the service information of a cEMI
+L_Data frame (see ExtendedDataRequest), starting offset bytes after the
+beginning of each frame:
+
+    control field 1, control field 2, source (2 bytes), destination (2 bytes),
+    NPDU length, TPCI/APCI, APCI/data, data...
+
+NumPy is optional, pack_frames() and decode_frames() raise an ImportError without it."""
+import binascii
+import logging
+
+try:
+    import numpy
+    NUMPY_SUPPORT = True
+except ImportError:
+    NUMPY_SUPPORT = False
+
+from .apci import APCI_TABLE
+from .tpci import TPCI_TABLE
+
+__all__ = ['NUMPY_SUPPORT', 'CemiBatch', 'pack_frames', 'decode_frames']
+
+LOGGER = logging.getLogger(__name__)
+
+# Bytes from the control field up to and including the APCI/data byte
+_HEADER_SIZE = 9
+
+if NUMPY_SUPPORT:
+    _TPCI_TYPES = numpy.array([t for t, _ in TPCI_TABLE], dtype=numpy.uint8)
+    _TPCI_SEQUENCES = numpy.array([s for _, s in TPCI_TABLE], dtype=numpy.uint8)
+    _APCI_TYPES = numpy.array([t for t, _ in APCI_TABLE], dtype=numpy.uint16)
+    # -1 marks 10 bit APCI types that do not carry data in the APCI byte
+    _APCI_DATA_MASKS = numpy.array([-1 if m is None else m for _, m in APCI_TABLE],
+                                   dtype=numpy.int16)
+
+
+class CemiBatch(object):
+    """The decoded header fields of a batch of frames as NumPy column arrays.
+
+    All columns have one entry per frame. Payloads are not copied,
+    payload_offset and payload_length point into buffer. Use payload()
+    to get the payload of a single frame. Frames that are too short for
+    their NPDU length are marked in valid, their columns must not be used."""
+    def __init__(self, buffer, count):
+        self.buffer = buffer
+        self.count = count
+        self.valid = None
+        self.control_field = None
+        self.extended_control_field = None
+        self.knx_source = None
+        self.knx_destination = None
+        self.destination_type = None
+        self.npdu_length = None
+        self.tpci_type = None
+        self.tpci_sequence = None
+        self.apci_type = None
+        self.apci_data = None
+        self.payload_offset = None
+        self.payload_length = None
+
+    def __repr__(self):
+        return '%s frames: %s, invalid: %s' % (
+            self.__class__.__name__,
+            self.count,
+            self.count - int(self.valid.sum()) if self.valid is not None else None)
+
+    def __len__(self):
+        return self.count
+
+    def payload(self, index):
+        """Return the payload of frame index as a memoryview of buffer.
+        This is the same as ExtendedDataRequest.data of the frame."""
+        offset = int(self.payload_offset[index])
+        return memoryview(self.buffer)[offset:offset + int(self.payload_length[index])]
+
+
+def pack_frames(frames):
+    """Pack frames into a single buffer.
+
+    :param frames: An iterable of frames as bytes, bytearray or hex
+    strings (as stored in the cemi columns of the database).
+    :return: The buffer and the start offsets and lengths of all frames
+    as NumPy arrays, which can be passed to decode_frames().
+    """
+    if not NUMPY_SUPPORT:
+        raise ImportError('Batch decoding requires NumPy')
+    buffer = bytearray()
+    starts = []
+    lengths = []
+    for frame in frames:
+        if isinstance(frame, str):
+            frame = binascii.unhexlify(frame)
+        starts.append(len(buffer))
+        lengths.append(len(frame))
+        buffer.extend(frame)
+    return bytes(buffer), numpy.array(starts, dtype=numpy.int64), \
+        numpy.array(lengths, dtype=numpy.int64)
+
+
+def decode_frames(buffer, starts, lengths, offset=0):
+    """Decode the headers of all frames in buffer in one vectorized pass.
+
+    :param buffer: A bytes-like object that contains all frames.
+    :param starts: The offsets of the frames in buffer.
+    :param lengths: The lengths of the frames.
+    :param offset: The number of bytes before the control field in each frame,
+    e.g. 2 for frames that start with the cEMI message code and an empty
+    additional information.
+    :return: A CemiBatch instance.
+    """
+    if not NUMPY_SUPPORT:
+        raise ImportError('Batch decoding requires NumPy')
+    starts = numpy.asarray(starts, dtype=numpy.int64) + offset
+    lengths = numpy.asarray(lengths, dtype=numpy.int64) - offset
+    # Pad the buffer so that the fixed size header of truncated
+    # frames at the end of the buffer can be read without checks.
+    data = numpy.frombuffer(bytes(buffer) + bytes(_HEADER_SIZE), dtype=numpy.uint8)
+    batch = CemiBatch(buffer, len(starts))
+
+    def column(position):
+        return data[numpy.clip(starts + position, 0, len(data) - 1)]
+
+    batch.control_field = column(0)
+    batch.extended_control_field = column(1)
+    batch.knx_source = (column(2).astype(numpy.uint16) << 8) | column(3)
+    batch.knx_destination = (column(4).astype(numpy.uint16) << 8) | column(5)
+    batch.destination_type = batch.extended_control_field >> 7
+    batch.npdu_length = column(6)
+    # The NPDU length does not include the TPCI/APCI byte
+    batch.valid = lengths >= 8 + batch.npdu_length.astype(numpy.int64)
+
+    tpci_apci = column(7)
+    # The second APCI byte only exists if the NPDU is not empty
+    apci = numpy.where(batch.npdu_length > 0, column(8), 0).astype(numpy.uint16)
+    batch.tpci_type = _TPCI_TYPES[tpci_apci]
+    batch.tpci_sequence = _TPCI_SEQUENCES[tpci_apci]
+    index = ((tpci_apci.astype(numpy.uint16) & 0x03) << 8) | apci
+    batch.apci_type = _APCI_TYPES[index]
+    masks = _APCI_DATA_MASKS[index]
+    batch.apci_data = numpy.where(masks >= 0, apci.astype(numpy.int16) & masks, -1)
+
+    batch.payload_offset = starts + _HEADER_SIZE
+    batch.payload_length = numpy.clip(
+        numpy.minimum(batch.npdu_length.astype(numpy.int64) - 1, lengths - _HEADER_SIZE), 0, None)
+    return batch
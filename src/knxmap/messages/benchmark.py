@@ -0,0 +1,392 @@
+"""Micro-benchmarks for the KNXnet/IP message parsers.
+
+Run them from the src directory:
+
+    python3 -m knxmap.messages.benchmark
+    python3 -m knxmap.messages.benchmark dispatch
+
+The round-trip and fuzz tests of the message layer are in the tests
+directory and run with pytest, the benchmarks use their sample messages
+from tests/message_samples.py. To compare a new decoder with the
+current one, record a baseline first and run the same command again
+after the change:
+
+    python3 -m knxmap.messages.benchmark throughput --baseline /tmp/baseline.json
+
+The second run fails if any decoded field differs and reports the
+speedup of every message type.
+"""
+import argparse
+import collections
+import hashlib
+import json
+import logging
+import os
+import struct
+import sys
+import timeit
+
+from knxmap import KNX_MESSAGE_TYPES
+from knxmap.messages import parse_message, MESSAGE_CLASSES, KnxTunnellingRequest, \
+    KnxTunnellingAck, KnxMessage, KnxHeader
+from knxmap.messages.templates import TunnellingRequestTemplates, pack_tunnelling_ack
+from knxmap.messages.apci import Apci
+from knxmap.messages.tpci import Tpci
+from knxmap.messages.batch import NUMPY_SUPPORT, pack_frames, decode_frames
+from knxmap.messages.reader import MessageReader
+from knxmap.messages.stream import Tp1StreamParser
+from knxmap.messages.tp import ExtendedDataRequest
+from knxmap.data.constants import CEMI_APCI_TYPES
+
+# The sample messages are shared with the tests
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(
+    os.path.dirname(os.path.abspath(__file__))))), 'tests'))
+from message_samples import sample_messages, fuzz_datagrams
+
+LOGGER = logging.getLogger(__name__)
+
+
+def _chain_dispatch(data):
+    """The if/elif dispatch parse_message() used before the lookup table, as a baseline."""
+    message_type = struct.unpack('>BBH', data[:4])[2]
+    if message_type == KNX_MESSAGE_TYPES.get('SEARCH_RESPONSE'):
+        return MESSAGE_CLASSES[message_type]
+    elif message_type == KNX_MESSAGE_TYPES.get('DESCRIPTION_RESPONSE'):
+        return MESSAGE_CLASSES[message_type]
+    elif message_type == KNX_MESSAGE_TYPES.get('CONNECT_RESPONSE'):
+        return MESSAGE_CLASSES[message_type]
+    elif message_type == KNX_MESSAGE_TYPES.get('TUNNELLING_REQUEST'):
+        return MESSAGE_CLASSES[message_type]
+    elif message_type == KNX_MESSAGE_TYPES.get('TUNNELLING_ACK'):
+        return MESSAGE_CLASSES[message_type]
+    elif message_type == KNX_MESSAGE_TYPES.get('CONNECTIONSTATE_REQUEST'):
+        return MESSAGE_CLASSES[message_type]
+    elif message_type == KNX_MESSAGE_TYPES.get('CONNECTIONSTATE_RESPONSE'):
+        return MESSAGE_CLASSES[message_type]
+    elif message_type == KNX_MESSAGE_TYPES.get('DISCONNECT_REQUEST'):
+        return MESSAGE_CLASSES[message_type]
+    elif message_type == KNX_MESSAGE_TYPES.get('DISCONNECT_RESPONSE'):
+        return MESSAGE_CLASSES[message_type]
+    elif message_type == KNX_MESSAGE_TYPES.get('DEVICE_CONFIGURATION_REQUEST'):
+        return MESSAGE_CLASSES[message_type]
+    elif message_type == KNX_MESSAGE_TYPES.get('DEVICE_CONFIGURATION_RESPONSE'):
+        return MESSAGE_CLASSES[message_type]
+
+
+_SERVICE_TYPE = struct.Struct('!H')
+
+
+def _table_dispatch(data):
+    return MESSAGE_CLASSES.get(_SERVICE_TYPE.unpack_from(data, 2)[0])
+
+
+# TPCI/APCI bytes of a bus with mostly group communication and
+# some device management, with their share of the traffic in percent.
+TELEGRAM_MIX = [
+    ('0081', 55),  # A_GroupValue_Write (small value)
+    ('0080', 10),  # A_GroupValue_Write (large value follows)
+    ('0000', 10),  # A_GroupValue_Read
+    ('0041', 10),  # A_GroupValue_Response
+    ('80', 3),  # T_Connect
+    ('81', 3),  # T_Disconnect
+    ('c2', 3),  # T_ACK
+    ('4300', 2),  # A_DeviceDescriptor_Read
+    ('4340', 2),  # A_DeviceDescriptor_Response
+    ('47d5', 1),  # A_PropertyValue_Read
+    ('4bd6', 1),  # A_PropertyValue_Response
+]
+
+
+def telegram_mix():
+    """Return the TPCI/APCI bytes of TELEGRAM_MIX as a list with 100 entries."""
+    mix = []
+    for tpci_apci, share in TELEGRAM_MIX:
+        mix.extend([bytearray.fromhex(tpci_apci)] * share)
+    return mix
+
+
+def _tpci_unpack_bitwise(tpci, data):
+    """Tpci.unpack() before the lookup table, as a baseline."""
+    tpci.tpci_type = 0
+    tpci.tpci_type |= ((data >> 6) & 1) << 0
+    tpci.tpci_type |= ((data >> 7) & 1) << 1
+    tpci.sequence = 0
+    tpci.sequence |= ((data >> 2) & 1) << 0
+    tpci.sequence |= ((data >> 3) & 1) << 1
+    tpci.sequence |= ((data >> 4) & 1) << 2
+    tpci.sequence |= ((data >> 5) & 1) << 3
+
+
+def _apci_unpack_bitwise(apci, data):
+    """Apci.unpack() before the lookup table, as a baseline."""
+    if len(data) == 1:
+        data.extend([0])
+    apci.apci_type = 0
+    apci.apci_type |= ((data[1] >> 6) & 1) << 0
+    apci.apci_type |= ((data[1] >> 7) & 1) << 1
+    apci.apci_type |= ((data[0] >> 0) & 1) << 2
+    apci.apci_type |= ((data[0] >> 1) & 1) << 3
+    if apci.apci_type in CEMI_APCI_TYPES.values():
+        apci.apci_data = 0
+        apci.apci_data |= ((data[1] >> 0) & 1) << 0
+        apci.apci_data |= ((data[1] >> 1) & 1) << 1
+        apci.apci_data |= ((data[1] >> 2) & 1) << 2
+        apci.apci_data |= ((data[1] >> 3) & 1) << 3
+        apci.apci_data |= ((data[1] >> 4) & 1) << 4
+        apci.apci_data |= ((data[1] >> 5) & 1) << 5
+    else:
+        apci.apci_type <<= 2
+        apci.apci_type |= ((data[1] >> 4) & 1) << 0
+        apci.apci_type |= ((data[1] >> 5) & 1) << 1
+        if apci.apci_type in CEMI_APCI_TYPES.values():
+            apci.apci_data = 0
+            apci.apci_data |= ((data[1] >> 0) & 1) << 0
+            apci.apci_data |= ((data[1] >> 1) & 1) << 1
+            apci.apci_data |= ((data[1] >> 2) & 1) << 2
+            apci.apci_data |= ((data[1] >> 3) & 1) << 3
+        else:
+            apci.apci_type <<= 4
+            apci.apci_type |= ((data[1] >> 0) & 1) << 0
+            apci.apci_type |= ((data[1] >> 1) & 1) << 1
+            apci.apci_type |= ((data[1] >> 2) & 1) << 2
+            apci.apci_type |= ((data[1] >> 3) & 1) << 3
+
+
+def _decode_bitwise(mix):
+    for data in mix:
+        _tpci_unpack_bitwise(Tpci(), data[0])
+        # The old code extended single byte frames
+        _apci_unpack_bitwise(Apci(), bytearray(data))
+
+
+def _decode_table(mix):
+    for data in mix:
+        Tpci().unpack(data[0])
+        Apci().unpack(bytearray(data))
+
+
+def _timeit(func, arg, number, repeat):
+    """Return the best time of func(arg) in nanoseconds per call."""
+    timer = timeit.Timer(lambda: func(arg))
+    return min(timer.repeat(repeat=repeat, number=number)) / number * 1e9
+
+
+def bench_dispatch(number=100000, repeat=5):
+    """Compare the cost of finding the message class with the lookup
+    table and the former if/elif chain, and the cost of a full
+    parse_message() call per service type."""
+    print('{:<32} {:>10} {:>10} {:>12}'.format('service type', 'table ns', 'chain ns', 'parse us'))
+    for name, message in sample_messages().items():
+        table = _timeit(_table_dispatch, message, number, repeat)
+        if _chain_dispatch(message) is not None:
+            chain = '{:>10.1f}'.format(_timeit(_chain_dispatch, message, number, repeat))
+        else:
+            chain = '{:>10}'.format('-')
+        parse = _timeit(parse_message, message, number // 10, repeat) / 1000
+        print('{:<32} {:>10.1f} {} {:>12.2f}'.format(name, table, chain, parse))
+
+
+def bench_templates(number=100000, repeat=5):
+    """Compare building outgoing frames as KnxMessage
+    objects with patching the preassembled templates."""
+    templates = TunnellingRequestTemplates(1, '1.1.250')
+    destination = KnxMessage.pack_knx_address('1.1.5')
+
+    def message_connect(_):
+        request = KnxTunnellingRequest(communication_channel=1, sequence_count=7,
+                                       knx_source='1.1.250', knx_destination='1.1.5')
+        request.tpci_unnumbered_control_data('CONNECT')
+        return request.get_message()
+
+    def message_ack(_):
+        return KnxTunnellingAck(communication_channel=1, sequence_count=7).get_message()
+
+    frames = collections.OrderedDict([
+        ('T_Connect', (message_connect,
+                       lambda _: templates.tpci_connect(7, destination))),
+        ('TUNNELLING_ACK', (message_ack,
+                            lambda _: pack_tunnelling_ack(1, 7))),
+    ])
+    print('{:<32} {:>12} {:>12}'.format('frame', 'object us', 'template us'))
+    for name, (message, template) in frames.items():
+        assert bytes(message(None)) == template(None)
+        print('{:<32} {:>12.2f} {:>12.2f}'.format(
+            name,
+            _timeit(message, None, number // 10, repeat) / 1000,
+            _timeit(template, None, number, repeat) / 1000))
+
+
+def bench_decode(number=100000, repeat=5):
+    """Compare decoding the TPCI and APCI of TELEGRAM_MIX bit
+    by bit with decoding them with the lookup tables."""
+    mix = telegram_mix()
+    number = max(number // len(mix), 1)
+    bitwise = _timeit(_decode_bitwise, mix, number, repeat) / len(mix)
+    table = _timeit(_decode_table, mix, number, repeat) / len(mix)
+    print('{:<32} {:>12} {:>12}'.format('telegram mix', 'bitwise ns', 'table ns'))
+    print('{:<32} {:>12.1f} {:>12.1f}'.format('TPCI and APCI per telegram', bitwise, table))
+
+
+def bench_batch(number=100000, repeat=5):
+    """Compare decoding stored cEMI L_Data frames one by one with
+    ExtendedDataRequest and all at once with decode_frames()."""
+    if not NUMPY_SUPPORT:
+        print('skipped, NumPy is not installed')
+        return
+    frames = []
+    for tpci_apci, share in TELEGRAM_MIX:
+        npdu_length = max(len(tpci_apci) // 2 - 1, 0)
+        frames.extend([bytes.fromhex('bce0110c0801{:02x}{}'.format(npdu_length, tpci_apci))] * share)
+    frames = frames * max(number // len(frames) // 10, 1)
+
+    def one_by_one(frames):
+        for frame in frames:
+            ExtendedDataRequest(message=MessageReader(frame))
+
+    buffer, starts, lengths = pack_frames(frames)
+    single = _timeit(one_by_one, frames, 1, repeat) / len(frames)
+    batch = _timeit(lambda _: decode_frames(buffer, starts, lengths), None, 1, repeat) / len(frames)
+    print('{:<32} {:>12} {:>12}'.format('{} frames'.format(len(frames)), 'single ns', 'batch ns'))
+    print('{:<32} {:>12.1f} {:>12.1f}'.format('per frame', single, batch))
+
+
+def bench_stream(number=100000, repeat=5):
+    """Cut TP1 frames of the telegram mix out of a serial capture
+    that is read in chunks of 64 bytes, with and without line noise."""
+    frames = []
+    for tpci_apci, share in TELEGRAM_MIX:
+        npci = 0xe0 | max(len(tpci_apci) // 2 - 1, 0)
+        frame = bytearray.fromhex('bc110c0801{:02x}{}'.format(npci, tpci_apci))
+        frame.append(ExtendedDataRequest.checksum(frame) ^ 0xff)
+        frames.extend([bytes(frame)] * share)
+    frames = frames * max(number // len(frames) // 10, 1)
+    clean = b''.join(frames)
+    # A stray byte before every tenth frame forces a resync
+    noisy = b''.join(b'\xbc' + f if i % 10 == 0 else f for i, f in enumerate(frames))
+
+    def parse(capture):
+        parser = Tp1StreamParser()
+        for start in range(0, len(capture), 64):
+            parser.feed(capture[start:start + 64])
+
+    print('{:<32} {:>12} {:>12}'.format('{} frames'.format(len(frames)), 'clean ns', 'noisy ns'))
+    print('{:<32} {:>12.1f} {:>12.1f}'.format(
+        'per frame',
+        _timeit(parse, clean, 1, repeat) / len(frames),
+        _timeit(parse, noisy, 1, repeat) / len(frames)))
+
+
+def bench_throughput(number=100000, repeat=5):
+    """Parse throughput of parse_message() per message type."""
+    print('{:<32} {:>12} {:>12}'.format('message type', 'ns', 'messages/s'))
+    for name, data in sample_messages().items():
+        ns = _timeit(parse_message, data, number, repeat)
+        print('{:<32} {:>12.1f} {:>12.0f}'.format(name, ns, 1e9 / ns))
+
+
+def message_fields(message):
+    """Return all decoded fields of message as plain, JSON
+    serializable values. The raw message itself is left out."""
+    if message is None or isinstance(message, (bool, int, float, str)):
+        return message
+    if isinstance(message, (bytes, bytearray, memoryview)):
+        return bytes(message).hex()
+    if isinstance(message, dict):
+        return collections.OrderedDict((str(k), message_fields(v)) for k, v in message.items())
+    if isinstance(message, (list, tuple)):
+        return [message_fields(v) for v in message]
+    if isinstance(message, KnxHeader):
+        return {k: getattr(message, k) for k in KnxHeader.__slots__}
+    if hasattr(message, '__dict__'):
+        return collections.OrderedDict(
+            (k, message_fields(v)) for k, v in vars(message).items() if k != 'message')
+    return repr(message)
+
+
+def field_snapshots(messages, fuzz_count=10000):
+    """Return the decoded fields of messages, a dict of names to
+    datagrams, and a digest of the fields of the messages parsed
+    from fuzz_datagrams(), which only changes if the decoded output does."""
+    digest = hashlib.sha256()
+    # Broken messages are logged with their tracebacks by the decoders
+    logging.disable(logging.CRITICAL)
+    try:
+        snapshots = collections.OrderedDict(
+            (name, message_fields(parse_message(data))) for name, data in messages.items())
+        for data in fuzz_datagrams(list(messages.values()), fuzz_count):
+            digest.update(json.dumps(message_fields(parse_message(data)),
+                                     sort_keys=True).encode())
+    finally:
+        logging.disable(logging.NOTSET)
+    snapshots['fuzz'] = digest.hexdigest()
+    return snapshots
+
+
+def compare_baseline(path, number=100000, repeat=5):
+    """Record the decoded fields and the parse times of the sample
+    messages in path, or compare them with the ones recorded before."""
+    snapshots = field_snapshots(sample_messages())
+    timings = collections.OrderedDict(
+        (name, _timeit(parse_message, data, number, repeat))
+        for name, data in sample_messages().items())
+    if not os.path.exists(path):
+        with open(path, 'w') as f:
+            json.dump({'fields': snapshots, 'ns': timings}, f, indent=1)
+        print('baseline recorded in {}'.format(path))
+        return True
+    with open(path) as f:
+        baseline = json.load(f, object_pairs_hook=collections.OrderedDict)
+    changed = [name for name in snapshots
+               if json.dumps(snapshots[name]) != json.dumps(baseline['fields'].get(name))]
+    print('{:<32} {:>12} {:>12} {:>8}'.format('message type', 'baseline ns', 'ns', 'speedup'))
+    for name, ns in timings.items():
+        before = baseline['ns'].get(name)
+        print('{:<32} {:>12} {:>12.1f} {:>8}'.format(
+            name,
+            '{:.1f}'.format(before) if before else '-',
+            ns,
+            '{:.2f}x'.format(before / ns) if before else '-'))
+    for name in changed:
+        print('FAIL decoded fields of {} differ from the baseline'.format(name))
+    return not changed
+
+
+BENCHMARKS = collections.OrderedDict([
+    ('dispatch', bench_dispatch),
+    ('decode', bench_decode),
+    ('batch', bench_batch),
+    ('stream', bench_stream),
+    ('throughput', bench_throughput),
+    ('templates', bench_templates),
+])
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Micro-benchmarks for the KNXnet/IP message parsers')
+    parser.add_argument('benchmarks', nargs='*', metavar='benchmark',
+                        help='benchmarks to run, all if none is given: ' + ', '.join(BENCHMARKS))
+    parser.add_argument('-n', '--number', type=int, default=100000,
+                        help='calls per measurement')
+    parser.add_argument('-r', '--repeat', type=int, default=5,
+                        help='measurements per benchmark, the best one is reported')
+    parser.add_argument('--baseline', metavar='FILE',
+                        help='record decoded fields and parse times in FILE, or '
+                             'compare them with FILE if it exists')
+    args = parser.parse_args()
+    unknown = [b for b in args.benchmarks if b not in BENCHMARKS]
+    if unknown:
+        parser.error('unknown benchmark: {}'.format(', '.join(unknown)))
+    logging.basicConfig(level=logging.WARNING)
+    ok = True
+    for name in args.benchmarks or BENCHMARKS.keys():
+        print('# {}'.format(name))
+        if BENCHMARKS[name](number=args.number, repeat=args.repeat) is False:
+            ok = False
+    if args.baseline:
+        print('# baseline')
+        ok = compare_baseline(args.baseline, number=args.number, repeat=args.repeat) and ok
+    return 0 if ok else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,9 +1,9 @@
 import collections
 import struct
 import logging
-import io
 
 from .tp import ExtendedDataRequest
+from .reader import MessageReader, get_struct, unpack_stream
 
 LOGGER = logging.getLogger(__name__)
 
@@ -35,17 +35,18 @@ class CemiFrame(object):
     @staticmethod
     def _unpack_stream(fmt, stream):
         try:
-            buf = stream.read(struct.calcsize(fmt))
+            compiled = get_struct(fmt)
+            buf = stream.read(compiled.size)
             if not buf:
                 # In case we already reached EOF
                 # just return an empty byte string.
                 return b''
-            if len(buf) != struct.calcsize(fmt):
+            if len(buf) != compiled.size:
                 # If read() returned some bytes, but
                 # not as much as required by fmt,
                 # unpack only the available bytes.
-                fmt = '!{}s'.format(len(buf))
-            return struct.unpack(fmt, buf)[0]
+                compiled = get_struct('!{}s'.format(len(buf)))
+            return compiled.unpack(buf)[0]
         except struct.error as e:
             LOGGER.exception(e)
 
@@ -59,16 +60,20 @@ class CemiFrame(object):
         return cemi
 
     def unpack(self, message):
-        self.message_code = self._unpack_stream('!B', message)
-        self.additional_information_len = self._unpack_stream('!B', message)
+        self.message_code, self.additional_information_len = unpack_stream('!BB', message)
 
     def unpack_extended_data_request(self, message):
         """This function provides message parsing that
         is mostly compatible with the old API."""
         self.unpack(message)
+        self.unpack_service_information(message)
+
+    def unpack_service_information(self, message):
+        """Parse the additional information and the data request that follow the
+        message code and additional information length, which must already be set."""
         if self.message_code == 0x2b and \
                 self.additional_information_len > 0: # L_Busmon.ind
-            additional_information = io.BytesIO(self._unpack_stream('!{}s'.format(
+            additional_information = MessageReader(self._unpack_stream('!{}s'.format(
                 self.additional_information_len), message))
             self.additional_information = {}
             self.additional_information['type1'] = self._unpack_stream('!B', additional_information)
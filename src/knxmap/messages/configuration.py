@@ -1,10 +1,10 @@
 """Device Management Services"""
-import io
 import struct
 import logging
 
 from knxmap import KNX_MESSAGE_TYPES
 from .main import KnxMessage
+from .reader import MessageReader
 
 LOGGER = logging.getLogger(__name__)
 
@@ -16,7 +16,7 @@ class KnxDeviceConfigurationRequest(KnxMessage):
                  sequence_count=0, message_code=0xfc, object_type=0, object_instance=1,
                  property=0, num_elements=1, start_index=1):
         super(KnxDeviceConfigurationRequest, self).__init__()
-        self.header['service_type'] = KNX_MESSAGE_TYPES.get('DEVICE_CONFIGURATION_REQUEST')
+        self.header.service_type = KNX_MESSAGE_TYPES.get('DEVICE_CONFIGURATION_REQUEST')
         self.communication_channel = communication_channel
         self.sequence_count = sequence_count
         self.message_code = message_code
@@ -57,16 +57,16 @@ class KnxDeviceConfigurationRequest(KnxMessage):
 
     def _unpack_knx_body(self, message):
         try:
-            message = io.BytesIO(message)
-            self.structure_length = self._unpack_stream('!B', message)
-            self.communication_channel = self._unpack_stream('!B', message)
-            self.sequence_count = self._unpack_stream('!B', message)
-            self._unpack_stream('!B', message) # reserved
-            self.message_code = self._unpack_stream('!B', message)
-            self.object_type = self._unpack_stream('!H', message)
-            self.object_instance = self._unpack_stream('!B', message)
-            self.property = self._unpack_stream('!B', message)
-            trailer = self._unpack_stream('!H', message)
+            message = MessageReader(message)
+            self.structure_length, \
+            self.communication_channel, \
+            self.sequence_count, \
+            _, \
+            self.message_code, \
+            self.object_type, \
+            self.object_instance, \
+            self.property, \
+            trailer = message.unpack('!BBBBBHBBH')
             self.num_elements = 0
             self.num_elements |= ((trailer >> 12) & 1) << 0
             self.num_elements |= ((trailer >> 13) & 1) << 1
@@ -97,7 +97,7 @@ class KnxDeviceConfigurationAck(KnxMessage):
             self.message = message
             self.unpack_knx_message(message)
         else:
-            self.header['service_type'] = KNX_MESSAGE_TYPES.get('DEVICE_CONFIGURATION_RESPONSE')
+            self.header.service_type = KNX_MESSAGE_TYPES.get('DEVICE_CONFIGURATION_RESPONSE')
             self.communication_channel = communication_channel
             self.sequence_count = sequence_count
             self.pack_knx_message()
@@ -111,10 +111,10 @@ class KnxDeviceConfigurationAck(KnxMessage):
 
     def _unpack_knx_body(self, message):
         try:
-            message = io.BytesIO(message)
-            self.structure_length = self._unpack_stream('!B', message)
-            self.communication_channel = self._unpack_stream('!B', message)
-            self.sequence_counter = self._unpack_stream('!B', message)
-            self.status = self._unpack_stream('!B', message)
+            message = MessageReader(message)
+            self.structure_length, \
+            self.communication_channel, \
+            self.sequence_counter, \
+            self.status = message.unpack('!BBBB')
         except Exception as e:
             LOGGER.exception(e)
@@ -1,10 +1,10 @@
 """KNXnet/IP Core Services"""
-import io
 import struct
 import logging
 
 from knxmap import KNX_MESSAGE_TYPES, _LAYER_TYPES, KNX_STATUS_CODES
 from .main import KnxMessage
+from .reader import MessageReader
 
 LOGGER = logging.getLogger(__name__)
 
@@ -12,7 +12,7 @@ LOGGER = logging.getLogger(__name__)
 class KnxSearchRequest(KnxMessage):
     def __init__(self, message=None, sockname=None):
         super(KnxSearchRequest, self).__init__()
-        self.header['service_type'] = KNX_MESSAGE_TYPES.get('SEARCH_REQUEST')
+        self.header.service_type = KNX_MESSAGE_TYPES.get('SEARCH_REQUEST')
         if message:
             self.message = message
             self.unpack_knx_message(message)
@@ -30,7 +30,7 @@ class KnxSearchRequest(KnxMessage):
 
     def _unpack_knx_body(self, message):
         try:
-            message = io.BytesIO(message)
+            message = MessageReader(message)
             self.hpai = self._unpack_hpai(message)
         except Exception as e:
             LOGGER.exception(e)
@@ -39,7 +39,7 @@ class KnxSearchRequest(KnxMessage):
 class KnxSearchResponse(KnxMessage):
     def __init__(self, message=None):
         super(KnxSearchResponse, self).__init__()
-        self.header['service_type'] = KNX_MESSAGE_TYPES.get('SEARCH_RESPONSE')
+        self.header.service_type = KNX_MESSAGE_TYPES.get('SEARCH_RESPONSE')
         if message:
             self.message = message
             self.unpack_knx_message(message)
@@ -51,7 +51,7 @@ class KnxSearchResponse(KnxMessage):
 
     def _unpack_knx_body(self, message):
         try:
-            message = io.BytesIO(message)
+            message = MessageReader(message)
             self.hpai = self._unpack_hpai(message)
             self.dib_dev_info = self._unpack_dib_dev_info(message)
             self.dib_supp_sv_families = self._unpack_dib_supp_sv_families(message)
@@ -62,7 +62,7 @@ class KnxSearchResponse(KnxMessage):
 class KnxDescriptionRequest(KnxMessage):
     def __init__(self, message=None, sockname=None):
         super(KnxDescriptionRequest, self).__init__()
-        self.header['service_type'] = KNX_MESSAGE_TYPES.get('DESCRIPTION_REQUEST')
+        self.header.service_type = KNX_MESSAGE_TYPES.get('DESCRIPTION_REQUEST')
         if message:
             self.message = message
             self.unpack_knx_message(message)
@@ -80,7 +80,7 @@ class KnxDescriptionRequest(KnxMessage):
 
     def _unpack_knx_body(self, message):
         try:
-            message = io.BytesIO(message)
+            message = MessageReader(message)
             self.hpai = self._unpack_hpai(message)
         except Exception as e:
             LOGGER.exception(e)
@@ -89,7 +89,7 @@ class KnxDescriptionRequest(KnxMessage):
 class KnxDescriptionResponse(KnxMessage):
     def __init__(self, message=None):
         super(KnxDescriptionResponse, self).__init__()
-        self.header['service_type'] = KNX_MESSAGE_TYPES.get('DESCRIPTION_RESPONSE')
+        self.header.service_type = KNX_MESSAGE_TYPES.get('DESCRIPTION_RESPONSE')
         if message:
             self.message = message
             self.unpack_knx_message(message)
@@ -101,7 +101,7 @@ class KnxDescriptionResponse(KnxMessage):
 
     def _unpack_knx_body(self, message):
         try:
-            message = io.BytesIO(message)
+            message = MessageReader(message)
             self.dib_dev_info = self._unpack_dib_dev_info(message)
             self.dib_supp_sv_families = self._unpack_dib_supp_sv_families(message)
         except Exception as e:
@@ -112,7 +112,7 @@ class KnxConnectRequest(KnxMessage):
     def __init__(self, message=None, sockname=None, layer_type='TUNNEL_LINKLAYER',
                  connection_type=0x04):
         super(KnxConnectRequest, self).__init__()
-        self.header['service_type'] = KNX_MESSAGE_TYPES.get('CONNECT_REQUEST')
+        self.header.service_type = KNX_MESSAGE_TYPES.get('CONNECT_REQUEST')
         self.connection_type = connection_type
         self.layer_type = _LAYER_TYPES.get(layer_type)
         if message:
@@ -145,17 +145,17 @@ class KnxConnectRequest(KnxMessage):
 
     def _unpack_knx_body(self, message):
         try:
-            message = io.BytesIO(message)
+            message = MessageReader(message)
             # Discovery endpoint
             self.hpai = self._unpack_hpai(message)
             # Data endpoint
             self.data_endpoint = self._unpack_hpai(message)
             # Connection request information
             self.connection_request_information = {}
-            self.connection_request_information['structure_length'] = self._unpack_stream('!B', message)
-            self.connection_request_information['connection_type'] = self._unpack_stream('!B', message)
-            self.connection_request_information['knx_layer'] = self._unpack_stream('!B', message)
-            self.connection_request_information['reserved'] = self._unpack_stream('!B', message)
+            self.connection_request_information['structure_length'], \
+            self.connection_request_information['connection_type'], \
+            self.connection_request_information['knx_layer'], \
+            self.connection_request_information['reserved'] = message.unpack('!BBBB')
         except Exception as e:
             LOGGER.exception(e)
 
@@ -163,7 +163,7 @@ class KnxConnectRequest(KnxMessage):
 class KnxConnectResponse(KnxMessage):
     def __init__(self, message=None, communication_channel=None, status=0):
         super(KnxConnectResponse, self).__init__()
-        self.header['service_type'] = KNX_MESSAGE_TYPES.get('CONNECT_RESPONSE')
+        self.header.service_type = KNX_MESSAGE_TYPES.get('CONNECT_RESPONSE')
         self.communication_channel = communication_channel
         self.status = status
         self.ERROR = None
@@ -179,9 +179,8 @@ class KnxConnectResponse(KnxMessage):
 
     def _unpack_knx_body(self, message):
         try:
-            message = io.BytesIO(message)
-            self.communication_channel = self._unpack_stream('!B', message)
-            self.status = self._unpack_stream('!B', message)
+            message = MessageReader(message)
+            self.communication_channel, self.status = message.unpack('!BB')
 
             if self.status != 0x00:
                 # TODO: implement some kind of retries and waiting periods
@@ -192,8 +191,8 @@ class KnxConnectResponse(KnxMessage):
             self.hpai = self._unpack_hpai(message)
             # Connection response data block
             self.data_block = {}
-            self.data_block['structure_length'] = self._unpack_stream('!B', message)
-            self.data_block['connection_type'] = self._unpack_stream('!B', message)
+            self.data_block['structure_length'], \
+            self.data_block['connection_type'] = message.unpack('!BB')
             if self.data_block['connection_type'] == 0x04:
                 self.data_block['knx_address'] = super().parse_knx_address(self._unpack_stream('!H', message))
         except Exception as e:
@@ -204,7 +203,7 @@ class KnxConnectionStateRequest(KnxMessage):
     def __init__(self, message=None, sockname=None, communication_channel=None,
                  status=0):
         super(KnxConnectionStateRequest, self).__init__()
-        self.header['service_type'] = KNX_MESSAGE_TYPES.get('CONNECTIONSTATE_REQUEST')
+        self.header.service_type = KNX_MESSAGE_TYPES.get('CONNECTIONSTATE_REQUEST')
         self.communication_channel = communication_channel
         self.status = status
         if message:
@@ -226,9 +225,8 @@ class KnxConnectionStateRequest(KnxMessage):
 
     def _unpack_knx_body(self, message):
         try:
-            message = io.BytesIO(message)
-            self.communication_channel = self._unpack_stream('!B', message)
-            self.reserved = self._unpack_stream('!B', message)
+            message = MessageReader(message)
+            self.communication_channel, self.reserved = message.unpack('!BB')
             self.hpai = self._unpack_hpai(message)
         except Exception as e:
             LOGGER.exception(e)
@@ -237,7 +235,7 @@ class KnxConnectionStateRequest(KnxMessage):
 class KnxConnectionStateResponse(KnxMessage):
     def __init__(self, message=None, communication_channel=None):
         super(KnxConnectionStateResponse, self).__init__()
-        self.header['service_type'] = KNX_MESSAGE_TYPES.get('CONNECTIONSTATE_RESPONSE')
+        self.header.service_type = KNX_MESSAGE_TYPES.get('CONNECTIONSTATE_RESPONSE')
         self.communication_channel = communication_channel
         self.status = 0
         if message:
@@ -254,9 +252,8 @@ class KnxConnectionStateResponse(KnxMessage):
 
     def _unpack_knx_body(self, message):
         try:
-            message = io.BytesIO(message)
-            self.communication_channel = self._unpack_stream('!B', message)
-            self.status = self._unpack_stream('!B', message)
+            message = MessageReader(message)
+            self.communication_channel, self.status = message.unpack('!BB')
         except Exception as e:
             LOGGER.exception(e)
 
@@ -265,7 +262,7 @@ class KnxDisconnectRequest(KnxMessage):
     def __init__(self, message=None, sockname=None, communication_channel=None,
                  status=0):
         super(KnxDisconnectRequest, self).__init__()
-        self.header['service_type'] = KNX_MESSAGE_TYPES.get('DISCONNECT_REQUEST')
+        self.header.service_type = KNX_MESSAGE_TYPES.get('DISCONNECT_REQUEST')
         self.communication_channel = communication_channel or 0
         self.status = 0
         if message:
@@ -287,9 +284,8 @@ class KnxDisconnectRequest(KnxMessage):
 
     def _unpack_knx_body(self, message):
         try:
-            message = io.BytesIO(message)
-            self.communication_channel = self._unpack_stream('!B', message)
-            self.reserved = self._unpack_stream('!B', message)
+            message = MessageReader(message)
+            self.communication_channel, self.reserved = message.unpack('!BB')
             self.hpai = self._unpack_hpai(message)
         except Exception as e:
             LOGGER.exception(e)
@@ -298,7 +294,7 @@ class KnxDisconnectRequest(KnxMessage):
 class KnxDisconnectResponse(KnxMessage):
     def __init__(self, message=None, communication_channel=None, status=0):
         super(KnxDisconnectResponse, self).__init__()
-        self.header['service_type'] = KNX_MESSAGE_TYPES.get('DISCONNECT_RESPONSE')
+        self.header.service_type = KNX_MESSAGE_TYPES.get('DISCONNECT_RESPONSE')
         self.communication_channel = communication_channel
         self.status = status
         if message:
@@ -314,8 +310,7 @@ class KnxDisconnectResponse(KnxMessage):
 
     def _unpack_knx_body(self, message):
         try:
-            message = io.BytesIO(message)
-            self.communication_channel = self._unpack_stream('!B', message)
-            self.status = self._unpack_stream('!B', message)
+            message = MessageReader(message)
+            self.communication_channel, self.status = message.unpack('!BB')
         except Exception as e:
             LOGGER.exception(e)
@@ -3,21 +3,62 @@ import logging
 import socket
 import struct
 
+import knxmap.address
 from knxmap import KNX_CONSTANTS
 #from knxmap.messages import CemiFrame
 from .cemi import CemiFrame
+from .reader import get_struct, unpack_stream
 
 LOGGER = logging.getLogger(__name__)
 
+_HEADER = get_struct('!BBHH')
 
-class KnxMessage(object):
-    header = {
-        'header_length': KNX_CONSTANTS['HEADER_SIZE_10'],
-        'protocol_version': KNX_CONSTANTS['KNXNETIP_VERSION_10'],
-        'service_type': None,
-        'total_length': 0}
 
+class KnxHeader(object):
+    """The KNXnet/IP header of a single message.
+
+    Header format:
+     +--------+--------+--------+--------+--------+--------+
+     | Header |Protocol|  Service Type   |  Total Length   |
+     | Length |Version |                 |                 |
+     +--------+--------+--------+--------+--------+--------+
+       1 byte   1 byte       2 bytes           2 bytes
+    """
+    __slots__ = ('header_length', 'protocol_version', 'service_type', 'total_length')
+
+    def __init__(self, service_type=None, total_length=0,
+                 header_length=KNX_CONSTANTS['HEADER_SIZE_10'],
+                 protocol_version=KNX_CONSTANTS['KNXNETIP_VERSION_10']):
+        self.header_length = header_length
+        self.protocol_version = protocol_version
+        self.service_type = service_type
+        self.total_length = total_length
+
+    def __repr__(self):
+        return '%s header_length: %s, protocol_version: %s, service_type: %s, ' \
+               'total_length: %s' % (
+                   self.__class__.__name__,
+                   self.header_length,
+                   self.protocol_version,
+                   self.service_type,
+                   self.total_length)
+
+    def pack(self):
+        return bytearray(_HEADER.pack(self.header_length,
+                                      self.protocol_version,
+                                      self.service_type,
+                                      self.total_length))
+
+    def unpack(self, message):
+        self.header_length, \
+        self.protocol_version, \
+        self.service_type, \
+        self.total_length = _HEADER.unpack_from(message)
+
+
+class KnxMessage(object):
     def __init__(self):
+        self.header = KnxHeader()
         self.body = collections.OrderedDict()
         self.message = None
         self.source = None
@@ -37,53 +78,11 @@ class KnxMessage(object):
             _repr += ', knx_destination: %s' % KnxMessage.parse_knx_address(self.knx_destination)
         return _repr
 
-    @staticmethod
-    def parse_knx_address(address):
-        """Parse physical/individual KNX address.
-
-        Address structure (A=Area, L=Line, B=Bus device):
-        --------------------
-        |AAAA|LLLL|BBBBBBBB|
-        --------------------
-        4 Bit|4 Bit| 8 Bit
-
-        parse_knx_address(99999)
-        '8.6.159'
-        """
-        assert isinstance(address, int), 'Address should be an integer'
-        return '{}.{}.{}'.format((address >> 12) & 0xf, (address >> 8) & 0xf, address & 0xff)
-
-    @staticmethod
-    def pack_knx_address(address):
-        """Pack physical/individual KNX address.
-
-        pack_knx_address('15.15.255')
-        65535
-        """
-        assert isinstance(address, str), 'Address should be a string'
-        parts = address.split('.')
-        return (int(parts[0]) << 12) + (int(parts[1]) << 8) + (int(parts[2]))
-
-    @staticmethod
-    def parse_knx_group_address(address):
-        """Parse KNX group address.
-
-        parse_knx_group_address(12345)
-        '6/0/57'
-        """
-        assert isinstance(address, int), 'Address should be an integer'
-        return '{}/{}/{}'.format((address >> 11) & 0x1f, (address >> 8) & 0x7, address & 0xff)
-
-    @staticmethod
-    def pack_knx_group_address(address):
-        """Pack KNX group address.
-
-        pack_knx_group_address('6/0/57')
-        12345
-        """
-        assert isinstance(address, str), 'Address should be a string'
-        parts = address.split('/')
-        return (int(parts[0]) << 11) + (int(parts[1]) << 8) + (int(parts[2]))
+    # See knxmap.address
+    parse_knx_address = staticmethod(knxmap.address.parse_knx_address)
+    pack_knx_address = staticmethod(knxmap.address.pack_knx_address)
+    parse_knx_group_address = staticmethod(knxmap.address.parse_knx_group_address)
+    pack_knx_group_address = staticmethod(knxmap.address.pack_knx_group_address)
 
     @staticmethod
     def parse_knx_device_serial(address):
@@ -153,7 +152,7 @@ class KnxMessage(object):
             message_body = self._pack_knx_body()
         else:
             message_body = self.body
-        self.header['total_length'] = 6 + len(message_body)  # header size is always 6
+        self.header.total_length = 6 + len(message_body)  # header size is always 6
         self.message = self._pack_knx_header()
         self.message.extend(message_body)
 
@@ -163,22 +162,15 @@ class KnxMessage(object):
 
     def _pack_knx_header(self):
         try:
-            return bytearray(struct.pack('!BBHH',
-                               self.header.get('header_length'),
-                               self.header.get('protocol_version'),
-                               self.header.get('service_type'),
-                               self.header.get('total_length')))
+            return self.header.pack()
         except struct.error as e:
             LOGGER.exception(e)
 
     def _unpack_knx_header(self, message):
-        """Set self.header dict and return message body"""
+        """Set self.header and return a memoryview of the message body"""
         try:
-            self.header['header_length'], \
-            self.header['protocol_version'], \
-            self.header['service_type'], \
-            self.header['total_length'] = struct.unpack('!BBHH', message[:6])
-            return message[6:]
+            self.header.unpack(message)
+            return memoryview(message)[6:]
         except struct.error as e:
             LOGGER.exception(e)
 
@@ -193,8 +185,7 @@ class KnxMessage(object):
     @staticmethod
     def _unpack_stream(fmt, stream):
         try:
-            buf = stream.read(struct.calcsize(fmt))
-            return struct.unpack(fmt, buf)[0]
+            return unpack_stream(fmt, stream)[0]
         except struct.error as e:
             LOGGER.exception(e)
 
@@ -218,36 +209,39 @@ class KnxMessage(object):
         return hpai
 
     def _unpack_hpai(self, message):
+        structure_length, protocol_code, ip_address, port = unpack_stream('!BB4sH', message)
         hpai = {}
-        hpai['structure_length'] = self._unpack_stream('!B', message)
-        hpai['protocol_code'] = self._unpack_stream('!B', message)
-        hpai['ip_address'] = socket.inet_ntoa(message.read(4))
-        hpai['port'] = self._unpack_stream('!H', message)
+        hpai['structure_length'] = structure_length
+        hpai['protocol_code'] = protocol_code
+        hpai['ip_address'] = socket.inet_ntoa(ip_address)
+        hpai['port'] = port
         return hpai
 
     def _unpack_dib_dev_info(self, message):
+        structure_length, description_type, knx_medium, device_status, knx_address, \
+            project_install_identifier, knx_device_serial, knx_dev_multicast_address, \
+            knx_mac_address, device_friendly_name = unpack_stream('!BBBBHH6s4s6s30s', message)
         dib_dev_info = {}
-        dib_dev_info['structure_length'] = self._unpack_stream('!B', message)
-        dib_dev_info['description_type'] = self._unpack_stream('!B', message)
-        dib_dev_info['knx_medium'] = self._unpack_stream('!B', message)
-        dib_dev_info['device_status'] = CemiFrame.unpack_cemi_runstate(self._unpack_stream('!B', message))
-        dib_dev_info['knx_address'] = self.parse_knx_address(self._unpack_stream('!H', message))
-        dib_dev_info['project_install_identifier'] = self._unpack_stream('!H', message)
-        dib_dev_info['knx_device_serial'] = self.parse_knx_device_serial(
-            self._unpack_stream('!6s', message))
-        dib_dev_info['knx_dev_multicast_address'] = socket.inet_ntoa(message.read(4))
-        dib_dev_info['knx_mac_address'] = self.parse_mac_address(self._unpack_stream('!6s', message))
-        dib_dev_info['device_friendly_name'] = self._unpack_stream('!30s', message)
+        dib_dev_info['structure_length'] = structure_length
+        dib_dev_info['description_type'] = description_type
+        dib_dev_info['knx_medium'] = knx_medium
+        dib_dev_info['device_status'] = CemiFrame.unpack_cemi_runstate(device_status)
+        dib_dev_info['knx_address'] = self.parse_knx_address(knx_address)
+        dib_dev_info['project_install_identifier'] = project_install_identifier
+        dib_dev_info['knx_device_serial'] = self.parse_knx_device_serial(knx_device_serial)
+        dib_dev_info['knx_dev_multicast_address'] = socket.inet_ntoa(knx_dev_multicast_address)
+        dib_dev_info['knx_mac_address'] = self.parse_mac_address(knx_mac_address)
+        dib_dev_info['device_friendly_name'] = device_friendly_name
         return dib_dev_info
 
     def _unpack_dib_supp_sv_families(self, message):
         dib_supp_sv_families = collections.OrderedDict()
-        dib_supp_sv_families['structure_length'] = self._unpack_stream('!B', message)
-        dib_supp_sv_families['description_type'] = self._unpack_stream('!B', message)
+        dib_supp_sv_families['structure_length'], \
+        dib_supp_sv_families['description_type'] = unpack_stream('!BB', message)
         dib_supp_sv_families['families'] = {}
-        for i in range(int((dib_supp_sv_families['structure_length'] - 2) / 2)):
-            service_id = self._unpack_stream('!B', message)
-            version = self._unpack_stream('!B', message)
+        count = max(int((dib_supp_sv_families['structure_length'] - 2) / 2), 0)
+        families = unpack_stream('!{}B'.format(count * 2), message)
+        for service_id, version in zip(families[0::2], families[1::2]):
             dib_supp_sv_families['families'][service_id] = {}
             dib_supp_sv_families['families'][service_id]['version'] = version
         return dib_supp_sv_families
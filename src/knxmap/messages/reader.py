@@ -0,0 +1,83 @@
+"""Zero-copy decoding of binary messages."""
+import struct
+
+__all__ = ['MessageReader', 'get_struct', 'unpack_stream']
+
+_STRUCTS = {}
+
+
+def get_struct(fmt):
+    """Return a precompiled struct.Struct for fmt. The
+    compiled formats are cached for the lifetime of the process."""
+    try:
+        return _STRUCTS[fmt]
+    except KeyError:
+        compiled = _STRUCTS[fmt] = struct.Struct(fmt)
+        return compiled
+
+
+def unpack_stream(fmt, stream):
+    """Unpack all fields of fmt from the current position of stream, which
+    can either be a MessageReader or any file-like object (e.g. io.BytesIO)."""
+    if isinstance(stream, MessageReader):
+        return stream.unpack(fmt)
+    compiled = get_struct(fmt)
+    return compiled.unpack(stream.read(compiled.size))
+
+
+class MessageReader(object):
+    """A file-like reader over a memoryview of a message.
+
+    In contrast to io.BytesIO the message is not copied: fields are
+    decoded with unpack_from() of precompiled struct.Struct objects
+    directly from the underlying buffer, and only read() returns a
+    copy of the requested bytes. A reader can be passed wherever the
+    parsers expect a stream."""
+    __slots__ = ('buffer', 'offset')
+
+    def __init__(self, message, offset=0):
+        if not isinstance(message, memoryview):
+            message = memoryview(message)
+        self.buffer = message
+        self.offset = offset
+
+    def __len__(self):
+        """The number of bytes that have not been read yet."""
+        return max(len(self.buffer) - self.offset, 0)
+
+    def __repr__(self):
+        return '%s offset: %s, remaining: %s' % (
+            self.__class__.__name__,
+            self.offset,
+            len(self))
+
+    def unpack(self, fmt):
+        """Unpack all fields of fmt at the current offset and advance
+        past them. Raises struct.error if the message is too short."""
+        compiled = get_struct(fmt)
+        values = compiled.unpack_from(self.buffer, self.offset)
+        self.offset += compiled.size
+        return values
+
+    def read(self, size=-1):
+        """Return the next size bytes, or all remaining bytes if size
+        is negative. Like io.BytesIO.read(), less bytes are returned
+        if the end of the message is reached."""
+        end = len(self.buffer)
+        if size is not None and size >= 0:
+            end = min(self.offset + size, end)
+        data = self.buffer[self.offset:end].tobytes()
+        self.offset = max(end, self.offset)
+        return data
+
+    def view(self, size=-1):
+        """Like read(), but return a memoryview instead of a copy."""
+        end = len(self.buffer)
+        if size is not None and size >= 0:
+            end = min(self.offset + size, end)
+        data = self.buffer[self.offset:end]
+        self.offset = max(end, self.offset)
+        return data
+
+    def skip(self, size):
+        self.offset += size
@@ -1,10 +1,10 @@
 """Remote Diagnostics and Configuration"""
-import io
 import struct
 import logging
 
 from knxmap import KNX_MESSAGE_TYPES, _LAYER_TYPES, KNX_STATUS_CODES
 from .main import KnxMessage
+from .reader import MessageReader
 
 LOGGER = logging.getLogger(__name__)
 
@@ -16,7 +16,7 @@ class KnxRemoteDiagnosticRequest(KnxMessage):
             self.message = message
             self.unpack_knx_message(message)
         else:
-            self.header['service_type'] = KNX_MESSAGE_TYPES.get('REMOTE_DIAGNOSTIC_REQUEST')
+            self.header.service_type = KNX_MESSAGE_TYPES.get('REMOTE_DIAGNOSTIC_REQUEST')
             try:
                 self.source, self.port = sockname
                 self.pack_knx_message()
@@ -47,7 +47,7 @@ class KnxRemoteDiagnosticRequest(KnxMessage):
 
     def _unpack_knx_body(self, message):
         try:
-            message = io.BytesIO(message)
+            message = MessageReader(message)
             self.body = self._unpack_hpai(message)
         except Exception as e:
             LOGGER.exception(e)
@@ -60,7 +60,7 @@ class KnxRemoteDiagnosticResponse(KnxMessage):
             self.message = message
             self.unpack_knx_message(message)
         else:
-            self.header['service_type'] = KNX_MESSAGE_TYPES.get('REMOTE_DIAGNOSTIC_RESPONSE')
+            self.header.service_type = KNX_MESSAGE_TYPES.get('REMOTE_DIAGNOSTIC_RESPONSE')
             self.pack_knx_message()
 
     def _pack_knx_body(self):
@@ -68,7 +68,7 @@ class KnxRemoteDiagnosticResponse(KnxMessage):
 
     def _unpack_knx_body(self, message):
         try:
-            message = io.BytesIO(message)
+            message = MessageReader(message)
             self.body = self._unpack_hpai(message)
             self.dib_dev_info = self._unpack_dib_dev_info(message)
             self.dib_supp_sv_families = self._unpack_dib_supp_sv_families(message)
@@ -1,10 +1,10 @@
 """Routing Services"""
-import io
 import struct
 import logging
 
 from knxmap import KNX_MESSAGE_TYPES
 from .main import KnxMessage
+from .reader import MessageReader
 from .cemi import CemiFrame
 
 LOGGER = logging.getLogger(__name__)
@@ -17,7 +17,7 @@ class KnxRoutingIndication(KnxMessage):
         self.cemi = CemiFrame()
         self.message_code = message_code
         self.additional_info_len = 0
-        self.header['service_type'] = KNX_MESSAGE_TYPES.get('ROUTING_INDICATION')
+        self.header.service_type = KNX_MESSAGE_TYPES.get('ROUTING_INDICATION')
         if knx_source:
             self.set_knx_source(knx_source)
         if knx_destination:
@@ -34,10 +34,10 @@ class KnxRoutingIndication(KnxMessage):
 
     def _unpack_knx_body(self, message):
         try:
-            message = io.BytesIO(message)
-            self.message_code = self._unpack_stream('!B', message)
-            self.additional_info_len = self._unpack_stream('!B', message)
-            #self.cemi = self._unpack_cemi(message)
+            message = MessageReader(message)
+            self.cemi.unpack_extended_data_request(message)
+            self.message_code = self.cemi.message_code
+            self.additional_info_len = self.cemi.additional_information_len
         except Exception as e:
             LOGGER.exception(e)
 
@@ -45,7 +45,7 @@ class KnxRoutingIndication(KnxMessage):
 class KnxRoutingLostMessage(KnxMessage):
     def __init__(self, message=None):
         super(KnxRoutingLostMessage, self).__init__()
-        self.header['service_tye'] = KNX_MESSAGE_TYPES.get('ROUTING_LOST_MESSAGE')
+        self.header.service_type = KNX_MESSAGE_TYPES.get('ROUTING_LOST_MESSAGE')
         self.structure_length = 4
         self.device_state = None
         self.lost_messages = 0
@@ -63,10 +63,10 @@ class KnxRoutingLostMessage(KnxMessage):
 
     def _unpack_knx_body(self, message):
         try:
-            message = io.BytesIO(message)
-            self.structure_length = self._unpack_stream('!B', message)
-            self.device_state = self._unpack_stream('!B', message)
-            self.lost_messages = self._unpack_stream('!H', message)
+            message = MessageReader(message)
+            self.structure_length, \
+            self.device_state, \
+            self.lost_messages = message.unpack('!BBH')
         except Exception as e:
             LOGGER.exception(e)
 
@@ -74,7 +74,7 @@ class KnxRoutingLostMessage(KnxMessage):
 class KnxRoutingBusy(KnxMessage):
     def __init__(self, message=None):
         super(KnxRoutingBusy, self).__init__()
-        self.header['service_type'] = KNX_MESSAGE_TYPES.get('ROUTING_BUSY')
+        self.header.service_type = KNX_MESSAGE_TYPES.get('ROUTING_BUSY')
         self.structure_length = 4
         self.device_state = None
         self.busy_wait_time = 0
@@ -94,10 +94,10 @@ class KnxRoutingBusy(KnxMessage):
 
     def _unpack_knx_body(self, message):
         try:
-            message = io.BytesIO(message)
-            self.structure_length = self._unpack_stream('!B', message)
-            self.device_state = self._unpack_stream('!B', message)
-            self.busy_wait_time = self._unpack_stream('!H', message)
-            self.busy_control_field = self._unpack_stream('!H', message)
+            message = MessageReader(message)
+            self.structure_length, \
+            self.device_state, \
+            self.busy_wait_time, \
+            self.busy_control_field = message.unpack('!BBHH')
         except Exception as e:
             LOGGER.exception(e)
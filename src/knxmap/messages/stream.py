@@ -0,0 +1,223 @@
+"""Incremental frame parsers for non-IP byte streams.
+
+DataRequest and KnxEmi1Frame decode a single message that has
+already been cut out of the stream. The parsers in this module do the
+cutting: they are fed arbitrary chunks, as they are read from a serial
+TP1 interface or a USB HID device, and return every complete frame:
+
+    parser = Tp1StreamParser()
+    for chunk in iter(lambda: serial.read(64), b''):
+        for frame in parser.feed(chunk):
+            request = DataRequest(message=MessageReader(frame[:-1]))
+
+Layout of TP1 standard and extended frames:
+
+    standard  control field, source (2 bytes), destination (2 bytes),
+              NPCI (bits 0-3 are the length L), TPDU (L + 1 bytes), checksum
+    extended  control field, extended control field, source (2 bytes),
+              destination (2 bytes), length L, TPDU (L + 1 bytes), checksum
+
+The checksum is chosen so that the XOR of all bytes of a frame, including
+the checksum, is 0xff. Bytes that do not start a frame with a valid
+checksum are skipped one by one until the parser is in sync again.
+Neither parser ever buffers more than max_buffer bytes plus one frame."""
+import logging
+
+from .tp import DataRequest
+
+__all__ = ['Tp1StreamParser', 'UsbHidStreamParser', 'TP1_ACKNOWLEDGEMENTS']
+
+LOGGER = logging.getLogger(__name__)
+
+# Single byte acknowledgement frames sent by the receiver of a frame
+TP1_ACKNOWLEDGEMENTS = {
+    0xcc: 'ACK',
+    0x0c: 'NAK',
+    0xc0: 'BUSY',
+    0x00: 'NAK_BUSY'}
+
+# Bits of the control field that identify the frame type,
+# the repeat flag and the priority may have any value.
+_CONTROL_FIELD_MASK = 0xd3
+_STANDARD_FRAME = 0x90
+_EXTENDED_FRAME = 0x10
+
+# USB HID report header (3 bytes) and KNX USB transfer protocol header (8 bytes)
+_HID_REPORT_ID = 0x01
+_HID_REPORT_HEADER_LENGTH = 3
+_HID_PROTOCOL_HEADER_LENGTH = 8
+_HID_KNX_TUNNEL = 0x01
+_HID_START_PACKET = 0x01
+_HID_END_PACKET = 0x02
+# L_Data.req, L_Data.con and L_Data.ind by EMI ID (EMI1, EMI2)
+_EMI_L_DATA = {
+    0x01: (0x11, 0x4e, 0x49),
+    0x02: (0x11, 0x2e, 0x29)}
+
+
+class Tp1StreamParser(object):
+    """Cut TP1 frames out of a raw byte stream.
+
+    feed() returns a list of the complete frames as bytes, including the
+    control field and the checksum. If acknowledgements is True, single byte
+    acknowledgement frames (see TP1_ACKNOWLEDGEMENTS) are returned as well,
+    otherwise they are dropped silently. Poll data frames are not
+    supported and skipped like any other invalid data."""
+    def __init__(self, max_buffer=1024, acknowledgements=False):
+        self.max_buffer = max_buffer
+        self.acknowledgements = acknowledgements
+        self.buffer = bytearray()
+        self.offset = 0
+        self.frame_count = 0
+        self.skipped = 0
+        self.checksum_errors = 0
+
+    def __repr__(self):
+        return '%s frames: %s, skipped: %s, checksum_errors: %s, buffered: %s' % (
+            self.__class__.__name__,
+            self.frame_count,
+            self.skipped,
+            self.checksum_errors,
+            len(self.buffer) - self.offset)
+
+    @staticmethod
+    def frame_length(buffer, offset, end):
+        """Return the length of the frame that starts at offset, 0 if
+        more data is required to tell, or None if no frame starts at offset."""
+        control_field = buffer[offset]
+        frame_type = control_field & _CONTROL_FIELD_MASK
+        if frame_type == _STANDARD_FRAME:
+            if end - offset < 6:
+                return 0
+            return (buffer[offset + 5] & 0x0f) + 8
+        elif frame_type == _EXTENDED_FRAME:
+            if end - offset < 7:
+                return 0
+            return buffer[offset + 6] + 9
+        elif control_field in TP1_ACKNOWLEDGEMENTS:
+            return 1
+        return None
+
+    def feed(self, data):
+        """Add data to the stream and return a list of all frames that are
+        complete now. Large chunks are consumed in slices of max_buffer bytes."""
+        view = memoryview(data)
+        frames = []
+        # An empty chunk resumes parsing what is left in the buffer.
+        for start in range(0, max(len(view), 1), self.max_buffer):
+            # Drop what has been consumed before the next slice is added
+            del self.buffer[:self.offset]
+            self.offset = 0
+            self.buffer.extend(view[start:start + self.max_buffer])
+            frames.extend(self._parse())
+        return frames
+
+    def _parse(self):
+        buffer = self.buffer
+        end = len(buffer)
+        while self.offset < end:
+            offset = self.offset
+            length = self.frame_length(buffer, offset, end)
+            if length is None:
+                self.offset += 1
+                self.skipped += 1
+                continue
+            if length == 0 or end - offset < length:
+                break
+            if length == 1:
+                self.offset += 1
+                if self.acknowledgements:
+                    yield bytes(buffer[offset:offset + 1])
+                continue
+            frame = bytes(buffer[offset:offset + length])
+            if DataRequest.checksum(frame) != 0xff:
+                # Not a frame or a corrupted one, resync on the next byte.
+                self.offset += 1
+                self.skipped += 1
+                self.checksum_errors += 1
+                continue
+            self.offset += length
+            self.frame_count += 1
+            yield frame
+
+    def frames(self, chunks):
+        """Yield all frames of an iterable of chunks."""
+        for chunk in chunks:
+            yield from self.feed(chunk)
+
+
+class UsbHidStreamParser(object):
+    """Reassemble EMI frames from a sequence of 64 byte USB HID reports.
+
+    feed() returns a list of (emi_id, message_code, frame) for every
+    complete KNX tunnel frame, where frame is the EMI frame without the message code.
+    Reports with device feature services are ignored. EMI1 and EMI2
+    L_Data frames are checked against their NPCI length, frames that
+    are shorter are dropped."""
+    def __init__(self, max_buffer=1024):
+        self.max_buffer = max_buffer
+        self.body = None
+        self.body_length = 0
+        self.emi_id = None
+        self.frame_count = 0
+        self.skipped = 0
+
+    def __repr__(self):
+        return '%s frames: %s, skipped: %s' % (
+            self.__class__.__name__,
+            self.frame_count,
+            self.skipped)
+
+    def _reset(self):
+        self.body = None
+        self.body_length = 0
+        self.emi_id = None
+
+    def feed(self, report):
+        """Add a single HID report and return a list of the frame it
+        completes, an empty list if it completes none."""
+        report = bytes(report)
+        if len(report) < _HID_REPORT_HEADER_LENGTH or report[0] != _HID_REPORT_ID:
+            self.skipped += 1
+            return []
+        package_info = report[1]
+        data = report[_HID_REPORT_HEADER_LENGTH:_HID_REPORT_HEADER_LENGTH + report[2]]
+        if package_info & _HID_START_PACKET:
+            self._reset()
+            if len(data) < _HID_PROTOCOL_HEADER_LENGTH or data[4] != _HID_KNX_TUNNEL:
+                return []
+            body_length = (data[2] << 8) | data[3]
+            if body_length > self.max_buffer:
+                self.skipped += 1
+                return []
+            self.body = bytearray(data[_HID_PROTOCOL_HEADER_LENGTH:])
+            self.body_length = body_length
+            self.emi_id = data[5]
+        elif self.body is None:
+            # Continuation of a frame that has not been started or was dropped.
+            self.skipped += 1
+            return []
+        else:
+            self.body.extend(data)
+        if not package_info & _HID_END_PACKET and len(self.body) < self.body_length:
+            return []
+        body = bytes(self.body[:self.body_length])
+        emi_id = self.emi_id
+        self._reset()
+        if not body or not self._valid_l_data(emi_id, body):
+            self.skipped += 1
+            return []
+        self.frame_count += 1
+        return [(emi_id, body[0], body[1:])]
+
+    @staticmethod
+    def _valid_l_data(emi_id, body):
+        # message code, control field, source, destination, NPCI, TPDU
+        if body[0] not in _EMI_L_DATA.get(emi_id, ()):
+            return True
+        return len(body) >= 7 and len(body) >= (body[6] & 0x0f) + 8
+
+    def frames(self, reports):
+        """Yield all frames of an iterable of HID reports."""
+        for report in reports:
+            yield from self.feed(report)
@@ -0,0 +1,138 @@
+"""Preassembled frames for messages that are sent very often.
+
+Scanning a bus sends the same few TUNNELLING_REQUESTs to every
+address and each received frame has to be acknowledged. Instead of
+building a KnxMessage for each of them, the frames are packed once
+and only the variable fields are patched with struct.pack_into().
+
+Layout of a TUNNELLING_REQUEST with a cEMI L_Data.req:
+
+    offset  field
+         0  KNXnet/IP header (6 bytes)
+         6  structure length
+         7  communication channel
+         8  sequence counter
+         9  reserved
+        10  cEMI message code
+        11  additional information length (always 0)
+        12  control field 1
+        13  control field 2
+        14  KNX source address (2 bytes)
+        16  KNX destination address (2 bytes)
+        18  NPDU length
+        19  TPCI (and the upper APCI bits)
+        20  APCI (optional)
+        21  data (optional)
+"""
+from knxmap import KNX_MESSAGE_TYPES, KNX_CONSTANTS
+from .reader import get_struct
+from .tunnelling import KnxTunnellingRequest
+
+__all__ = ['TunnellingRequestTemplates', 'pack_tunnelling_ack',
+           'pack_device_configuration_ack']
+
+_SEQUENCE_OFFSET = 8
+_DESTINATION_OFFSET = 16
+_TPCI_OFFSET = 19
+_KEY_OFFSET = 22
+
+_BYTE = get_struct('!B')
+_ADDRESS = get_struct('!H')
+_KEY = get_struct('!I')
+# KNXnet/IP header and connection header of ACKs
+_ACK = get_struct('!BBHHBBBB')
+
+
+def _pack_ack(service_type, communication_channel, sequence_count, status=0):
+    return _ACK.pack(KNX_CONSTANTS['HEADER_SIZE_10'],
+                     KNX_CONSTANTS['KNXNETIP_VERSION_10'],
+                     service_type,
+                     _ACK.size,
+                     4,
+                     communication_channel,
+                     sequence_count,
+                     status)
+
+
+def pack_tunnelling_ack(communication_channel, sequence_count, status=0):
+    """Return a TUNNELLING_ACK as bytes, the same as
+    KnxTunnellingAck(...).get_message() but without creating a message."""
+    return _pack_ack(KNX_MESSAGE_TYPES.get('TUNNELLING_ACK'),
+                     communication_channel, sequence_count, status)
+
+
+def pack_device_configuration_ack(communication_channel, sequence_count, status=0):
+    """Return a DEVICE_CONFIGURATION_ACK as bytes, the same as
+    KnxDeviceConfigurationAck(...).get_message()."""
+    return _pack_ack(KNX_MESSAGE_TYPES.get('DEVICE_CONFIGURATION_RESPONSE'),
+                     communication_channel, sequence_count, status)
+
+
+class TunnellingRequestTemplates(object):
+    """TUNNELLING_REQUESTs of a single tunnel connection that only
+    differ in the sequence counter, the destination and the TPCI
+    sequence number.
+
+    The frames are packed with KnxTunnellingRequest once per
+    connection, so they are byte for byte the same as the ones
+    built by the message class. The channel and the KNX source
+    address are patched in when the templates are created, all
+    other fields on every call."""
+    def __init__(self, communication_channel, knx_source):
+        self.communication_channel = communication_channel
+        self.knx_source = knx_source
+        self.t_connect = self._template('tpci_unnumbered_control_data', 'CONNECT')
+        self.t_disconnect = self._template('tpci_unnumbered_control_data', 'DISCONNECT')
+        self.t_ack = self._template('tpci_numbered_control_data', 'ACK')
+        self.device_descriptor_read = self._template('apci_device_descriptor_read')
+        self.authorize_request = self._template('apci_authorize_request')
+
+    def __repr__(self):
+        return '%s communication_channel: %s, knx_source: %s' % (
+            self.__class__.__name__,
+            self.communication_channel,
+            self.knx_source)
+
+    def _template(self, function, *args):
+        # Any address would do, it is patched on every call.
+        request = KnxTunnellingRequest(communication_channel=self.communication_channel,
+                                       knx_source=self.knx_source,
+                                       knx_destination='0.0.0')
+        getattr(request, function)(*args)
+        return bytearray(request.get_message())
+
+    @staticmethod
+    def _patch(frame, sequence_count, knx_destination):
+        _BYTE.pack_into(frame, _SEQUENCE_OFFSET, sequence_count)
+        _ADDRESS.pack_into(frame, _DESTINATION_OFFSET, knx_destination)
+        return bytes(frame)
+
+    @classmethod
+    def _patch_numbered(cls, frame, sequence_count, knx_destination, tpci_sequence):
+        # The sequence number is stored in bits 2-5 of the TPCI
+        frame[_TPCI_OFFSET] = (frame[_TPCI_OFFSET] & 0xc3) | ((tpci_sequence & 0x0f) << 2)
+        return cls._patch(frame, sequence_count, knx_destination)
+
+    def tpci_connect(self, sequence_count, knx_destination):
+        """T_Connect to knx_destination, which is a packed individual address."""
+        return self._patch(self.t_connect, sequence_count, knx_destination)
+
+    def tpci_disconnect(self, sequence_count, knx_destination):
+        """T_Disconnect from knx_destination."""
+        return self._patch(self.t_disconnect, sequence_count, knx_destination)
+
+    def tpci_ack(self, sequence_count, knx_destination, tpci_sequence):
+        """T_ACK (numbered control data) for the tpci_sequence of knx_destination."""
+        return self._patch_numbered(self.t_ack, sequence_count, knx_destination, tpci_sequence)
+
+    def apci_device_descriptor_read(self, sequence_count, knx_destination, tpci_sequence):
+        """A_DeviceDescriptor_Read"""
+        return self._patch_numbered(self.device_descriptor_read, sequence_count,
+                                    knx_destination, tpci_sequence)
+
+    def apci_authorize_request(self, sequence_count, knx_destination, tpci_sequence,
+                               key=0xffffffff):
+        """A_Authorize_Request with key"""
+        _KEY.pack_into(self.authorize_request, _KEY_OFFSET, key)
+        return self._patch_numbered(self.authorize_request, sequence_count,
+                                    knx_destination, tpci_sequence)
@@ -8,6 +8,7 @@ from knxmap.data.constants import (TPCI_NUMBERED_CONTROL_DATA_TYPES,
 import knxmap.utils
 from .tpci import Tpci
 from .apci import Apci
+from .reader import get_struct, unpack_stream
 
 LOGGER = logging.getLogger(__name__)
 
@@ -59,8 +60,9 @@ class DataRequest(object):
     @staticmethod
     def _unpack_stream(fmt, stream):
         try:
-            buf = stream.read(struct.calcsize(fmt))
-            return struct.unpack(fmt, buf)[0]
+            compiled = get_struct(fmt)
+            buf = stream.read(compiled.size)
+            return compiled.unpack(buf)[0]
         except struct.error as e:
             LOGGER.exception(e)
 
@@ -112,7 +114,10 @@ class DataRequest(object):
         npci['destination_type'] = ((data >> 7) & 1) << 0
         return npci
 
-    def checksum(self, data):
+    @staticmethod
+    def checksum(data):
+        """XOR of all bytes of data. A TP1 frame is valid if the
+        checksum of the whole frame, including its last byte, is 0xff."""
         checksum = data[0]
         for i in data[1:]:
             checksum ^= i
@@ -158,11 +163,11 @@ class DataRequest(object):
         return data_request
 
     def unpack(self, message):
-        self.control_field = self.unpack_control_field(self._unpack_stream('!B', message))
-        self.knx_source = self._unpack_stream('!H', message)
-        self.knx_destination = self._unpack_stream('!H', message)
-        #self.npci = self.unpack_npci(self._unpack_stream('!B', message))
-        _npci = self._unpack_stream('!B', message)
+        control_field, \
+        self.knx_source, \
+        self.knx_destination, \
+        _npci = unpack_stream('!BHHB', message)
+        self.control_field = self.unpack_control_field(control_field)
         self.npci = self.unpack_npci(_npci)
         if self.npci.get('data_length') > 0:
             tpci_apci = bytearray(self._unpack_stream('{}s'.format(self.npci.get('data_length')),
@@ -234,8 +239,9 @@ class ExtendedDataRequest(object):
     @staticmethod
     def _unpack_stream(fmt, stream):
         try:
-            buf = stream.read(struct.calcsize(fmt))
-            return struct.unpack(fmt, buf)[0]
+            compiled = get_struct(fmt)
+            buf = stream.read(compiled.size)
+            return compiled.unpack(buf)[0]
         except struct.error as e:
             LOGGER.exception(e)
 
@@ -330,7 +336,10 @@ class ExtendedDataRequest(object):
         cf['address_type'] = (data >> 7) & 1
         return cf
 
-    def checksum(self, data):
+    @staticmethod
+    def checksum(data):
+        """XOR of all bytes of data. A TP1 frame is valid if the
+        checksum of the whole frame, including its last byte, is 0xff."""
         checksum = data[0]
         for i in data[1:]:
             checksum ^= i
@@ -377,13 +386,13 @@ class ExtendedDataRequest(object):
         return data_request
 
     def unpack(self, message):
-        self.control_field = self.unpack_control_field(
-            self._unpack_stream('!B', message))
-        self.extended_control_field = self.unpack_extended_control_field(
-            self._unpack_stream('!B', message))
-        self.knx_source = self._unpack_stream('!H', message)
-        self.knx_destination = self._unpack_stream('!H', message)
-        self.npdu_len = self._unpack_stream('!B', message)
+        control_field, \
+        extended_control_field, \
+        self.knx_source, \
+        self.knx_destination, \
+        self.npdu_len = unpack_stream('!BBHHB', message)
+        self.control_field = self.unpack_control_field(control_field)
+        self.extended_control_field = self.unpack_extended_control_field(extended_control_field)
         tpci_apci = bytearray(self._unpack_stream('{}s'.format(self.npdu_len + 1),
                                                   message))
         self.tpci = Tpci()
@@ -41,16 +41,27 @@ class Tpci(object):
         data = data
         if data is None:
             data = self.data
-        self.tpci_type = 0
-        self.tpci_type |= ((data >> 6) & 1) << 0
-        self.tpci_type |= ((data >> 7) & 1) << 1
-        self.sequence = 0
-        self.sequence |= ((data >> 2) & 1) << 0
-        self.sequence |= ((data >> 3) & 1) << 1
-        self.sequence |= ((data >> 4) & 1) << 2
-        self.sequence |= ((data >> 5) & 1) << 3
+        self.tpci_type, self.sequence = TPCI_TABLE[data]
         if self.tpci_type is [2, 3]:
             # Control data includes a status field
             self.status = 0
             self.status |= ((data >> 0) & 1) << 0
             self.status |= ((data >> 1) & 1) << 1
+
+
+def _unpack_bitwise(data):
+    """Decode the TPCI type and the sequence number bit by bit.
+    This is used to build TPCI_TABLE, Tpci.unpack() uses the table."""
+    tpci_type = 0
+    tpci_type |= ((data >> 6) & 1) << 0
+    tpci_type |= ((data >> 7) & 1) << 1
+    sequence = 0
+    sequence |= ((data >> 2) & 1) << 0
+    sequence |= ((data >> 3) & 1) << 1
+    sequence |= ((data >> 4) & 1) << 2
+    sequence |= ((data >> 5) & 1) << 3
+    return tpci_type, sequence
+
+
+# (tpci_type, sequence) for all values of the TPCI byte
+TPCI_TABLE = tuple(_unpack_bitwise(i) for i in range(256))
@@ -1,10 +1,10 @@
 """Tunnelling Services"""
-import io
 import struct
 import logging
 
 from knxmap import KNX_MESSAGE_TYPES
 from .main import KnxMessage
+from .reader import MessageReader
 from .cemi import CemiFrame
 from .tp import ExtendedDataRequest
 
@@ -17,7 +17,7 @@ class KnxTunnellingRequest(KnxMessage):
                  message_code=0x11):
         super(KnxTunnellingRequest, self).__init__()
         self.cemi = CemiFrame()
-        self.header['service_type'] = KNX_MESSAGE_TYPES.get('TUNNELLING_REQUEST')
+        self.header.service_type = KNX_MESSAGE_TYPES.get('TUNNELLING_REQUEST')
         self.communication_channel = communication_channel
         self.sequence_count = sequence_count
         self.message_code = message_code
@@ -47,13 +47,17 @@ class KnxTunnellingRequest(KnxMessage):
 
     def _unpack_knx_body(self, message):
         try:
-            message = io.BytesIO(message)
-            self.structure_length = self._unpack_stream('!B', message)
-            self.communication_channel = self._unpack_stream('!B', message)
-            self.sequence_counter = self._unpack_stream('!B', message)
-            self._unpack_stream('!B', message) # reserved
+            message = MessageReader(message)
+            # The connection header, the cEMI message code and the
+            # additional information length are decoded at once.
+            self.structure_length, \
+            self.communication_channel, \
+            self.sequence_counter, \
+            _, \
+            self.cemi.message_code, \
+            self.cemi.additional_information_len = message.unpack('!BBBBBB')
             # TODO: check what kind of data request it is?
-            self.cemi.unpack_extended_data_request(message)
+            self.cemi.unpack_service_information(message)
         except Exception as e:
             LOGGER.exception(e)
 
@@ -333,7 +337,7 @@ class KnxTunnellingAck(KnxMessage):
     def __init__(self, message=None, communication_channel=None, sequence_count=0,
                  status=0):
         super(KnxTunnellingAck, self).__init__()
-        self.header['service_type'] = KNX_MESSAGE_TYPES.get('TUNNELLING_ACK')
+        self.header.service_type = KNX_MESSAGE_TYPES.get('TUNNELLING_ACK')
         self.communication_channel = communication_channel
         self.structure_length = 4
         self.sequence_count = sequence_count
@@ -353,10 +357,10 @@ class KnxTunnellingAck(KnxMessage):
 
     def _unpack_knx_body(self, message):
         try:
-            message = io.BytesIO(message)
-            self.structure_length = self._unpack_stream('!B', message)
-            self.communication_channel = self._unpack_stream('!B', message)
-            self.sequence_counter = self._unpack_stream('!B', message)
-            self.status = self._unpack_stream('!B', message)
+            message = MessageReader(message)
+            self.structure_length, \
+            self.communication_channel, \
+            self.sequence_counter, \
+            self.status = message.unpack('!BBBB')
         except Exception as e:
             LOGGER.exception(e)
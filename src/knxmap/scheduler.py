@@ -0,0 +1,249 @@
+"""Adaptive request scheduling for scans.
+
+Small KNXnet/IP interfaces only handle a few requests at a time and
+silently drop the rest. A fixed number of workers is either too slow
+for large networks or too aggressive for fragile ones, so the number
+of requests in flight is adapted to the network with additive increase,
+multiplicative decrease (AIMD), as in TCP congestion control:
+
+    * every request that completes without a sign of loss increases
+      the window by increase / window, so by roughly increase per
+      window of requests,
+    * a sign of loss multiplies the window by decrease, at most once
+      per holdoff seconds, as losses in quick succession are caused
+      by the same congestion.
+
+A target that never responds is not a sign of loss, most scanned
+addresses are not in use. Loss is a response that arrives only for
+a retransmitted request, or an error reported by a gateway.
+
+If a limiter has a max_rate, its rate of requests per second is
+max_rate scaled by window / max_window, so both shrink and grow together.
+
+ScanScheduler combines a limiter for the whole scan with one limiter
+per gateway, so a slow gateway cannot use up the budget of the others:
+
+    scheduler = ScanScheduler(loop=loop, max_window=100, gateway_window=1)
+    yield from scheduler.acquire(host)
+    response = yield from probe(host)
+    scheduler.release(host, loss=response_to_retransmission)"""
+import asyncio
+import collections
+import logging
+
+__all__ = ['AimdLimiter', 'ScanScheduler']
+
+LOGGER = logging.getLogger(__name__)
+
+
+class AimdLimiter(object):
+    """Limit the requests in flight to window and, if max_rate is set,
+    the requests per second to the current rate. window starts at
+    max_window and is adapted between min_window and max_window."""
+    def __init__(self, loop=None, max_window=100, min_window=1, max_rate=0,
+                 increase=1.0, decrease=0.5, holdoff=2):
+        self.loop = loop or asyncio.get_event_loop()
+        self.max_window = max(max_window, 1)
+        self.min_window = max(min(min_window, self.max_window), 1)
+        self.window = float(self.max_window)
+        self.max_rate = max_rate
+        self.increase = increase
+        self.decrease = decrease
+        self.holdoff = holdoff
+        self.in_flight = 0
+        self.tokens = 1.0
+        self.last = self.loop.time()
+        self.holdoff_until = 0
+        self.waiters = collections.deque()
+        self.successes = 0
+        self.losses = 0
+        self.decreases = 0
+
+    def __repr__(self):
+        return '%s window: %.1f, rate: %.1f, in_flight: %s, losses: %s' % (
+            self.__class__.__name__,
+            self.window,
+            self.rate,
+            self.in_flight,
+            self.losses)
+
+    @property
+    def rate(self):
+        """The current rate in requests per second, 0 means unlimited."""
+        return self.max_rate * self.window / self.max_window
+
+    @property
+    def idle(self):
+        """True if nothing is in flight, no loss has to be remembered and
+        the token bucket has refilled, so a new limiter would behave the same."""
+        now = self.loop.time()
+        rate = self.rate
+        return not self.in_flight and self.window >= self.max_window and \
+            now >= self.holdoff_until and \
+            (not rate or self.tokens + (now - self.last) * rate >= 1)
+
+    def _token_delay(self):
+        """Take a token and return 0, or return the seconds
+        until the next token is available."""
+        rate = self.rate
+        if not rate:
+            return 0
+        now = self.loop.time()
+        # Do not allow bursts of more than a single request
+        self.tokens = min(self.tokens + (now - self.last) * rate, 1.0)
+        self.last = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0
+        return (1 - self.tokens) / rate
+
+    @asyncio.coroutine
+    def acquire(self):
+        """Wait until another request may be sent."""
+        if self.in_flight >= int(self.window) or self.waiters:
+            # Requests are served in order, _wakeup() takes
+            # the slot for the waiter before it is woken up.
+            waiter = asyncio.Future(loop=self.loop)
+            self.waiters.append(waiter)
+            try:
+                yield from waiter
+            except asyncio.CancelledError:
+                if waiter.done() and not waiter.cancelled():
+                    self.cancel()
+                raise
+        else:
+            self.in_flight += 1
+        try:
+            delay = self._token_delay()
+            while delay:
+                yield from asyncio.sleep(delay)
+                delay = self._token_delay()
+        except asyncio.CancelledError:
+            self.cancel()
+            raise
+
+    def cancel(self):
+        """Return the slot of a request that has not been sent."""
+        self.in_flight = max(self.in_flight - 1, 0)
+        self._wakeup()
+
+    def release(self, loss=False):
+        """Return the slot of a completed request, loss
+        is True if there was a sign of loss."""
+        self.in_flight = max(self.in_flight - 1, 0)
+        if loss:
+            self.loss()
+        else:
+            self.success()
+        self._wakeup()
+
+    def success(self):
+        self.successes += 1
+        self.window = min(self.window + self.increase / self.window, float(self.max_window))
+        self._wakeup()
+
+    def loss(self):
+        self.losses += 1
+        now = self.loop.time()
+        if now < self.holdoff_until:
+            return
+        self.holdoff_until = now + self.holdoff
+        self.decreases += 1
+        self.window = max(self.window * self.decrease, float(self.min_window))
+        LOGGER.debug('Loss detected, reduced window to {:.1f}'.format(self.window))
+
+    def _wakeup(self):
+        while self.waiters and self.in_flight < int(self.window):
+            waiter = self.waiters.popleft()
+            if not waiter.done():
+                self.in_flight += 1
+                waiter.set_result(None)
+
+
+class ScanScheduler(object):
+    """A limiter for the whole scan and one for every gateway.
+
+    Gateway limiters are created on first use with gateway_window
+    requests in flight, or the window set for the gateway with
+    gateway(), and gateway_rate requests per second. They are dropped
+    again when they are idle, so scanning many targets does not keep a
+    limiter for each of them. Limiters that only become idle after
+    their last request, when their token bucket has refilled, are
+    dropped the next time the count of limiters has doubled."""
+    def __init__(self, loop=None, max_window=100, max_rate=0, gateway_window=1,
+                 gateway_rate=0, holdoff=2):
+        self.loop = loop or asyncio.get_event_loop()
+        self.gateway_window = gateway_window
+        self.gateway_rate = gateway_rate
+        self.holdoff = holdoff
+        self.limiter = AimdLimiter(loop=self.loop, max_window=max_window,
+                                   max_rate=max_rate, holdoff=holdoff)
+        self.gateways = {}
+        # Windows set with gateway(), they outlive the limiters
+        self.windows = {}
+        self.prune_at = 64
+
+    def __repr__(self):
+        return '%s %r, gateways: %s' % (
+            self.__class__.__name__,
+            self.limiter,
+            len(self.gateways))
+
+    def gateway(self, host, window=None):
+        """Return the limiter of the gateway host, window overrides
+        gateway_window for this gateway from now on."""
+        limiter = self.gateways.get(host)
+        if window:
+            self.windows[host] = window
+            if limiter is not None and limiter.max_window != window:
+                limiter = None
+        if limiter is None:
+            if len(self.gateways) >= self.prune_at:
+                self._prune()
+            limiter = AimdLimiter(loop=self.loop,
+                                  max_window=self.windows.get(host, self.gateway_window),
+                                  max_rate=self.gateway_rate, holdoff=self.holdoff)
+            self.gateways[host] = limiter
+        return limiter
+
+    def _prune(self):
+        for host, limiter in list(self.gateways.items()):
+            if limiter.idle and not limiter.waiters:
+                del self.gateways[host]
+        self.prune_at = max(len(self.gateways) * 2, 64)
+
+    @asyncio.coroutine
+    def acquire(self, host):
+        # Wait for the gateway first, so that requests
+        # waiting for a busy gateway do not block others.
+        gateway = self.gateway(host)
+        yield from gateway.acquire()
+        try:
+            yield from self.limiter.acquire()
+        except asyncio.CancelledError:
+            gateway.cancel()
+            raise
+
+    def release(self, host, loss=False):
+        self.limiter.release(loss)
+        limiter = self.gateways.get(host)
+        if limiter is None:
+            return
+        limiter.release(loss)
+        if limiter.idle and not limiter.waiters:
+            del self.gateways[host]
+
+    def report(self):
+        """Return the statistics of the scan as an ordered dict."""
+        report = collections.OrderedDict()
+        report['window'] = self.limiter.window
+        report['rate'] = self.limiter.rate
+        report['successes'] = self.limiter.successes
+        report['losses'] = self.limiter.losses
+        report['decreases'] = self.limiter.decreases
+        report['gateways'] = len(self.gateways)
+        return report
+
+    def format_report(self):
+        return ('Scheduler: window {window:.1f}, {successes} requests, {losses} losses, '
+                '{decreases} decreases').format(**self.report())
@@ -0,0 +1,258 @@
+"""A persistent store of scan results that allows incremental rescans.
+
+Gateways are stored by (host, port) and bus devices by (gateway host,
+individual address), each with the time it has last been probed, the
+time it has last responded and its report as JSON.
+
+An incremental rescan skips every target that has been probed within a
+given time, whether it responded or not. Gateways that never responded
+are not stored one by one, a sweep over a /8 would add millions of rows:
+every record_gateways() call stores the address ranges it probed in
+gateway_sweeps instead. Bus devices that did not respond are stored by
+address, there are at most 65536 of them on the bus of a gateway.
+
+    store = ScanStore('scan.db')
+    fresh = store.fresh_gateways(max_age=24 * 3600)
+    # ... probe all targets that are not in fresh ...
+    diff = store.record_gateways(probed_targets, knx_gateways)
+    print(diff.format_report())
+
+Each record_*() call returns a ScanDiff of the entries that are new,
+changed or gone compared to the previous run."""
+import collections
+import itertools
+import json
+import logging
+import sqlite3
+import time
+
+from knxmap.targets import TargetRanges, KnxTargetReport, KnxBusTargetReport
+
+__all__ = ['ScanStore', 'ScanDiff']
+
+LOGGER = logging.getLogger(__name__)
+
+GATEWAY_FIELDS = ('mac_address', 'knx_address', 'device_serial', 'friendly_name',
+                  'device_status', 'knx_medium', 'project_install_identifier',
+                  'supported_services', 'additional_individual_addresses', 'manufacturer',
+                  'properties')
+BUS_DEVICE_FIELDS = ('medium', 'type', 'version', 'device_serial', 'device_state',
+                     'manufacturer', 'properties', 'status')
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS gateways (
+    host TEXT NOT NULL,
+    port INTEGER NOT NULL,
+    mac_address TEXT,
+    first_seen REAL,
+    last_seen REAL,
+    last_probed REAL NOT NULL,
+    report TEXT,
+    PRIMARY KEY (host, port));
+CREATE TABLE IF NOT EXISTS bus_devices (
+    gateway TEXT NOT NULL,
+    address TEXT NOT NULL,
+    first_seen REAL,
+    last_seen REAL,
+    last_probed REAL NOT NULL,
+    report TEXT,
+    PRIMARY KEY (gateway, address));
+CREATE TABLE IF NOT EXISTS gateway_sweeps (
+    first TEXT NOT NULL,
+    last TEXT NOT NULL,
+    port INTEGER NOT NULL,
+    probed REAL NOT NULL);
+"""
+
+
+def _jsonable(value):
+    """Convert the values of reports to types that can be stored as JSON."""
+    if isinstance(value, (bytes, bytearray)):
+        return bytes(value).decode('latin-1')
+    elif isinstance(value, dict):
+        return collections.OrderedDict((str(k), _jsonable(v)) for k, v in value.items())
+    elif isinstance(value, (list, tuple, set)):
+        return [_jsonable(v) for v in value]
+    elif value is None or isinstance(value, (str, int, float)):
+        return value
+    return str(value)
+
+
+def _report_dict(report, fields):
+    return collections.OrderedDict((f, _jsonable(getattr(report, f, None))) for f in fields)
+
+
+class ScanDiff(object):
+    """The changes of a kind of entries ('gateways' or 'bus devices')
+    between the previous run and the current one."""
+    def __init__(self, kind):
+        self.kind = kind
+        self.new = []
+        # A list of (key, list of changed fields)
+        self.changed = []
+        self.gone = []
+
+    def __repr__(self):
+        return '%s %s new: %s, changed: %s, gone: %s' % (
+            self.__class__.__name__,
+            self.kind,
+            len(self.new),
+            len(self.changed),
+            len(self.gone))
+
+    def __len__(self):
+        return len(self.new) + len(self.changed) + len(self.gone)
+
+    def format_report(self):
+        lines = ['Changes of {}: {} new, {} changed, {} gone'.format(
+            self.kind, len(self.new), len(self.changed), len(self.gone))]
+        for key in self.new:
+            lines.append('  + {}'.format(key))
+        for key, fields in self.changed:
+            lines.append('  ~ {} ({})'.format(key, ', '.join(fields)))
+        for key in self.gone:
+            lines.append('  - {}'.format(key))
+        return '\n'.join(lines)
+
+
+class ScanStore(object):
+    """Scan results in an SQLite database at path."""
+    def __init__(self, path):
+        self.path = path
+        self.con = sqlite3.connect(path)
+        self.con.executescript(SCHEMA)
+        self.con.commit()
+
+    def __repr__(self):
+        return '%s %s' % (self.__class__.__name__, self.path)
+
+    def close(self):
+        self.con.close()
+
+    def fresh_gateways(self, max_age):
+        """Return the TargetRanges of all (host, port) that have
+        been probed within max_age seconds."""
+        since = time.time() - max_age
+        fresh = TargetRanges()
+        for first, last, port in self.con.execute(
+                'SELECT first, last, port FROM gateway_sweeps WHERE probed >= ?', (since,)):
+            fresh.add_hosts(first, last, port)
+        for host, port in self.con.execute(
+                'SELECT host, port FROM gateways WHERE last_probed >= ?', (since,)):
+            fresh.add_hosts(host, host, port)
+        return fresh
+
+    def fresh_bus_devices(self, gateway, max_age):
+        """Return the set of addresses on the bus of gateway that
+        have been probed within max_age seconds."""
+        rows = self.con.execute('SELECT address FROM bus_devices '
+                                'WHERE gateway = ? AND last_probed >= ?',
+                                (gateway, time.time() - max_age))
+        return set(address for address, in rows)
+
+    def gateways(self, responding=True):
+        """Return an ordered dict of (host, port) to the stored report of
+        all gateways, only those that responded to their last probe if
+        responding is set."""
+        query = 'SELECT host, port, report FROM gateways WHERE report IS NOT NULL'
+        if responding:
+            query += ' AND last_seen = last_probed'
+        return collections.OrderedDict(
+            ((host, port), json.loads(report, object_pairs_hook=collections.OrderedDict))
+            for host, port, report in self.con.execute(query + ' ORDER BY host, port'))
+
+    def bus_devices(self, gateway, responding=True):
+        """Like gateways(), for the bus devices of gateway, keyed by address."""
+        query = 'SELECT address, report FROM bus_devices WHERE gateway = ? AND report IS NOT NULL'
+        if responding:
+            query += ' AND last_seen = last_probed'
+        return collections.OrderedDict(
+            (address, json.loads(report, object_pairs_hook=collections.OrderedDict))
+            for address, report in self.con.execute(query + ' ORDER BY address', (gateway,)))
+
+    def gateway_reports(self, targets):
+        """Return KnxTargetReports of the gateways in targets that responded
+        to their last probe, rebuilt from their stored reports."""
+        knx_gateways = []
+        for (host, port), report in self.gateways().items():
+            if (host, port) not in targets:
+                continue
+            fields = {f: report.get(f) for f in GATEWAY_FIELDS}
+            fields['friendly_name'] = (fields['friendly_name'] or '').encode('latin-1')
+            knx_gateways.append(KnxTargetReport(host=host, port=port, bus_devices=[], **fields))
+        return knx_gateways
+
+    def bus_device_reports(self, gateway, addresses):
+        """Like gateway_reports(), for the bus devices of gateway."""
+        return [KnxBusTargetReport(address, **{f: report.get(f) for f in BUS_DEVICE_FIELDS})
+                for address, report in self.bus_devices(gateway).items()
+                if address in addresses]
+
+    def record_gateways(self, probed, knx_gateways, now=None):
+        """Store the KnxTargetReports knx_gateways, the results of probing
+        the targets in probed, a TargetRanges or an iterable of (host, port),
+        and return a ScanDiff."""
+        now = now or time.time()
+        if not isinstance(probed, TargetRanges):
+            probed = TargetRanges.from_targets(probed)
+        reports = collections.OrderedDict(((g.host, g.port), g) for g in knx_gateways)
+        with self.con:
+            self.con.executemany('INSERT INTO gateway_sweeps (first, last, port, probed) '
+                                 'VALUES (?, ?, ?, ?)',
+                                 [(first, last, port, now) for first, last, port in probed])
+        # Only gateways that respond or have responded before have a row
+        known = [(host, port) for host, port in self.con.execute(
+            'SELECT host, port FROM gateways WHERE report IS NOT NULL')
+                 if (host, port) in probed]
+        return self._record('gateways', ('host', 'port'), known, reports, GATEWAY_FIELDS,
+                            now, lambda key: key, lambda key: '{}:{}'.format(*key))
+
+    def record_bus_devices(self, gateway, probed, bus_devices, now=None):
+        """Store the KnxBusTargetReports bus_devices of gateway, the results
+        of probing the addresses in probed, and return a ScanDiff."""
+        reports = collections.OrderedDict((d.address, d) for d in bus_devices)
+        return self._record('bus_devices', ('gateway', 'address'), probed, reports,
+                            BUS_DEVICE_FIELDS, now, lambda address: (gateway, address),
+                            lambda address: '{} via {}'.format(address, gateway))
+
+    def _record(self, table, key_columns, probed, reports, fields, now, make_key, format_key):
+        now = now or time.time()
+        diff = ScanDiff(table.replace('_', ' '))
+        where = '{} = ? AND {} = ?'.format(*key_columns)
+        # The reports of all entries that responded to their last probe
+        previous = {}
+        for first, second, report in self.con.execute(
+                'SELECT {}, {}, report FROM {} WHERE report IS NOT NULL '
+                'AND last_seen = last_probed'.format(key_columns[0], key_columns[1], table)):
+            previous[(first, second)] = json.loads(report)
+        unseen = set(reports)
+        with self.con:
+            for target in itertools.chain(probed, list(unseen)):
+                if target not in unseen and target in reports:
+                    # Already recorded
+                    continue
+                unseen.discard(target)
+                key = make_key(target)
+                self.con.execute('INSERT OR IGNORE INTO {} ({}, {}, last_probed) '
+                                 'VALUES (?, ?, ?)'.format(table, *key_columns), key + (now,))
+                if target not in reports:
+                    self.con.execute('UPDATE {} SET last_probed = ? WHERE {}'.format(table, where),
+                                     (now,) + key)
+                    if key in previous:
+                        diff.gone.append(format_key(target))
+                    continue
+                # Compare the reports as stored, so converted values compare equal
+                report = json.loads(json.dumps(_report_dict(reports[target], fields)))
+                old = previous.get(key)
+                if old is None:
+                    diff.new.append(format_key(target))
+                elif old != report:
+                    diff.changed.append((format_key(target),
+                                         [f for f in fields if old.get(f) != report.get(f)]))
+                self.con.execute('UPDATE {} SET last_probed = ?, last_seen = ?, report = ?, '
+                                 'first_seen = COALESCE(first_seen, ?) WHERE {}'.format(table, where),
+                                 (now, now, json.dumps(report), now) + key)
+                if table == 'gateways':
+                    self.con.execute('UPDATE gateways SET mac_address = ? WHERE {}'.format(where),
+                                     (report.get('mac_address'),) + key)
+        return diff
@@ -1,15 +1,20 @@
 """This module contains various helper classes that make handling targets and sets
 of targets and results easiert."""
 import binascii
+import bisect
 import collections
 import ipaddress
 import logging
+import math
+import random
 
+from knxmap.address import parse_knx_address, pack_knx_address, \
+    is_valid_individual_address, is_valid_group_address
 from knxmap.data.constants import *
-from knxmap.messages import KnxMessage
 from knxmap.utils import make_runstate_printable
 
 __all__ = ['Targets',
+           'TargetRanges',
            'KnxTargets',
            'BusResultSet',
            'KnxTargetReport',
@@ -20,9 +25,15 @@ LOGGER = logging.getLogger(__name__)
 
 
 class Targets(object):
-    """A helper class that expands provided target definitions to a list of tuples."""
-    def __init__(self, targets=None, ports=3671):
-        self.targets = set()
+    """A helper class that expands provided target definitions to (host, port) tuples.
+
+    Targets are expanded lazily: only the address ranges of the definitions
+    are stored, so a /8 takes as little memory as a single host. Addresses
+    in exclude are cut out of the ranges beforehand and len() is computed
+    from the ranges. If randomize is True, the targets are yielded in a
+    random order, which spreads the probes of a scan over all networks
+    instead of walking through them one subnet after another."""
+    def __init__(self, targets=None, ports=3671, exclude=None, randomize=False, seed=None):
         self.ports = set()
         if isinstance(ports, list):
             for p in ports:
@@ -31,27 +42,208 @@ class Targets(object):
             self.ports.add(ports)
         else:
             self.ports.add(3671)
-
+        self.ports = sorted(self.ports)
+        self.randomize = randomize
+        self.seed = seed
+        # Disjoint, sorted (version, first, last) address ranges
+        self.ranges = []
+        # The index of the first host of each range
+        self._starts = []
+        self.host_count = 0
+
+        if isinstance(targets, str):
+            targets = [targets]
+        if isinstance(exclude, str):
+            exclude = [exclude]
         if isinstance(targets, (set, list)):
-            self._parse(targets)
-        elif isinstance(targets, str):
-            self._parse([targets])
+            self._parse(targets, exclude or [])
+
+    def __len__(self):
+        return self.host_count * len(self.ports)
+
+    def __iter__(self):
+        if self.randomize:
+            return self._shuffled()
+        return self._ordered()
+
+    def __contains__(self, target):
+        try:
+            host, port = target
+            address = ipaddress.ip_address(host)
+        except ValueError:
+            return False
+        if port not in self.ports:
+            return False
+        return any(version == address.version and first <= int(address) <= last
+                   for version, first, last in self.ranges)
+
+    def __getitem__(self, index):
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError('Target index out of range')
+        host_index, port_index = divmod(index, len(self.ports))
+        i = bisect.bisect_right(self._starts, host_index) - 1
+        version, first, _ = self.ranges[i]
+        return self._host(version, first + host_index - self._starts[i]), self.ports[port_index]
+
+    @staticmethod
+    def _host(version, address):
+        if version == 4:
+            return str(ipaddress.IPv4Address(address))
+        return str(ipaddress.IPv6Address(address))
 
-    def _parse(self, targets):
-        """Parse all targets with ipaddress module (with CIDR notation support)."""
-        for target in targets:
+    @staticmethod
+    def _ranges(definitions, hosts=True):
+        """Parse all definitions with ipaddress module (with CIDR notation
+        support) and return their sorted and merged address ranges."""
+        ranges = []
+        for definition in definitions:
             try:
-                _targets = ipaddress.ip_network(target, strict=False)
+                network = ipaddress.ip_network(definition, strict=False)
             except ValueError:
-                LOGGER.error('Invalid target definition, ignoring it: {}'.format(target))
+                LOGGER.error('Invalid target definition, ignoring it: {}'.format(definition))
                 continue
+            first = int(network.network_address)
+            last = int(network.broadcast_address)
+            if hosts and '/' in definition and network.num_addresses > 2:
+                # The same addresses as network.hosts(): without the network
+                # and broadcast address (IPv4) or the Subnet-Router anycast
+                # address (IPv6).
+                first += 1
+                if network.version == 4:
+                    last -= 1
+            ranges.append((network.version, first, last))
+        merged = []
+        for version, first, last in sorted(ranges):
+            if merged and merged[-1][0] == version and first <= merged[-1][2] + 1:
+                merged[-1] = (version, merged[-1][1], max(last, merged[-1][2]))
+            else:
+                merged.append((version, first, last))
+        return merged
+
+    def _parse(self, targets, exclude):
+        excluded = self._ranges(exclude, hosts=False)
+        for version, first, last in self._ranges(targets):
+            for ex_version, ex_first, ex_last in excluded:
+                if ex_version != version or ex_last < first or ex_first > last:
+                    continue
+                if ex_first > first:
+                    self._add_range(version, first, ex_first - 1)
+                first = ex_last + 1
+                if first > last:
+                    break
+            else:
+                self._add_range(version, first, last)
 
-            if '/' in target:
-                _targets = _targets.hosts()
+    def _add_range(self, version, first, last):
+        self.ranges.append((version, first, last))
+        self._starts.append(self.host_count)
+        self.host_count += last - first + 1
 
-            for _target in _targets:
+    def _ordered(self):
+        for version, first, last in self.ranges:
+            for address in range(first, last + 1):
+                host = self._host(version, address)
                 for port in self.ports:
-                    self.targets.add((str(_target), port))
+                    yield host, port
+
+    def _shuffled(self):
+        """Walk the target indexes with a random step that is coprime
+        to their count. Every target is visited exactly once, without
+        keeping a list of all targets in memory."""
+        count = len(self)
+        if not count:
+            return
+        rng = random.Random(self.seed)
+        step = rng.randrange(1, count + 1)
+        while math.gcd(step, count) != 1:
+            step = rng.randrange(1, count + 1)
+        index = rng.randrange(count)
+        for _ in range(count):
+            yield self[index]
+            index = (index + step) % count
+
+
+class TargetRanges(object):
+    """A set of (host, port) targets, stored as sorted and merged address
+    ranges per IP version and port like the ranges of Targets, so a whole
+    /8 takes as little memory as a single host."""
+    def __init__(self):
+        # (version, port) to sorted, disjoint (first, last) address ranges
+        self.ranges = collections.defaultdict(list)
+
+    @classmethod
+    def from_targets(cls, targets):
+        """Return the TargetRanges of targets, a Targets instance or any
+        iterable of (host, port) tuples."""
+        target_ranges = cls()
+        if isinstance(targets, Targets):
+            for version, first, last in targets.ranges:
+                for port in targets.ports:
+                    target_ranges.add(version, port, first, last)
+        else:
+            for host, port in targets:
+                address = ipaddress.ip_address(host)
+                target_ranges.add(address.version, port, int(address), int(address))
+        return target_ranges
+
+    def __len__(self):
+        return sum(last - first + 1 for spans in self.ranges.values() for first, last in spans)
+
+    def __contains__(self, target):
+        try:
+            host, port = target
+            address = ipaddress.ip_address(host)
+        except ValueError:
+            return False
+        spans = self.ranges.get((address.version, port))
+        if not spans:
+            return False
+        i = bisect.bisect_right(spans, (int(address), math.inf)) - 1
+        return i >= 0 and spans[i][1] >= int(address)
+
+    def __iter__(self):
+        """Yield all ranges as (first host, last host, port) tuples."""
+        for (version, port), spans in sorted(self.ranges.items()):
+            for first, last in spans:
+                yield Targets._host(version, first), Targets._host(version, last), port
+
+    def add(self, version, port, first, last):
+        """Add the addresses from first to last (including last)."""
+        spans = self.ranges[(version, port)]
+        i = bisect.bisect_left(spans, (first,))
+        if i and spans[i - 1][1] >= first - 1:
+            i -= 1
+            first = spans[i][0]
+        j = i
+        while j < len(spans) and spans[j][0] <= last + 1:
+            last = max(last, spans[j][1])
+            j += 1
+        spans[i:j] = [(first, last)]
+
+    def add_hosts(self, first, last, port):
+        """Add the range from the host first to the host last."""
+        first = ipaddress.ip_address(first)
+        self.add(first.version, port, int(first), int(ipaddress.ip_address(last)))
+
+    def difference(self, other):
+        """Return the TargetRanges of all targets that are not in other."""
+        result = TargetRanges()
+        for (version, port), spans in self.ranges.items():
+            holes = other.ranges.get((version, port), [])
+            for first, last in spans:
+                for hole_first, hole_last in holes:
+                    if hole_last < first or hole_first > last:
+                        continue
+                    if hole_first > first:
+                        result.add(version, port, first, hole_first - 1)
+                    first = hole_last + 1
+                    if first > last:
+                        break
+                else:
+                    result.add(version, port, first, last)
+        return result
 
 
 class KnxTargets(object):
@@ -82,59 +274,24 @@ class KnxTargets(object):
 
     @staticmethod
     def target_gen(f, t):
-        f = KnxMessage.pack_knx_address(f)
-        t = KnxMessage.pack_knx_address(t)
+        f = pack_knx_address(f)
+        t = pack_knx_address(t)
         for i in range(f, t + 1):
-            yield KnxMessage.parse_knx_address(i)
+            yield parse_knx_address(i)
 
     @staticmethod
     def expand_targets(f, t):
         ret = set()
-        f = KnxMessage.pack_knx_address(f)
-        t = KnxMessage.pack_knx_address(t)
+        f = pack_knx_address(f)
+        t = pack_knx_address(t)
         for i in range(f, t + 1):
-            ret.add(KnxMessage.parse_knx_address(i))
+            ret.add(parse_knx_address(i))
         return ret
 
-    @staticmethod
-    def physical_address_to_int(address):
-        parts = address.split('.')
-        return (int(parts[0]) << 12) + (int(parts[1]) << 8) + (int(parts[2]))
-
-    @staticmethod
-    def int_to_physical_address(address):
-        return '{}.{}.{}'.format((address >> 12) & 0xf, (address >> 8) & 0xf, address & 0xff)
-
-    @staticmethod
-    def is_valid_physical_address(address):
-        assert isinstance(address, str)
-        try:
-            parts = [int(i) for i in address.split('.')]
-        except ValueError:
-            return False
-        if len(parts) is not 3:
-            return False
-        if (parts[0] < 1 or parts[0] > 15) or (parts[1] < 0 or parts[1] > 15):
-            return False
-        if parts[2] < 0 or parts[2] > 255:
-            return False
-        return True
-
-    @staticmethod
-    def is_valid_group_address(address):
-        assert isinstance(address, str)
-        try:
-            parts = [int(i) for i in address.split('/')]
-        except ValueError:
-            return False
-        if len(parts) < 2 or len(parts) > 3:
-            return False
-        if (parts[0] < 0 or parts[0] > 15) or (parts[1] < 0 or parts[1] > 15):
-            return False
-        if len(parts) is 3:
-            if parts[2] < 0 or parts[2] > 255:
-                return False
-        return True
+    physical_address_to_int = staticmethod(pack_knx_address)
+    int_to_physical_address = staticmethod(parse_knx_address)
+    is_valid_physical_address = staticmethod(is_valid_individual_address)
+    is_valid_group_address = staticmethod(is_valid_group_address)
 
 
 class BusResultSet(object):
@@ -152,7 +309,7 @@ class KnxTargetReport(object):
     def __init__(self, host, port, mac_address, knx_address, device_serial,
                  friendly_name, device_status, knx_medium, project_install_identifier,
                  supported_services, bus_devices, additional_individual_addresses=None,
-                 manufacturer=None):
+                 manufacturer=None, properties=None):
         self.host = host
         self.port = port
         self.mac_address = mac_address
@@ -166,6 +323,7 @@ class KnxTargetReport(object):
         self.bus_devices = bus_devices
         self.additional_individual_addresses = additional_individual_addresses or []
         self.manufacturer = manufacturer
+        self.properties = properties
 
     def __str__(self):
         return self.host
@@ -177,7 +335,7 @@ class KnxTargetReport(object):
 class KnxBusTargetReport(object):
     def __init__(self, address, medium=None, type=None, version=None,
                  device_serial=None, manufacturer=None, properties=None,
-                 device_state=None):
+                 device_state=None, status=None, duration=None):
         self.address = address
         self.medium = medium
         self.type = type
@@ -186,6 +344,10 @@ class KnxBusTargetReport(object):
         self.device_state = device_state
         self.manufacturer = manufacturer
         self.properties = properties
+        # How reading the device information ended ('complete', 'timeout',
+        # 'unauthorized') and how long it took, None if it was not read
+        self.status = status
+        self.duration = duration
 
     def __str__(self):
         return self.address
@@ -214,12 +376,14 @@ def print_knx_target(knx_target):
     o['Device Status'] = make_runstate_printable(knx_target.device_status)
     o['Project Install Identifier'] = knx_target.project_install_identifier
     o['Supported Services'] = knx_target.supported_services
+    if knx_target.properties:
+        o['Properties'] = knx_target.properties
     if knx_target.bus_devices:
         o['Bus Devices'] = []
         # Sort the device list based on KNX addresses
         x = {}
         for i in knx_target.bus_devices:
-            x[KnxMessage.pack_knx_address(str(i))] = i
+            x[pack_knx_address(str(i))] = i
         bus_devices = collections.OrderedDict(sorted(x.items()))
         for k, d in bus_devices.items():
             _d = {}
@@ -242,6 +406,8 @@ def print_knx_target(knx_target):
             if hasattr(d, 'version') and \
                     not isinstance(d.version, (type(None), type(False))):
                 _d[d.address]['Version'] = d.version
+            if getattr(d, 'status', None) and d.status != 'complete':
+                _d[d.address]['Status'] = d.status
             if hasattr(d, 'properties') and \
                     isinstance(d.properties, dict) and d.properties:
                 _d[d.address]['Properties'] = d.properties
@@ -1,53 +1,20 @@
 import json
 import socket
+import struct
+import pkgutil
 import collections
 
-def parse_knx_address(address):
-    """Parse physical/individual KNX address.
+try:
+    # Linux only, used to look up the address of network interfaces
+    import fcntl
+except ImportError:
+    fcntl = None
 
-    Address structure (A=Area, L=Line, B=Bus device):
-    --------------------
-    |AAAA|LLLL|BBBBBBBB|
-    --------------------
-    4 Bit|4 Bit| 8 Bit
+from knxmap.address import parse_knx_address, pack_knx_address, \
+    parse_knx_group_address, pack_knx_group_address
 
-    parse_knx_address(99999)
-    '8.6.159'
-    """
-    assert isinstance(address, int), 'Address should be an integer, got %s instead' % type(address)
-    return '{}.{}.{}'.format((address >> 12) & 0xf, (address >> 8) & 0xf, address & 0xff)
-
-
-def pack_knx_address(address):
-    """Pack physical/individual KNX address.
-
-    pack_knx_address('15.15.255')
-    65535
-    """
-    assert isinstance(address, str), 'Address should be a string, got %s instead' % type(address)
-    parts = address.split('.')
-    return (int(parts[0]) << 12) + (int(parts[1]) << 8) + (int(parts[2]))
-
-
-def parse_knx_group_address(address):
-    """Parse KNX group address.
-
-    parse_knx_group_address(12345)
-    '6/0/57'
-    """
-    assert isinstance(address, int), 'Address should be an integer, got %s instead' % type(address)
-    return '{}/{}/{}'.format((address >> 11) & 0x1f, (address >> 8) & 0x7, address & 0xff)
-
-
-def pack_knx_group_address(address):
-    """Pack KNX group address.
-
-    pack_knx_group_address('6/0/57')
-    12345
-    """
-    assert isinstance(address, str), 'Address should be a string, got %s instead' % type(address)
-    parts = address.split('/')
-    return (int(parts[0]) << 11) + (int(parts[1]) << 8) + (int(parts[2]))
+# Maps KNX manufacturer IDs to names, loaded on the first lookup
+_MANUFACTURERS = None
 
 
 def parse_knx_device_serial(address):
@@ -88,13 +55,47 @@ def unpack_ip_address(address):
     return socket.inet_aton(address)
 
 
+def get_interface_address(iface):
+    """Return the IPv4 address of the network interface iface, which
+    may also be given as an IPv4 address. Does not require superuser
+    privileges.
+
+    get_interface_address('lo')
+    '127.0.0.1'
+    """
+    try:
+        socket.inet_aton(iface)
+        return iface
+    except (OSError, TypeError):
+        pass
+    if not fcntl:
+        raise OSError('Interface names are not supported on this platform, '
+                      'use the address of {} instead'.format(iface))
+    with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as sock:
+        # SIOCGIFADDR
+        data = fcntl.ioctl(sock.fileno(), 0x8915,
+                           struct.pack('256s', str.encode(iface[:15])))
+    return socket.inet_ntoa(data[20:24])
+
+
+def load_manufacturers():
+    """Return a dict that maps KNX manufacturer IDs to names. The
+    table is read from the package data once, independent of the
+    working directory. If an ID occurs more than once, the first
+    entry wins."""
+    global _MANUFACTURERS
+    if _MANUFACTURERS is None:
+        data = json.loads(pkgutil.get_data('knxmap', 'data/manufacturers.json').decode('utf-8'))
+        manufacturers = {}
+        for m in data.get('manufacturers'):
+            manufacturers.setdefault(int(m.get('knx_manufacturer_id')), m.get('name'))
+        _MANUFACTURERS = manufacturers
+    return _MANUFACTURERS
+
+
 def get_manufacturer_by_id(mid):
     assert isinstance(mid, int)
-    with open('knxmap/data/manufacturers.json', 'rb') as f:
-        m = json.load(f)
-        for _m in m.get('manufacturers'):
-            if int(_m.get('knx_manufacturer_id')) == mid:
-                return _m.get('name')
+    return load_manufacturers().get(mid)
 
 
 def make_runstate_printable(runstate):
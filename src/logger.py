@@ -188,7 +188,7 @@ def main():
 
     if hasattr(args, 'targets'):
         targets = Targets(args.targets, args.port)
-        knxmap = KnxMap(targets=targets.targets,
+        knxmap = KnxMap(targets=targets,
                         max_workers=args.workers,
                         max_connections=args.connections,
                         medium=args.medium,
@@ -236,7 +236,7 @@ def main():
                 bus_target=bus_target.targets,
                 full_key_space=args.full_key_space))
         elif args.cmd == 'scan':
-            LOGGER.info('Scanning {} target(s)'.format(len(targets.targets)))
+            LOGGER.info('Scanning {} target(s)'.format(len(targets)))
             bus_targets = KnxTargets(args.bus_targets)
             loop.run_until_complete(knxmap.scan(
                 desc_timeout=args.timeout,
@@ -0,0 +1,14 @@
+import logging
+import os
+import sys
+
+# The package is not installed, import it from the source tree
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src'))
+
+from knxmap.misc import trace_packet, trace_incoming, trace_outgoing
+
+# The trace methods of loggers are added by setup_logger() of the command
+# line tools, which also configures a log file
+logging.Logger.trace = trace_packet
+logging.Logger.trace_incoming = trace_incoming
+logging.Logger.trace_outgoing = trace_outgoing
@@ -0,0 +1,74 @@
+"""Sample KNXnet/IP messages for the tests of the message layer.
+
+Every service type parse_message() handles has a well-formed sample,
+fuzz_datagrams() breaks them in all kinds of ways. The benchmarks of
+knxmap.messages.benchmark use the same samples."""
+import collections
+import random
+import struct
+
+from knxmap import KNX_MESSAGE_TYPES
+
+_HPAI = '0801c0a800010e57'
+_DIB_DEVICE_INFO = ('36010200' '1101' '0000' '00c501010203' 'e000170c' '00c501010203'
+                    '4b4e584d61702042656e63686d61726b' + '00' * 14)
+_DIB_SUPP_SVC_FAMILIES = '0a020201030104010501'
+_L_DATA_IND = '2900bce0110c0801010081'
+
+# Bodies of well-formed sample messages of every service type parse_message()
+# handles, the hot cases of a bus monitor or tunnel come first.
+SAMPLE_BODIES = collections.OrderedDict([
+    ('TUNNELLING_REQUEST', '04011700' + _L_DATA_IND),
+    ('TUNNELLING_ACK', '04011700'),
+    ('ROUTING_INDICATION', _L_DATA_IND),
+    ('ROUTING_LOST_MESSAGE', '04000005'),
+    ('ROUTING_BUSY', '060000640000'),
+    ('CONNECTIONSTATE_REQUEST', '0100' + _HPAI),
+    ('CONNECTIONSTATE_RESPONSE', '0100'),
+    ('DEVICE_CONFIGURATION_REQUEST', '04010500' + 'fb000b013510010000'),
+    ('DEVICE_CONFIGURATION_RESPONSE', '04010500'),
+    ('CONNECT_RESPONSE', '0100' + _HPAI + '04041101'),
+    ('DISCONNECT_REQUEST', '0100' + _HPAI),
+    ('DISCONNECT_RESPONSE', '0100'),
+    ('DESCRIPTION_RESPONSE', _DIB_DEVICE_INFO + _DIB_SUPP_SVC_FAMILIES),
+    ('SEARCH_RESPONSE', _HPAI + _DIB_DEVICE_INFO + _DIB_SUPP_SVC_FAMILIES),
+    ('REMOTE_DIAGNOSTIC_REQUEST', _HPAI + '0802000054ffa052'),
+    ('REMOTE_DIAGNOSTIC_RESPONSE', _HPAI + _DIB_DEVICE_INFO + _DIB_SUPP_SVC_FAMILIES),
+])
+
+
+def sample_messages():
+    """Return the sample messages, including their KNXnet/IP
+    header, as an ordered dict of service type names to bytes."""
+    messages = collections.OrderedDict()
+    for name, body in SAMPLE_BODIES.items():
+        body = bytes.fromhex(body)
+        messages[name] = struct.pack('!BBHH', 0x06, 0x10, KNX_MESSAGE_TYPES.get(name),
+                                     6 + len(body)) + body
+    return messages
+
+
+def fuzz_datagrams(messages, count=10000, seed=0):
+    """Generate count broken datagrams from messages, a list of valid
+    messages: truncated ones, ones with flipped bits, with a wrong total
+    length or with a random body behind a valid header."""
+    rng = random.Random(seed)
+    service_types = sorted(KNX_MESSAGE_TYPES.values())
+    for _ in range(count):
+        message = bytearray(rng.choice(messages))
+        mutation = rng.randrange(5)
+        if mutation == 0:
+            message = message[:rng.randrange(len(message))]
+        elif mutation == 1:
+            for _ in range(rng.randrange(1, 4)):
+                position = rng.randrange(len(message))
+                message[position] ^= 1 << rng.randrange(8)
+        elif mutation == 2:
+            struct.pack_into('!H', message, 4, rng.randrange(0x10000))
+        elif mutation == 3:
+            body = bytes(rng.randrange(256) for _ in range(rng.randrange(64)))
+            message = bytearray(struct.pack('!BBHH', 0x06, 0x10, rng.choice(service_types),
+                                            6 + len(body)) + body)
+        else:
+            message = bytearray(rng.randrange(256) for _ in range(rng.randrange(16)))
+        yield bytes(message)
@@ -0,0 +1,42 @@
+"""Tests of the checkpoints of the KnxAuthKeyBruteforcer."""
+import asyncio
+
+from knxmap.bus.bruteforce import KeySpace, KnxAuthKeyBruteforcer
+
+
+def _bruteforcer(loop, keys, checkpoint):
+    return KnxAuthKeyBruteforcer([], '1.1.5', keys, loop=loop, checkpoint=checkpoint)
+
+
+def test_checkpoint_with_key_is_returned(tmp_path):
+    loop = asyncio.new_event_loop()
+    checkpoint = str(tmp_path / 'checkpoint.json')
+    keys = KeySpace([0xffffffff, 0x12345678], start=0, end=0xff)
+    first = _bruteforcer(loop, keys, checkpoint)
+    first.found = (0x42, 0)
+    first.next_position = 70
+    first.save_checkpoint()
+    second = _bruteforcer(loop, keys, checkpoint)
+    assert loop.run_until_complete(second.run()) == (0x42, 0)
+    assert second.tested == 0
+    loop.close()
+
+
+def test_checkpoint_of_other_wordlist_is_ignored(tmp_path):
+    loop = asyncio.new_event_loop()
+    checkpoint = str(tmp_path / 'checkpoint.json')
+    first = _bruteforcer(loop, KeySpace([1, 2], start=0, end=0xff), checkpoint)
+    first.next_position = 70
+    first.save_checkpoint()
+    assert _bruteforcer(loop, KeySpace([1, 2], start=0, end=0xff),
+                        checkpoint).load_checkpoint() == (70, None)
+    # Same count of keys in another order
+    assert _bruteforcer(loop, KeySpace([2, 1], start=0, end=0xff),
+                        checkpoint).load_checkpoint() == (0, None)
+    loop.close()
+
+
+def test_keyspace_skips_duplicate_and_wordlist_keys():
+    keyspace = KeySpace(wordlist=[7, 3, 7, 1, 3], start=0, end=4)
+    assert keyspace.wordlist == [7, 3, 1]
+    assert [keyspace.key(p) for p in keyspace.positions()] == [7, 3, 1, 0, 2, 4]
@@ -0,0 +1,167 @@
+"""Round-trip and fuzz tests of the message layer.
+
+Every message class that can be packed is packed, parsed again and
+compared with the values it was built from, and parse_message() is
+fed truncated, bit flipped and random datagrams."""
+import logging
+import struct
+
+import pytest
+
+from knxmap.data.constants import CEMI_APCI_TYPES, CEMI_TPCI_TYPES
+from knxmap.messages import parse_message, MESSAGE_CLASSES, KnxSearchRequest, \
+    KnxDescriptionRequest, KnxConnectRequest, KnxConnectionStateRequest, \
+    KnxConnectionStateResponse, KnxDisconnectRequest, KnxDisconnectResponse, \
+    KnxTunnellingRequest, KnxTunnellingAck, KnxDeviceConfigurationRequest, \
+    KnxDeviceConfigurationAck, KnxRemoteDiagnosticRequest, KnxMessage
+from message_samples import sample_messages, fuzz_datagrams
+from knxmap import _LAYER_TYPES
+
+_SOCKNAME = ('192.168.0.10', 3671)
+_HPAI = {'ip_address': _SOCKNAME[0], 'port': _SOCKNAME[1]}
+# 1.1.12 and 1/1/1
+_KNX_DESTINATION = 0x110c
+_KNX_GROUP_DESTINATION = 0x0901
+
+
+def _tunnelling_request(function, knx_destination='1.1.12', **kwargs):
+    request = KnxTunnellingRequest(sockname=_SOCKNAME, communication_channel=5,
+                                   knx_source='0.0.0', knx_destination=knx_destination,
+                                   sequence_count=3)
+    getattr(request, function)(**kwargs)
+    return request
+
+
+def _hpai(prefix='hpai'):
+    return {'{}.{}'.format(prefix, k): v for k, v in _HPAI.items()}
+
+
+def _tunnelling(tpci_type, apci_type=None, knx_destination=_KNX_DESTINATION, **fields):
+    expected = {'communication_channel': 5,
+                'sequence_counter': 3,
+                'cemi.message_code': 0x11,  # L_Data.req
+                'cemi.knx_source': 0,
+                'cemi.knx_destination': knx_destination,
+                'cemi.tpci.tpci_type': CEMI_TPCI_TYPES[tpci_type]}
+    if apci_type:
+        expected['cemi.apci.apci_type'] = CEMI_APCI_TYPES[apci_type]
+    expected.update(fields)
+    return expected
+
+
+# (name, builder, expected fields of the parsed message). Fields are
+# dotted paths of attributes and dict keys of the parsed message.
+ROUNDTRIP_CASES = [
+    ('SEARCH_REQUEST',
+     lambda: KnxSearchRequest(sockname=_SOCKNAME),
+     _hpai()),
+    ('DESCRIPTION_REQUEST',
+     lambda: KnxDescriptionRequest(sockname=_SOCKNAME),
+     _hpai()),
+    ('CONNECT_REQUEST',
+     lambda: KnxConnectRequest(sockname=_SOCKNAME),
+     dict(_hpai(), **dict(_hpai('data_endpoint'), **{
+         'connection_request_information.connection_type': 0x04,
+         'connection_request_information.knx_layer': _LAYER_TYPES['TUNNEL_LINKLAYER']}))),
+    ('CONNECTIONSTATE_REQUEST',
+     lambda: KnxConnectionStateRequest(sockname=_SOCKNAME, communication_channel=5),
+     dict(_hpai(), communication_channel=5)),
+    ('CONNECTIONSTATE_RESPONSE',
+     lambda: KnxConnectionStateResponse(communication_channel=5),
+     {'communication_channel': 5, 'status': 0}),
+    ('DISCONNECT_REQUEST',
+     lambda: KnxDisconnectRequest(sockname=_SOCKNAME, communication_channel=5),
+     dict(_hpai(), communication_channel=5)),
+    ('DISCONNECT_RESPONSE',
+     lambda: KnxDisconnectResponse(communication_channel=5),
+     {'communication_channel': 5, 'status': 0}),
+    ('TUNNELLING_ACK',
+     lambda: KnxTunnellingAck(communication_channel=5, sequence_count=7),
+     {'communication_channel': 5, 'sequence_counter': 7, 'status': 0}),
+    ('DEVICE_CONFIGURATION_REQUEST',
+     lambda: KnxDeviceConfigurationRequest(sockname=_SOCKNAME, communication_channel=5,
+                                           sequence_count=2, property=0x0b),
+     {'communication_channel': 5, 'sequence_count': 2, 'message_code': 0xfc,
+      'object_type': 0, 'object_instance': 1, 'property': 0x0b, 'num_elements': 1,
+      'start_index': 1}),
+    ('DEVICE_CONFIGURATION_RESPONSE',
+     lambda: KnxDeviceConfigurationAck(communication_channel=5, sequence_count=2),
+     {'communication_channel': 5, 'sequence_counter': 2, 'status': 0}),
+    ('REMOTE_DIAGNOSTIC_REQUEST',
+     lambda: KnxRemoteDiagnosticRequest(sockname=_SOCKNAME),
+     _hpai('body')),
+    ('T_Connect',
+     lambda: _tunnelling_request('tpci_unnumbered_control_data', ucd_type='CONNECT'),
+     _tunnelling('UCD')),
+    ('T_Ack',
+     lambda: _tunnelling_request('tpci_numbered_control_data', ncd_type='ACK', sequence=5),
+     _tunnelling('NCD', **{'cemi.tpci.sequence': 5})),
+    ('A_DeviceDescriptor_Read',
+     lambda: _tunnelling_request('apci_device_descriptor_read', sequence=2),
+     _tunnelling('NDP', 'A_DeviceDescriptor_Read', **{'cemi.tpci.sequence': 2})),
+    ('A_Authorize_Request',
+     lambda: _tunnelling_request('apci_authorize_request', sequence=1, key=0x11223344),
+     _tunnelling('NDP', 'A_Authorize_Request', **{'cemi.data': b'\x00\x11\x22\x33\x44'})),
+    ('A_PropertyValue_Read',
+     lambda: _tunnelling_request('apci_property_value_read', sequence=1, property_id=0x0b),
+     _tunnelling('NDP', 'A_PropertyValue_Read', **{'cemi.data': b'\x00\x0b\x10\x01'})),
+    ('A_Memory_Read',
+     lambda: _tunnelling_request('apci_memory_read', sequence=1, memory_address=0x0104,
+                                 read_count=2),
+     _tunnelling('NDP', 'A_Memory_Read', **{'cemi.apci.apci_data': 2,
+                                            'cemi.data': b'\x01\x04'})),
+    ('A_GroupValue_Write',
+     lambda: _tunnelling_request('apci_group_value_write', knx_destination='1/1/1', value=1),
+     _tunnelling('UDP', 'A_GroupValue_Write', knx_destination=_KNX_GROUP_DESTINATION,
+                 **{'cemi.extended_control_field.address_type': 1,
+                    'cemi.apci.apci_data': 1})),
+]
+
+
+def _field(message, path):
+    value = message
+    for name in path.split('.'):
+        value = value[name] if isinstance(value, dict) else getattr(value, name)
+    return value
+
+
+def _parse(data, cls):
+    # Messages that a client only sends are not handled by parse_message()
+    if struct.unpack_from('!H', data, 2)[0] in MESSAGE_CLASSES:
+        return parse_message(data)
+    return cls(message=data)
+
+
+@pytest.mark.parametrize('name,builder,expected', ROUNDTRIP_CASES,
+                         ids=[case[0] for case in ROUNDTRIP_CASES])
+def test_roundtrip(name, builder, expected):
+    message = builder()
+    data = bytes(message.get_message())
+    parsed = _parse(data, type(message))
+    assert type(parsed) is type(message)
+    assert parsed.header.service_type == message.header.service_type
+    assert parsed.header.total_length == len(data)
+    for path, value in sorted(expected.items()):
+        actual = _field(parsed, path)
+        if isinstance(actual, (bytearray, memoryview)):
+            actual = bytes(actual)
+        assert actual == value, path
+
+
+@pytest.mark.parametrize('name', list(sample_messages()))
+def test_sample_messages(name):
+    message = parse_message(sample_messages()[name])
+    assert isinstance(message, KnxMessage)
+    assert message.header.total_length == len(sample_messages()[name])
+
+
+def test_fuzz():
+    """Broken datagrams are parsed to a message or None, never raise."""
+    # Broken messages are logged with their tracebacks by the decoders
+    logging.disable(logging.CRITICAL)
+    try:
+        for data in fuzz_datagrams(list(sample_messages().values()), count=10000):
+            message = parse_message(data)
+            assert message is None or isinstance(message, KnxMessage), data.hex()
+    finally:
+        logging.disable(logging.NOTSET)
@@ -0,0 +1,48 @@
+"""Tests of the throughput estimate of the ProgressMeter."""
+import knxcommon.metrics
+from knxcommon.metrics import ProgressMeter
+
+
+class FakeTime(object):
+    def __init__(self):
+        self.now = 1000.0
+
+    def time(self):
+        return self.now
+
+
+def _meter(monkeypatch, **kwargs):
+    clock = FakeTime()
+    monkeypatch.setattr(knxcommon.metrics.time, 'time', clock.time)
+    return ProgressMeter('test', **kwargs), clock
+
+
+def test_rate_of_bursts(monkeypatch):
+    """Two rows 1ms apart once per second are 2 rows/s."""
+    meter, clock = _meter(monkeypatch)
+    for _ in range(120):
+        clock.now += 0.999
+        meter.update(1)
+        clock.now += 0.001
+        meter.update(1)
+    assert abs(meter.rate - 2.0) < 0.1
+
+
+def test_rate_follows_speed_changes(monkeypatch):
+    meter, clock = _meter(monkeypatch, tau=10)
+    for _ in range(100):
+        clock.now += 0.1
+        meter.update(10)
+    for _ in range(600):
+        clock.now += 0.1
+        meter.update(1)
+    assert abs(meter.rate - 10.0) < 0.5
+
+
+def test_eta_before_the_first_sample(monkeypatch):
+    meter, clock = _meter(monkeypatch, total=100)
+    clock.now += 0.5
+    meter.update(10)
+    assert meter.rate is None
+    assert meter.current_rate == 20.0
+    assert meter.eta == 4.5
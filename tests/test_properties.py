@@ -0,0 +1,107 @@
+"""Tests of the property reads from gateways and the cache of their results."""
+import asyncio
+import types
+
+from knxmap.bus.tunnel import KnxTunnelConnection
+from knxmap.core import KnxMap
+from knxmap.messages import parse_message
+
+from message_samples import sample_messages
+
+_TARGET = ('127.0.0.1', 3671)
+# PID_MANUFACTURER_ID of the device object
+_MANUFACTURER_ID = (0, 12)
+# PID_ADDITIONAL_INDIVIDUAL_ADDRESSES of the KNXnet/IP parameter object
+_ADDITIONAL_ADDRESSES = (11, 53)
+
+
+def _read_properties(responses, properties, cache):
+    """Run configuration_read_properties() with a _configuration_pipeline
+    that answers each request with responses(request). Return the results
+    and the list of requests of each call of the pipeline."""
+    loop = asyncio.new_event_loop()
+    calls = []
+
+    @asyncio.coroutine
+    def pipeline(target, requests, window):
+        requests = list(requests)
+        calls.append(requests)
+        return {r: responses(r) for r in requests}
+
+    try:
+        protocol = KnxTunnelConnection(asyncio.Future(loop=loop), loop=loop)
+        protocol._configuration_pipeline = pipeline
+        results = loop.run_until_complete(
+            protocol.configuration_read_properties(_TARGET, properties, cache=cache))
+    finally:
+        loop.close()
+    return results, calls
+
+
+def _con(data):
+    return types.SimpleNamespace(data=data)
+
+
+def test_empty_property_is_cached():
+    cache = {}
+    results, calls = _read_properties(lambda r: _con(b'\x00\x00'), [_MANUFACTURER_ID], cache)
+    assert results[_MANUFACTURER_ID] is False
+    assert cache == {_MANUFACTURER_ID: False}
+    # No elements are read
+    assert calls[1] == []
+
+
+def test_rejected_count_read_is_cached():
+    cache = {}
+    results, _ = _read_properties(lambda r: None, [_MANUFACTURER_ID], cache)
+    assert results[_MANUFACTURER_ID] is False
+    assert cache == {_MANUFACTURER_ID: False}
+
+
+def test_timeout_of_a_chunk_is_not_cached():
+    """A property with 20 elements is read in two requests, if the second
+    one is not answered the property is read again next time."""
+    def responses(request):
+        object_type, property, _, num_elements, start_index = request
+        if start_index == 0:
+            return _con(b'\x00\x14')
+        if start_index == 1:
+            return _con(b'\x11\x01' * num_elements)
+        return False
+
+    cache = {}
+    results, calls = _read_properties(responses, [_ADDITIONAL_ADDRESSES], cache)
+    assert [r[3:] for r in calls[1]] == [(15, 1), (5, 16)]
+    assert results[_ADDITIONAL_ADDRESSES] is False
+    assert cache == {}
+
+
+def test_cached_property_is_not_read():
+    cache = {_MANUFACTURER_ID: b'\x00\x83'}
+    results, calls = _read_properties(lambda r: False, [_MANUFACTURER_ID], cache)
+    assert results[_MANUFACTURER_ID] == b'\x00\x83'
+    assert all(requests == [] for requests in calls)
+
+
+def test_gateway_report_from_cache_does_not_connect():
+    """If all properties of a gateway are cached by its serial number,
+    no DEVICE_MGMT_CONNECTION is established for them."""
+    loop = asyncio.new_event_loop()
+
+    @asyncio.coroutine
+    def configuration_read(target, properties, cache=None):
+        raise AssertionError('connected to {}'.format(target))
+
+    try:
+        knxmap = KnxMap(loop=loop, testing=True)
+        knxmap.configuration_reads = True
+        knxmap._configuration_read = configuration_read
+        knxmap.property_cache['00C501010203'] = {_MANUFACTURER_ID: b'\x00\x83',
+                                                 _ADDITIONAL_ADDRESSES: False}
+        response = parse_message(sample_messages()['DESCRIPTION_RESPONSE'])
+        loop.run_until_complete(knxmap._knx_gateway_report(_TARGET, response))
+    finally:
+        loop.close()
+    knx_gateway, = knxmap.knx_gateways
+    assert knx_gateway.manufacturer == 'MDT technologies'
+    assert knx_gateway.additional_individual_addresses == []
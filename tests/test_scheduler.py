@@ -0,0 +1,67 @@
+"""Tests of the per-gateway budgets of the ScanScheduler."""
+import asyncio
+
+from knxmap.scheduler import ScanScheduler
+
+
+def _run(coroutine):
+    loop = asyncio.new_event_loop()
+    try:
+        return loop.run_until_complete(coroutine(loop))
+    finally:
+        loop.close()
+
+
+def test_sequential_requests_are_rate_limited():
+    """One request at a time is spaced at 1 / gateway_rate, even
+    though the limiter is idle after every release."""
+    @asyncio.coroutine
+    def requests(loop):
+        scheduler = ScanScheduler(loop=loop, gateway_rate=20)
+        start = loop.time()
+        for _ in range(10):
+            yield from scheduler.acquire('10.0.0.1')
+            scheduler.release('10.0.0.1')
+        return loop.time() - start
+
+    # The first request is sent at once, the other nine 50ms apart
+    assert _run(requests) >= 9 / 20.0 * 0.95
+
+
+def test_limiter_is_dropped_when_refilled():
+    @asyncio.coroutine
+    def requests(loop):
+        scheduler = ScanScheduler(loop=loop, gateway_rate=20)
+        yield from scheduler.acquire('10.0.0.1')
+        scheduler.release('10.0.0.1')
+        kept = '10.0.0.1' in scheduler.gateways
+        yield from asyncio.sleep(0.1)
+        yield from scheduler.acquire('10.0.0.1')
+        scheduler.release('10.0.0.1')
+        return kept, '10.0.0.1' in scheduler.gateways
+
+    # Kept while the bucket refills, the second request empties it again
+    assert _run(requests) == (True, True)
+
+
+def test_gateway_window_survives_idle_release():
+    @asyncio.coroutine
+    def requests(loop):
+        scheduler = ScanScheduler(loop=loop, gateway_window=1)
+        scheduler.gateway('10.0.0.1', window=4)
+        yield from scheduler.acquire('10.0.0.1')
+        scheduler.release('10.0.0.1')
+        dropped = '10.0.0.1' not in scheduler.gateways
+        return dropped, scheduler.gateway('10.0.0.1').max_window
+
+    assert _run(requests) == (True, 4)
+
+
+def test_idle_limiters_are_pruned():
+    scheduler = ScanScheduler(loop=asyncio.new_event_loop())
+    busy = scheduler.gateway('10.0.0.1')
+    busy.in_flight = 1
+    for i in range(2, 200):
+        scheduler.gateway('10.0.0.{}'.format(i))
+    assert len(scheduler.gateways) < 100
+    assert scheduler.gateways['10.0.0.1'] is busy
@@ -0,0 +1,79 @@
+"""Tests of the ScanStore and the target ranges it records."""
+import asyncio
+import types
+
+from knxmap.core import KnxMap
+from knxmap.store import ScanStore
+from knxmap.targets import Targets, TargetRanges, KnxTargetReport, KnxBusTargetReport, \
+    print_knx_target
+
+
+def _gateway(host):
+    return KnxTargetReport(host=host, port=3671, mac_address='00:c5:01:01:02:03',
+                           knx_address='1.1.0', device_serial='00c501010203',
+                           friendly_name=b'Gateway\x00\x00', device_status={'PROG_MODE': 0},
+                           knx_medium=2, project_install_identifier=0,
+                           supported_services=['KNXnet/IP Core'], bus_devices=[])
+
+
+def test_target_ranges_merge_and_difference():
+    ranges = TargetRanges.from_targets([('10.0.0.%d' % i, 3671) for i in (5, 3, 4, 9)])
+    assert list(ranges) == [('10.0.0.3', '10.0.0.5', 3671), ('10.0.0.9', '10.0.0.9', 3671)]
+    assert len(ranges) == 4
+    assert ('10.0.0.4', 3671) in ranges
+    assert ('10.0.0.4', 3672) not in ranges
+    assert ('10.0.0.6', 3671) not in ranges
+    hole = TargetRanges.from_targets([('10.0.0.4', 3671)])
+    assert list(ranges.difference(hole)) == [('10.0.0.3', '10.0.0.3', 3671),
+                                             ('10.0.0.5', '10.0.0.5', 3671),
+                                             ('10.0.0.9', '10.0.0.9', 3671)]
+
+
+def test_silent_targets_are_stored_as_ranges(tmp_path):
+    store = ScanStore(str(tmp_path / 'scan.db'))
+    targets = Targets('10.0.0.0/16')
+    store.record_gateways(TargetRanges.from_targets(targets), [_gateway('10.0.1.1')])
+    assert store.con.execute('SELECT COUNT(*) FROM gateways').fetchone() == (1,)
+    assert store.con.execute('SELECT COUNT(*) FROM gateway_sweeps').fetchone() == (1,)
+    fresh = store.fresh_gateways(3600)
+    assert len(fresh) == len(targets)
+    assert ('10.0.200.7', 3671) in fresh
+    assert ('10.1.0.1', 3671) not in fresh
+
+
+def test_gone_gateway_is_reported(tmp_path):
+    store = ScanStore(str(tmp_path / 'scan.db'))
+    targets = [('10.0.0.1', 3671), ('10.0.0.2', 3671)]
+    store.record_gateways(targets, [_gateway('10.0.0.1'), _gateway('10.0.0.2')])
+    diff = store.record_gateways(targets, [_gateway('10.0.0.2')])
+    assert diff.gone == ['10.0.0.1:3671']
+    assert list(store.gateways()) == [('10.0.0.2', 3671)]
+
+
+def test_stored_gateway_reports_can_be_printed(tmp_path, capsys):
+    store = ScanStore(str(tmp_path / 'scan.db'))
+    store.record_gateways([('10.0.0.1', 3671)], [_gateway('10.0.0.1')])
+    assert store.gateway_reports([('10.0.0.2', 3671)]) == []
+    knx_gateway, = store.gateway_reports([('10.0.0.1', 3671)])
+    assert knx_gateway.friendly_name == b'Gateway\x00\x00'
+    print_knx_target(knx_gateway)
+    assert 'Gateway' in capsys.readouterr().out
+
+
+def test_fresh_bus_targets_are_reported_without_connecting(tmp_path):
+    store = ScanStore(str(tmp_path / 'scan.db'))
+    store.record_bus_devices('10.0.0.1', ['1.1.1', '1.1.2'],
+                             [KnxBusTargetReport('1.1.2', type=1)])
+    loop = asyncio.new_event_loop()
+    try:
+        knxmap = KnxMap(loop=loop, testing=True)
+        knxmap.store = store
+        knxmap.rescan_age = 3600
+        knx_gateway = types.SimpleNamespace(host='10.0.0.1', port=3671,
+                                            additional_individual_addresses=[],
+                                            bus_devices=[])
+        loop.run_until_complete(knxmap._bus_scan(knx_gateway, ['1.1.1', '1.1.2']))
+    finally:
+        loop.close()
+    assert [(d.address, d.type) for d in knx_gateway.bus_devices] == [('1.1.2', 1)]
+    assert '10.0.0.1' not in knxmap.bus_connections
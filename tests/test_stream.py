@@ -0,0 +1,84 @@
+"""Tests of the incremental TP1 and USB HID frame parsers."""
+import pytest
+
+from knxmap.messages.stream import Tp1StreamParser, UsbHidStreamParser
+from knxmap.messages.tp import DataRequest
+
+EMI1 = 0x01
+EMI2 = 0x02
+CEMI = 0x03
+# Control field, source 1.1.12, destination 1/0/1, NPCI with length 1, TPDU
+L_DATA = bytes.fromhex('bc110c0801e10081')
+
+
+def hid_report(emi_id, body):
+    """A single USB HID report with a complete KNX tunnel frame."""
+    data = bytes([0x00, 0x08, len(body) >> 8, len(body) & 0xff, 0x01, emi_id, 0x00, 0x00]) + body
+    report = bytes([0x01, 0x03, len(data)]) + data
+    return report + bytes(64 - len(report))
+
+
+def tp1_frame(frame):
+    frame = bytearray(frame)
+    frame.append(DataRequest.checksum(frame) ^ 0xff)
+    return bytes(frame)
+
+
+@pytest.mark.parametrize('emi_id,message_code', [(EMI1, 0x49), (EMI1, 0x4e), (EMI1, 0x11),
+                                                 (EMI2, 0x29), (EMI2, 0x2e), (EMI2, 0x11)])
+def test_hid_l_data(emi_id, message_code):
+    parser = UsbHidStreamParser()
+    frames = list(parser.feed(hid_report(emi_id, bytes([message_code]) + L_DATA)))
+    assert frames == [(emi_id, message_code, L_DATA)]
+
+
+@pytest.mark.parametrize('emi_id,message_code', [(EMI1, 0x49), (EMI1, 0x4e),
+                                                 (EMI2, 0x29), (EMI2, 0x2e)])
+def test_hid_truncated_l_data(emi_id, message_code):
+    """L_Data frames shorter than their NPCI length are dropped."""
+    parser = UsbHidStreamParser()
+    assert list(parser.feed(hid_report(emi_id, bytes([message_code]) + L_DATA[:-1]))) == []
+    assert parser.skipped == 1
+
+
+def test_hid_other_emi_is_not_checked():
+    parser = UsbHidStreamParser()
+    body = bytes([0x29]) + L_DATA[:-1]
+    assert list(parser.feed(hid_report(CEMI, body))) == [(CEMI, 0x29, L_DATA[:-1])]
+
+
+def test_hid_frame_over_several_reports():
+    body = bytes([0x29]) + L_DATA + bytes(range(70))
+    body = body[:7] + bytes([0xe0 | 15]) + body[8:]
+    data = bytes([0x00, 0x08, 0x00, len(body), 0x01, EMI2, 0x00, 0x00]) + body
+    reports = [bytes([0x01, 0x01, 61]) + data[:61], bytes([0x01, 0x02, len(data) - 61]) + data[61:]]
+    parser = UsbHidStreamParser()
+    assert list(parser.frames(reports)) == [(EMI2, 0x29, body[1:])]
+
+
+def test_tp1_resync():
+    frame = tp1_frame(L_DATA)
+    parser = Tp1StreamParser()
+    capture = b'\xbc\x00' + frame + frame
+    frames = [f for start in range(0, len(capture), 3)
+              for f in parser.feed(capture[start:start + 3])]
+    assert frames == [frame, frame]
+
+
+def test_tp1_feed_without_consuming_the_result():
+    """Frames of a chunk whose result is ignored are parsed all the same."""
+    frame = tp1_frame(L_DATA)
+    parser = Tp1StreamParser()
+    parser.feed(frame[:4])
+    parser.feed(frame[4:] + frame)
+    assert parser.frame_count == 2
+    assert parser.feed(frame) == [frame]
+
+
+def test_hid_feed_without_consuming_the_result():
+    body = bytes([0x29]) + L_DATA + bytes(range(70))
+    body = body[:7] + bytes([0xe0 | 15]) + body[8:]
+    data = bytes([0x00, 0x08, 0x00, len(body), 0x01, EMI2, 0x00, 0x00]) + body
+    parser = UsbHidStreamParser()
+    parser.feed(bytes([0x01, 0x01, 61]) + data[:61])
+    assert parser.feed(bytes([0x01, 0x02, len(data) - 61]) + data[61:]) == [(EMI2, 0x29, body[1:])]
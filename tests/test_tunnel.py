@@ -0,0 +1,207 @@
+"""Tests of the request matching of KnxTunnelConnection and of the bus
+scan over it, with a fake transport in place of the gateway."""
+import asyncio
+import collections
+import struct
+import types
+
+from knxmap.bus.tunnel import KnxTunnelConnection, PendingRequests
+from knxmap.core import KnxMap
+from knxmap.data.constants import CEMI_TPCI_TYPES
+from knxmap.messages import parse_message
+
+from message_samples import sample_messages
+
+_GATEWAY = ('127.0.0.1', 3671)
+_SOURCE = '1.1.250'
+_TARGET = '1.1.5'
+
+
+class FakeTransport(object):
+    """Collects the datagrams sent by the protocol and calls
+    on_send with each TUNNELLING_REQUEST."""
+    def __init__(self, on_send=None):
+        self.sent = []
+        self.on_send = on_send
+
+    def sendto(self, data, addr=None):
+        self.sent.append(bytes(data))
+        if self.on_send and data[2:4] == b'\x04\x20':
+            self.on_send(bytes(data))
+
+    def get_extra_info(self, name, default=None):
+        return {'peername': _GATEWAY, 'sockname': ('127.0.0.1', 50000)}.get(name, default)
+
+    def close(self):
+        pass
+
+
+def _connection(loop, on_send=None, ndp_defer_time=0.5, tunnel_timeout=0.2):
+    protocol = KnxTunnelConnection(asyncio.Future(loop=loop), loop=loop, knx_source=_SOURCE,
+                                   ndp_defer_time=ndp_defer_time, tunnel_timeout=tunnel_timeout)
+    protocol.connection_made(FakeTransport(on_send))
+    protocol.datagram_received(sample_messages()['CONNECT_RESPONSE'], _GATEWAY)
+    protocol.tpci_seq_counts[_TARGET] = 0
+    return protocol
+
+
+def _tunnelling_request(cemi, sequence_counter=0):
+    body = bytes([4, 1, sequence_counter, 0]) + cemi
+    return struct.pack('!BBHH', 0x06, 0x10, 0x0420, 6 + len(body)) + body
+
+
+def _tunnelling_ack(data):
+    """The TUNNELLING_ACK of the TUNNELLING_REQUEST data."""
+    return bytes([0x06, 0x10, 0x04, 0x21, 0x00, 0x0a, 0x04, data[7], data[8], 0x00])
+
+
+def _memory_response(tpci_sequence, memory_address, data):
+    """A L_Data.ind with an A_Memory_Response from the target."""
+    tpdu = bytes([0x42 | tpci_sequence << 2, 0x40 | len(data)]) + \
+        struct.pack('!H', memory_address) + data
+    return _tunnelling_request(bytes([0x29, 0x00, 0xb0, 0x60, 0x11, 0x05, 0x11, 0xfa,
+                                      len(tpdu) - 1]) + tpdu)
+
+
+def _l_data_con(data):
+    """The positive L_Data.con of the TUNNELLING_REQUEST data."""
+    cemi = bytearray(data[10:])
+    cemi[0] = 0x2e
+    return _tunnelling_request(bytes(cemi))
+
+
+def _is_memory_read(data):
+    message = parse_message(data)
+    return message.cemi.message_code == 0x11 and message.cemi.apci is not None and \
+        message.cemi.tpci.tpci_type == CEMI_TPCI_TYPES.get('NDP')
+
+
+def _t_acks(protocol):
+    """The TPCI sequence numbers of all T_ACKs that have been sent."""
+    sequences = []
+    for data in protocol.transport.sent:
+        if data[2:4] != b'\x04\x20':
+            continue
+        cemi = parse_message(data).cemi
+        if cemi.tpci.tpci_type == CEMI_TPCI_TYPES.get('NCD'):
+            sequences.append(cemi.tpci.sequence)
+    return sequences
+
+
+def test_pending_request_deadline_is_extended():
+    loop = asyncio.new_event_loop()
+    try:
+        pending = PendingRequests(loop)
+        future = pending.add(_TARGET, 'A_Memory_Response', 0.05)
+        other = pending.add('1.1.6', 'A_Memory_Response', 0.1)
+        pending.extend(_TARGET, 'A_Memory_Response', 0.3)
+        loop.run_until_complete(asyncio.sleep(0.2))
+        # The other request expired on its deadline, the extended one did not
+        assert other.result() is False
+        assert not future.done()
+        assert (_TARGET, 'A_Memory_Response') in pending
+        loop.run_until_complete(asyncio.wait_for(future, 1))
+        assert future.result() is False
+        assert len(pending) == 0
+    finally:
+        loop.close()
+
+
+def test_late_memory_response_is_acknowledged():
+    """A late A_Memory_Response for another address is acknowledged with
+    its own TPCI sequence number, the response to the request is returned."""
+    loop = asyncio.new_event_loop()
+
+    def gateway(data):
+        if _is_memory_read(data):
+            # The response to an earlier read of 0x0060 arrives first
+            loop.call_soon(protocol.datagram_received,
+                           _memory_response(15, 0x0060, b'\x01'), _GATEWAY)
+            loop.call_later(0.05, protocol.datagram_received,
+                            _memory_response(0, 0x0104, b'\xaa\xbb'), _GATEWAY)
+
+    try:
+        protocol = _connection(loop, gateway)
+        data = loop.run_until_complete(
+            asyncio.wait_for(protocol.apci_memory_read(_TARGET, 0x0104, 2), 5))
+        loop.run_until_complete(asyncio.sleep(0))
+    finally:
+        loop.close()
+    assert data == b'\xaa\xbb'
+    # The late response and the one to the request have been acknowledged
+    assert _t_acks(protocol) == [15, 0]
+    assert protocol.tpci_seq_counts[_TARGET] == 1
+
+
+def test_l_data_con_sets_the_response_deadline():
+    """After the L_Data.con of a request its response has to arrive within
+    ndp_defer_time, the earlier deadline of the request is skipped."""
+    loop = asyncio.new_event_loop()
+
+    def gateway(data):
+        # The response to the read never arrives
+        delay = 0.05 if _is_memory_read(data) else 0
+        loop.call_later(delay, protocol.datagram_received, _l_data_con(data), _GATEWAY)
+
+    try:
+        protocol = _connection(loop, gateway, ndp_defer_time=0.1, tunnel_timeout=2)
+        start = loop.time()
+        data = loop.run_until_complete(
+            asyncio.wait_for(protocol.apci_memory_read(_TARGET, 0x0104, 2), 5))
+        duration = loop.time() - start
+    finally:
+        loop.close()
+    assert data is False
+    assert 0.15 <= duration < 1
+    assert len(protocol.pending) == 0
+
+
+
+def test_pipelined_bus_scan_connects_once():
+    """Every target of a line is sent a single T_Connect, the device
+    descriptors of the alive ones are read over that connection."""
+    alive = {0x1105, 0x1140, 0x11fe}
+    connects = collections.Counter()
+    loop = asyncio.new_event_loop()
+
+    def gateway(data):
+        loop.call_soon(protocol.datagram_received, _tunnelling_ack(data), _GATEWAY)
+        cemi = data[10:]
+        destination = struct.unpack('!H', cemi[6:8])[0]
+        tpci = cemi[9]
+        if tpci == 0x80:
+            connects[destination] += 1
+        con = bytearray(cemi)
+        con[0] = 0x2e
+        if destination not in alive:
+            # The confirm flag is set if nobody acknowledged the frame
+            con[2] |= 0x01
+        loop.call_soon(protocol.datagram_received, _tunnelling_request(bytes(con)), _GATEWAY)
+        if destination in alive and tpci & 0xc3 == 0x43 and cemi[10] & 0xc0 == 0:
+            # A_DeviceDescriptor_Response with mask version 0x07b0
+            response = bytes([0x29, 0x00, 0xb0, 0x60]) + cemi[6:8] + cemi[4:6] + \
+                bytes([0x03, 0x40 | tpci & 0x3c | 0x03, 0x40, 0x07, 0xb0])
+            loop.call_later(0.01, protocol.datagram_received,
+                            _tunnelling_request(response), _GATEWAY)
+
+    try:
+        protocol = _connection(loop, gateway, tunnel_timeout=2)
+        knxmap = KnxMap(loop=loop, testing=True)
+        knxmap.bus_window = 16
+        knxmap.bus_timeout = 0.5
+        knx_gateway = types.SimpleNamespace(host=_GATEWAY[0])
+        knxmap.bus_info_targets[knx_gateway.host] = []
+        targets = ['1.1.{}'.format(i) for i in range(256)]
+        queue = knxmap.add_bus_queue(knx_gateway.host, targets)
+        loop.run_until_complete(asyncio.wait_for(
+            knxmap._knx_bus_pipeline_worker(protocol.transport, protocol, knx_gateway, queue),
+            10))
+        loop.run_until_complete(asyncio.wait_for(queue.join(), 1))
+    finally:
+        loop.close()
+    assert set(connects) == {0x1100 + i for i in range(256)}
+    assert set(connects.values()) == {1}
+    assert sorted(d.address for d in knxmap.gateway_bus_devices[knx_gateway.host]) == \
+        ['1.1.254', '1.1.5', '1.1.64']
+    stats = knxmap.bus_lines[(knx_gateway.host, '1.1')]
+    assert (stats['targets'], stats['devices']) == (256, 3)